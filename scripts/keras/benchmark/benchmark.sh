@@ -0,0 +1,18 @@
+#!/bin/bash
+
+## Benchmark the predict scripts on synthetic models, e.g.
+##   benchmark.sh            all predictors
+##   benchmark.sh timex      just the timex tagger
+## Set KERAS_ENV to point at a virtualenv other than the docTimeRel one.
+
+source ${KERAS_ENV:-$(dirname $0)/../../../../ctakes/ctakes-temporal/scripts/keras/env}/bin/activate
+
+export PYTHONPATH=$PYTHONPATH:$(dirname $0)/../../../../ctakes/ctakes-neural/scripts:$(dirname $0)/../common:$(dirname $0)/../timex:$(dirname $0)/../docTimeRel
+
+python $(dirname $0)/predict_benchmark.py $*
+
+ret=$?
+
+deactivate
+
+exit $ret
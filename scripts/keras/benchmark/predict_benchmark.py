@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+"""Benchmark the predict scripts on synthetic models, CPU only.
+
+For each predictor kind a small model with the real architecture is built
+from random weights and a synthetic alphabet, packaged as script.model the
+way the trainers do, and served by the real predict script in a child
+process.  Instances are random tokens with lognormal lengths resembling
+the ClearTK data.  Reported per kind:
+
+  startup      seconds from launching the script to its first label
+  p50/p99      per-instance latency, one line at a time
+  throughput   instances per second with "#batch N" requests
+  peak RSS     high-water mark of the predict process
+
+    predict_benchmark.py [dima|resnet|timex ...]
+
+runs every kind when none are given.
+"""
+
+import os
+import os.path
+import sys
+
+## no GPU, so numbers are comparable across machines and runs
+os.environ['CUDA_VISIBLE_DEVICES'] = ''
+
+import pickle
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from zipfile import ZipFile
+
+import numpy as np
+
+scripts_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+vocab_size = 5000
+num_labels = 6
+seq_maxlen = 120
+timex_labels = ['O', 'B-DATE', 'I-DATE', 'B-TIME', 'I-TIME', 'B-DURATION', 'I-DURATION']
+## same as timex_train.best_config
+timex_config = {'layers': (128,), 'backwards': True, 'bilstm': True, 'embed_dim': 100,
+                'activation': 'tanh', 'batch_size': 64, 'lr': 0.01, 'pretrain': False}
+
+## (median, sigma) of the lognormal instance lengths, in tokens
+length_params = {'dima': (18, 0.6), 'resnet': (18, 0.6), 'timex': (16, 0.7)}
+
+latency_instances = 200
+throughput_instances = 1024
+batch_sizes = [1, 8, 32, 128]
+
+def _words():
+    return ['w%d' % i for i in range(vocab_size)]
+
+def _save(model, working_dir, alphabets):
+    """Package model and alphabets like the trainers do"""
+    open(os.path.join(working_dir, 'model_0.json'), 'w').write(model.to_json())
+    model.save_weights(os.path.join(working_dir, 'model_0.h5'), overwrite=True)
+    with open(os.path.join(working_dir, 'alphabets.pkl'), 'wb') as f:
+        pickle.dump(alphabets, f)
+
+    with ZipFile(os.path.join(working_dir, 'script.model'), 'w') as myzip:
+        for name in ('model_0.json', 'model_0.h5', 'alphabets.pkl'):
+            myzip.write(os.path.join(working_dir, name), name)
+
+def _sequence_alphabets():
+    words = ['none', '<e>', '</e>', '<t>', '</t>'] + _words()
+    feats_alphabet = {word: index for (index, word) in enumerate(words)}
+    label_alphabet = {'label%d' % i: i for i in range(num_labels)}
+    return (feats_alphabet, label_alphabet, seq_maxlen)
+
+def build_dima(working_dir):
+    import dima_cnn
+    alphabets = _sequence_alphabets()
+    model, _ = dima_cnn.multi_cnn(seq_maxlen, len(alphabets[0]), num_labels)
+    _save(model, working_dir, alphabets)
+
+def build_resnet(working_dir):
+    from resnet_train import resnet
+    alphabets = _sequence_alphabets()
+    model = resnet(seq_maxlen, alphabets[0], num_labels)
+    _save(model, working_dir, alphabets)
+
+def build_timex(working_dir):
+    from timex_common import get_model_for_config
+    words = ['START', 'EOS'] + _words()
+    feats_alphabet = {word: index + 1 for (index, word) in enumerate(words)}
+    label_alphabet = {label: index for (index, label) in enumerate(timex_labels)}
+    model = get_model_for_config((1, seq_maxlen), len(feats_alphabet) + 1, len(label_alphabet), dict(timex_config))
+    _save(model, working_dir, (feats_alphabet, label_alphabet))
+
+def relation_instance(length, rng):
+    """Tokens around an <e> event and a <t> time, like the CNN annotators write"""
+    words = ['w%d' % i for i in rng.randint(0, vocab_size, max(length - 6, 2))]
+    split = rng.randint(1, len(words))
+    return ' '.join(words[:split] + ['<e>', words[0], '</e>', '<t>', words[-1], '</t>'] + words[split:])
+
+def timex_instance(length, rng):
+    """A sentence between START and EOS, like RnnTimexAnnotator writes"""
+    words = ['w%d' % i for i in rng.randint(0, vocab_size, max(length, 1))]
+    return ' '.join(['START'] + words + ['EOS'])
+
+## kind -> (model builder, predict script, instance generator)
+kinds = {'dima': (build_dima, os.path.join('docTimeRel', 'dima-predict.py'), relation_instance),
+         'resnet': (build_resnet, os.path.join('docTimeRel', 'resnet-predict.py'), relation_instance),
+         'timex': (build_timex, os.path.join('timex', 'timex_classify.py'), timex_instance)}
+
+def instances(kind, count, rng):
+    (median, sigma) = length_params[kind]
+    lengths = np.maximum(1, rng.lognormal(np.log(median), sigma, count).astype(int))
+    make = kinds[kind][2]
+    return [make(length, rng) for length in lengths]
+
+def peak_rss_mb(pid):
+    """VmHWM of a live process in MB, None where /proc is not available"""
+    try:
+        with open('/proc/%d/status' % pid) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    return None
+
+class PredictProcess:
+    """A predict script in a child process, spoken to over its pipes"""
+
+    def __init__(self, kind, working_dir, log):
+        env = dict(os.environ)
+        env['PREDICT_BATCH_SIZE'] = '1'
+        script = os.path.join(scripts_dir, kinds[kind][1])
+        self.proc = subprocess.Popen([sys.executable, script, working_dir],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=log, env=env)
+
+    def request(self, lines):
+        if len(lines) > 1:
+            lines = ['#batch %d' % len(lines)] + lines
+        self.proc.stdin.write(''.join(line + '\n' for line in lines))
+        self.proc.stdin.flush()
+        labels = [self.proc.stdout.readline() for _ in range(len(lines) - (len(lines) > 1))]
+        if not all(labels) or labels[0].startswith('Exception thrown'):
+            raise RuntimeError("predict script failed: %s" % (labels[0].strip() if labels[0] else 'no output'))
+        return labels
+
+    def close(self):
+        rss = peak_rss_mb(self.proc.pid)
+        self.proc.stdin.write('\n')
+        self.proc.stdin.close()
+        self.proc.wait()
+        if rss is None:
+            ## ru_maxrss of waited-for children, KB on Linux
+            rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0
+        return rss
+
+def benchmark(kind, working_dir, rng):
+    kinds[kind][0](working_dir)
+    log_path = os.path.join(working_dir, 'predict.log')
+
+    with open(log_path, 'w') as log:
+        try:
+            start = time.time()
+            proc = PredictProcess(kind, working_dir, log)
+            proc.request(instances(kind, 1, rng))
+            results = {'startup': time.time() - start}
+
+            latencies = []
+            for line in instances(kind, latency_instances, rng):
+                start = time.time()
+                proc.request([line])
+                latencies.append(time.time() - start)
+            results['p50'] = np.percentile(latencies, 50) * 1000
+            results['p99'] = np.percentile(latencies, 99) * 1000
+
+            lines = instances(kind, throughput_instances, rng)
+            for batch_size in batch_sizes:
+                start = time.time()
+                for i in range(0, len(lines), batch_size):
+                    proc.request(lines[i:i+batch_size])
+                results[batch_size] = len(lines) / (time.time() - start)
+
+            results['rss'] = proc.close()
+        except (RuntimeError, IOError):
+            sys.stderr.write(open(log_path).read())
+            raise
+
+    return results
+
+def report(kind, results):
+    rss = results['rss']
+    print("%-7s startup %6.2f s   p50 %7.2f ms   p99 %7.2f ms   peak RSS %s" %
+          (kind, results['startup'], results['p50'], results['p99'],
+           '%.0f MB' % rss if rss is not None else 'n/a'))
+    print("        throughput " + '   '.join('batch %d: %.0f/s' % (batch_size, results[batch_size])
+                                          for batch_size in batch_sizes))
+
+def main(args):
+    selected = args or sorted(kinds)
+    for kind in selected:
+        if not kind in kinds:
+            sys.stderr.write("Error - unknown kind %s, expected one of %s\n" % (kind, ', '.join(sorted(kinds))))
+            sys.exit(-1)
+
+    rng = np.random.RandomState(1337)
+    for kind in selected:
+        working_dir = tempfile.mkdtemp(prefix='predict-benchmark-%s-' % kind)
+        try:
+            report(kind, benchmark(kind, working_dir, rng))
+        finally:
+            shutil.rmtree(working_dir, ignore_errors=True)
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+## bucket upper bounds used at inference time when no training lengths are known
+inference_bounds = [8, 16, 32, 64, 128, 256]
+
+def window_starts(length, window, overlap):
+    """Start offsets of windows of width window covering length tokens.
+
+    Neighbouring windows share at least overlap tokens and the last window
+    ends with the sequence, so every window is full.  A sequence no longer
+    than window, or any sequence when window is 0, is one window at 0.
+    """
+    if window <= 0 or length <= window:
+        return [0]
+    starts = list(range(0, length - window, window - overlap))
+    starts.append(length - window)
+    return starts
+
+def length_buckets(lengths, num_buckets=8):
+    """Bucket upper bounds at evenly spaced quantiles of lengths.
+
+    The last bound is always the longest length, so every sequence falls in
+    a bucket.  num_buckets=1 reproduces global padding.
+    """
+    qs = np.linspace(0, 100, num_buckets + 1)[1:]
+    bounds = np.ceil(np.percentile(lengths, qs)).astype(int)
+    bounds[-1] = max(lengths)
+    return sorted(set(bounds.tolist()))
+
+def assign_buckets(lengths, bounds):
+    """Index of the smallest bound >= each length; longer ones go last"""
+    ids = np.searchsorted(bounds, lengths, side='left')
+    return np.minimum(ids, len(bounds) - 1)
+
+def bucket_batches(lengths, batch_size, bounds, shuffle=True):
+    """Lists of example indices, every batch drawn from a single bucket"""
+    ids = assign_buckets(lengths, bounds)
+    batches = []
+    for bucket in np.unique(ids):
+        members = np.where(ids == bucket)[0]
+        if shuffle:
+            np.random.shuffle(members)
+        for start in range(0, len(members), batch_size):
+            batches.append(members[start:start+batch_size])
+
+    if shuffle:
+        np.random.shuffle(batches)
+    return batches
+
+def padding_weights(lengths, width):
+    """(len(lengths), width) float32 sample weights, 1 on tokens and 0 on the front padding.
+
+    Passed as temporal sample weights they keep padded timesteps out of
+    the loss of a model compiled with sample_weight_mode='temporal'.
+    """
+    lengths = np.minimum(np.asarray(lengths), width)
+    return (np.arange(width) >= width - lengths[:, np.newaxis]).astype('float32')
+
+def bucket_generator(x_seqs, y_seqs, batch_size, bounds, y_transform=None, sample_weights=False):
+    """Endlessly yield (x, y) batches padded to the longest member of the batch.
+
+    y_seqs holds one label sequence per example (BIO tagging) and is padded
+    like x; y_transform, e.g. one-hot expansion, is applied per batch so the
+    full label tensor never exists.  With sample_weights the batches are
+    (x, y, padding_weights) so padding inside a bucket adds nothing to the
+    loss.  Batches are reshuffled every pass, one pass covering each example
+    once, to match samples_per_epoch=len(x_seqs).
+    """
+    from keras.preprocessing.sequence import pad_sequences
+
+    lengths = np.array([len(seq) for seq in x_seqs])
+    while True:
+        for batch in bucket_batches(lengths, batch_size, bounds):
+            width = lengths[batch].max()
+            x = pad_sequences([x_seqs[i] for i in batch], maxlen=width)
+            y = pad_sequences([y_seqs[i] for i in batch], maxlen=width)
+            if y_transform is not None:
+                y = y_transform(y)
+            if sample_weights:
+                yield x, y, padding_weights(lengths[batch], width)
+            else:
+                yield x, y
+
+def padded_batches(x_seqs, labels, batch_size, maxlen, y_transform=None, order=None):
+    """Yield (x, y) batches covering x_seqs once, x padded to maxlen.
+
+    x_seqs is a tensor_cache.Ragged, so only one batch is ever padded;
+    labels holds one label per example and goes through y_transform (e.g.
+    one-hot expansion) a batch at a time.  order gives the example order,
+    default as stored.
+    """
+    if order is None:
+        order = np.arange(len(x_seqs))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start+batch_size]
+        y = np.asarray(labels[batch])
+        if y_transform is not None:
+            y = y_transform(y)
+        yield x_seqs.take(batch).pad(maxlen), y
+
+def padded_generator(x_seqs, labels, batch_size, maxlen, y_transform=None, shuffle=True):
+    """Endless padded_batches, reshuffled every pass, for fit_generator()"""
+    while True:
+        order = np.random.permutation(len(x_seqs)) if shuffle else None
+        for batch in padded_batches(x_seqs, labels, batch_size, maxlen, y_transform, order):
+            yield batch
+
+def capped_maxlen(lengths, percentile=100):
+    """Input width covering the given percentile of lengths.
+
+    For models whose width is fixed by the weights (Flatten into Dense) this
+    is the only padding that can be saved: below 100 the long tail is
+    truncated rather than widening every row.
+    """
+    return int(np.ceil(np.percentile(lengths, percentile)))
+
+def variable_length_config(config):
+    """Drop the fixed sequence length from a Keras model config, in place.
+
+    Every input_length becomes None and so does the step dimension of
+    every batch_input_shape, so a recurrent tagger built for the corpus
+    maxlen takes bucketed batches of any width.  Returns config.
+    """
+    if isinstance(config, dict):
+        if 'input_length' in config:
+            config['input_length'] = None
+        shape = config.get('batch_input_shape')
+        if isinstance(shape, list) and len(shape) > 1:
+            shape[1] = None
+        for value in config.values():
+            variable_length_config(value)
+    elif isinstance(config, list):
+        for value in config:
+            variable_length_config(value)
+    return config
+
+def variable_length_model(model):
+    """A copy of a compiled Keras model, weights included, taking any width.
+
+    The copy is compiled with the loss, optimizer and metrics of model.
+    """
+    import json
+    from keras.models import model_from_json
+
+    copy = model_from_json(json.dumps(variable_length_config(json.loads(model.to_json()))))
+    copy.set_weights(model.get_weights())
+    copy.compile(loss=model.loss, optimizer=model.optimizer, metrics=model.metrics)
+    return copy
+
+class PaddingReport:
+    """Counts padded cells with bucketing against padding to one global width"""
+
+    def __init__(self):
+        self.tokens = 0
+        self.bucketed = 0
+        self.unbucketed = 0
+
+    def add(self, lengths, width, global_width):
+        """Record rows of the given lengths padded to width instead of global_width"""
+        self.tokens += sum(lengths)
+        self.bucketed += width * len(lengths)
+        self.unbucketed += global_width * len(lengths)
+
+    def add_batches(self, lengths, batches, global_width):
+        for batch in batches:
+            batch_lengths = [min(lengths[i], global_width) for i in batch]
+            self.add(batch_lengths, max(batch_lengths), global_width)
+
+    def __str__(self):
+        global_padding = self.unbucketed - self.tokens
+        padding = self.bucketed - self.tokens
+        saved = 100.0 * (global_padding - padding) / global_padding if global_padding else 0.0
+        return ("Padding: %d tokens in %d cells (%d padding) instead of %d cells (%d padding), %.1f%% of padding saved"
+                % (self.tokens, self.bucketed, padding, self.unbucketed, global_padding, saved))
+
+def capped_summary(lengths, maxlen):
+    """Describe the padding saved by capping the width at maxlen"""
+    lengths = np.asarray(lengths)
+    longest = lengths.max()
+    kept = np.minimum(lengths, maxlen)
+    padding = maxlen * len(lengths) - kept.sum()
+    global_padding = longest * len(lengths) - lengths.sum()
+    saved = 100.0 * (global_padding - padding) / global_padding if global_padding else 0.0
+    return ("Width %d instead of %d: %d padding cells instead of %d (%.1f%% saved), %d instances truncated by %d tokens"
+            % (maxlen, longest, padding, global_padding, saved, (lengths > maxlen).sum(), (lengths - kept).sum()))
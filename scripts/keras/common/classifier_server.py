@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+"""Long-lived classifier server for the cTAKES neural annotators.
+
+Loads the docTimeRel, event-time and timex models once and answers the
+classify.sh clients of every pipeline worker over a Unix domain socket:
+
+    classifier_server.py [-s <socket path>] [-w <workers>] <kind>:<model directory> ...
+
+where kind is one of dima, resnet or timex.  Models not given on the
+command line are loaded the first time a client asks for them.
+
+With -w the models given on the command line are loaded once and then
+<workers> processes are forked to accept connections on the shared socket.
+The weights are only ever read, so their pages stay shared copy-on-write
+and memory does not grow with the number of workers; a model loaded on
+demand is loaded by each worker that needs it.  Forking after the backend
+has started its own threads is unsafe, so -w above 1 is refused unless
+every preloaded model runs on numpy_engine (see PREDICT_ENGINE in
+predictors.py); timex models and anything else that needs Keras are then
+loaded on demand, after the fork.
+
+The socket lives in a directory only the current user can enter,
+$XDG_RUNTIME_DIR/neural-temporal-<uid> or /tmp/neural-temporal-<uid>, unless
+-s or CLASSIFIER_SOCKET names another.  The server refuses to start when
+another server answers on the socket.
+
+Protocol: a client connects and sends one line "<kind> <model directory>".
+The server answers "OK" (or "ERROR <message>" and closes), after which the
+connection behaves exactly like the stdin/stdout of the predict scripts: one
+line of features in, one line of labels out, in order.
+"""
+
+import errno
+import os
+import socket
+import signal
+import sys
+import threading
+import traceback
+import SocketServer
+
+from numpy_engine import NumpyModel
+from predictors import make_predictor, serve
+
+SOCKET_VAR = 'CLASSIFIER_SOCKET'
+
+def default_socket():
+    """classifier.sock in a per-user directory, the same classify_client.py uses"""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(runtime_dir, 'neural-temporal-%d' % os.getuid(), 'classifier.sock')
+
+def get_socket_path():
+    return os.environ.get(SOCKET_VAR) or default_socket()
+
+def private_socket_dir(socket_path):
+    """Create the directory of socket_path with mode 0700 if it is missing.
+
+    Raises if it exists but belongs to another user or others can enter
+    it, since they could then connect to the server or replace the socket.
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    try:
+        os.makedirs(directory, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+        stat = os.stat(directory)
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            raise Exception("%s must belong to the current user and have mode 0700" % (directory))
+
+def remove_stale_socket(socket_path):
+    """Remove a socket file whose server is gone, False if a server answers on it"""
+    if not os.path.exists(socket_path):
+        return True
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return False
+    except socket.error as e:
+        if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise
+    finally:
+        probe.close()
+
+    os.remove(socket_path)
+    return True
+
+class PredictorRegistry:
+    """Loads each (kind, model directory) once and hands out the predictor"""
+
+    def __init__(self):
+        self.predictors = {}
+        self.lock = threading.Lock()
+
+    def get(self, kind, working_dir):
+        key = (kind, os.path.realpath(working_dir))
+        with self.lock:
+            if not key in self.predictors:
+                sys.stderr.write("Loading %s model from %s\n" % key)
+                self.predictors[key] = make_predictor(kind, key[1])
+            return self.predictors[key]
+
+    def keras_models(self):
+        """(kind, model directory) of every loaded model not on numpy_engine"""
+        with self.lock:
+            return [key for (key, predictor) in self.predictors.items()
+                    if not isinstance(predictor.model, NumpyModel)]
+
+class ClassifierHandler(SocketServer.StreamRequestHandler):
+    ## unbuffered reads: serve() reads the descriptor directly, so readline()
+    ## must not pull feature lines past the header into a private buffer
+    rbufsize = 0
+
+    def handle(self):
+        header = self.rfile.readline().split()
+        ## remove_stale_socket() of another server connects and hangs up
+        if not header:
+            return
+        try:
+            if len(header) != 2:
+                raise Exception("Expected '<kind> <model directory>' but got %s" % (header))
+            predictor = self.server.registry.get(header[0], header[1])
+        except Exception as e:
+            self.wfile.write("ERROR %s\n" % (e))
+            return
+
+        self.wfile.write("OK\n")
+        self.wfile.flush()
+
+        serve(predictor, self.rfile, self.wfile)
+
+class ClassifierServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, registry):
+        SocketServer.UnixStreamServer.__init__(self, socket_path, ClassifierHandler)
+        self.registry = registry
+
+class WorkerPool:
+    """Forked processes serving the same listening socket.
+
+    Each worker runs the server's own accept loop; the kernel hands every
+    new connection to one of them.  Workers that die are replaced.
+    """
+
+    def __init__(self, server, size):
+        self.server = server
+        self.size = size
+        self.pids = set()
+        self.stopping = False
+
+    def _work(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        status = 0
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        os._exit(status)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self._work()
+        self.pids.add(pid)
+
+    def run(self):
+        """Start the workers and replace any that exit until stop()"""
+        for i in range(self.size):
+            self.spawn()
+        sys.stderr.write("Started %d workers\n" % (self.size))
+
+        while not self.stopping:
+            (pid, status) = os.wait()
+            self.pids.discard(pid)
+            if not self.stopping:
+                sys.stderr.write("Worker %d exited with status %d, starting another\n" % (pid, status))
+                self.spawn()
+
+    def stop(self):
+        self.stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        self.pids.clear()
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt()
+
+def main(args):
+    socket_path = get_socket_path()
+    workers = 1
+    while len(args) > 1 and args[0] in ('-s', '-w'):
+        if args[0] == '-s':
+            socket_path = args[1]
+        else:
+            workers = int(args[1])
+        args = args[2:]
+
+    if socket_path == default_socket():
+        private_socket_dir(socket_path)
+    if not remove_stale_socket(socket_path):
+        sys.stderr.write("Error - a classifier server is already listening on %s\n" % (socket_path))
+        sys.exit(-1)
+
+    registry = PredictorRegistry()
+    for spec in args:
+        if not ':' in spec:
+            sys.stderr.write("Error - models are given as <kind>:<model directory>, got %s\n" % (spec))
+            sys.exit(-1)
+        kind, working_dir = spec.split(':', 1)
+        registry.get(kind, working_dir)
+
+    ## a Keras backend may have started threads that a fork would not copy
+    if workers > 1 and registry.keras_models():
+        sys.stderr.write("Error - -w %d needs every preloaded model on numpy_engine, these need Keras: %s\n"
+                         % (workers, ', '.join('%s:%s' % key for key in registry.keras_models())))
+        sys.exit(-1)
+
+    server = ClassifierServer(socket_path, registry)
+    sys.stderr.write("Classifier server listening on %s\n" % (socket_path))
+    pool = None
+    try:
+        if workers > 1:
+            signal.signal(signal.SIGTERM, _terminate)
+            pool = WorkerPool(server, workers)
+            pool.run()
+        else:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        sys.stderr.write("Caught keyboard interrupt\n")
+    finally:
+        if pool is not None:
+            pool.stop()
+        server.server_close()
+        os.remove(socket_path)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""Forward a predict script's stdin/stdout to classifier_server.py.
+
+    classify_client.py <kind> <model directory>
+
+Only the standard library is imported, so the client starts in a few tens of
+milliseconds and classify.sh can use it without activating the Keras
+virtualenv.  Any failure before the server accepts the request, including
+an unexpected error, exits with status 2 before stdin is read, so the
+caller can fall back to running the predict script itself.  Runs under
+Python 2 and 3.
+"""
+
+import os
+import socket
+import sys
+import threading
+
+SOCKET_VAR = 'CLASSIFIER_SOCKET'
+
+def default_socket():
+    """Same per-user path as classifier_server.default_socket()"""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(runtime_dir, 'neural-temporal-%d' % os.getuid(), 'classifier.sock')
+
+def forward_input(sock):
+    """Copy stdin to the server, then signal end of input"""
+    fd = sys.stdin.fileno()
+    try:
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            sock.sendall(chunk)
+    finally:
+        sock.shutdown(socket.SHUT_WR)
+
+def connect(kind, working_dir, socket_path):
+    """(socket, response file) once the server accepted the request"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as e:
+        sys.stderr.write("Could not connect to classifier server at %s: %s\n" % (socket_path, e))
+        sys.exit(2)
+
+    sock.sendall(("%s %s\n" % (kind, working_dir)).encode('utf-8'))
+    responses = sock.makefile('rb')
+    status = responses.readline().rstrip().decode('utf-8', 'replace')
+    if status != 'OK':
+        sys.stderr.write("Classifier server refused the request: %s\n" % (status))
+        sys.exit(2)
+    return sock, responses
+
+def main(args):
+    if len(args) < 2:
+        sys.stderr.write("Error - two required arguments: <model kind> <model directory>\n")
+        sys.exit(-1)
+
+    kind = args[0]
+    working_dir = os.path.realpath(args[1])
+    socket_path = os.environ.get(SOCKET_VAR) or default_socket()
+
+    ## nothing has been read or written yet, so the caller can still fall back
+    try:
+        (sock, responses) = connect(kind, working_dir, socket_path)
+    except Exception as e:
+        sys.stderr.write("Classifier server failed before accepting the request: %s\n" % (e))
+        sys.exit(2)
+
+    ## requests and responses flow independently so batches can fill up
+    sender = threading.Thread(target=forward_input, args=(sock,))
+    sender.daemon = True
+    sender.start()
+
+    ## the responses are bytes; Python 3 text streams take them through buffer
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    while True:
+        line = responses.readline()
+        if not line:
+            break
+        out.write(line)
+        out.flush()
+
+    sock.close()
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
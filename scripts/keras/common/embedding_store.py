@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""Binary, memory-mapped copies of text word embedding files.
+
+A .vec file (word2vec text format, optional "<count> <dim>" header line) is
+converted once into <file>.npy, a float32 matrix with one row per word, and
+<file>.vocab.pkl, a dict mapping each word to its row.  Later runs
+memory-map the matrix and copy out only the rows of the words in the
+feature alphabet, so loading takes milliseconds and the pages are shared by
+every process reading the same file.
+
+    embedding_store.py <embeddings .vec file> ...
+
+converts ahead of time; read_embeddings() converts on first use.
+"""
+
+import os
+import os.path
+import pickle
+import sys
+
+import numpy as np
+
+## rows for words without a pre-trained vector, like a fresh Keras Embedding;
+## drawn from their own seeded generator so the global numpy seed a trainer
+## sets still gives the same weight initialization and shuffling
+unknown_scale = 0.05
+unknown_seed = 1339
+
+def store_paths(vec_path):
+    return vec_path + '.npy', vec_path + '.vocab.pkl'
+
+def _parse_header(line):
+    fields = line.split()
+    if len(fields) == 2 and fields[0].isdigit() and fields[1].isdigit():
+        return int(fields[0]), int(fields[1])
+    return None
+
+def _vector_lines(vec_path):
+    """Yield (word, rest of line) for every vector line"""
+    with open(vec_path) as f:
+        for line_num, line in enumerate(f):
+            if line_num == 0 and _parse_header(line) is not None:
+                continue
+            line = line.rstrip()
+            if not line:
+                continue
+            word, _, values = line.partition(' ')
+            yield word, values
+
+def convert(vec_path):
+    """Write the binary store for vec_path and return its paths"""
+    matrix_path, vocab_path = store_paths(vec_path)
+
+    ## one counting pass so the matrix can be written straight to disk
+    count = 0
+    dim = None
+    for word, values in _vector_lines(vec_path):
+        if dim is None:
+            dim = len(values.split())
+        count += 1
+
+    tmp_matrix = matrix_path + '.%d.tmp' % os.getpid()
+    tmp_vocab = vocab_path + '.%d.tmp' % os.getpid()
+
+    matrix = np.lib.format.open_memmap(tmp_matrix, mode='w+', dtype=np.float32, shape=(count, dim))
+    vocab = {}
+    for row, (word, values) in enumerate(_vector_lines(vec_path)):
+        matrix[row] = np.fromstring(values, dtype=np.float32, sep=' ')
+        ## keep the first vector of a word listed twice
+        vocab.setdefault(word, row)
+    matrix.flush()
+    del matrix
+
+    with open(tmp_vocab, 'wb') as f:
+        pickle.dump(vocab, f, pickle.HIGHEST_PROTOCOL)
+
+    ## renames are atomic, so trainers converting concurrently do not clash
+    os.rename(tmp_matrix, matrix_path)
+    os.rename(tmp_vocab, vocab_path)
+    return matrix_path, vocab_path
+
+def is_current(vec_path):
+    """True if the binary store exists and is newer than the text file"""
+    vec_mtime = os.path.getmtime(vec_path)
+    for path in store_paths(vec_path):
+        if not os.path.exists(path) or os.path.getmtime(path) < vec_mtime:
+            return False
+    return True
+
+def open_store(vec_path):
+    """Return (vocab dict, read-only memory-mapped matrix), converting if needed"""
+    if not is_current(vec_path):
+        convert(vec_path)
+
+    matrix_path, vocab_path = store_paths(vec_path)
+    with open(vocab_path, 'rb') as f:
+        vocab = pickle.load(f)
+    return vocab, np.load(matrix_path, mmap_mode='r')
+
+def read_embeddings(vec_path, feats_alphabet, seed=unknown_seed):
+    """Embedding weights for feats_alphabet, one row per alphabet index.
+
+    Drop-in replacement for cleartk_io.read_embeddings.  Only the rows of
+    words in the alphabet are read from the memory-mapped store; words
+    without a vector get uniform(-0.05, 0.05) rows from a RandomState(seed).
+    If the store cannot be written (read-only directory) the text file is
+    parsed directly.
+    """
+    try:
+        vocab, matrix = open_store(vec_path)
+    except (IOError, OSError) as e:
+        sys.stderr.write("Could not use binary embedding store for %s (%s), reading text\n" % (vec_path, e))
+        import cleartk_io as ctk_io
+        return ctk_io.read_embeddings(vec_path, feats_alphabet)
+
+    rng = np.random.RandomState(seed)
+    weights = rng.uniform(-unknown_scale, unknown_scale,
+                          (len(feats_alphabet), matrix.shape[1])).astype(np.float32)
+
+    indices = []
+    rows = []
+    for (word, index) in feats_alphabet.items():
+        row = vocab.get(word)
+        if row is not None:
+            indices.append(index)
+            rows.append(row)
+
+    if rows:
+        ## sorted reads walk the mapped file front to back
+        order = np.argsort(rows)
+        weights[np.array(indices)[order]] = matrix[np.array(rows)[order]]
+
+    print("Found pre-trained vectors for %d of %d features" % (len(rows), len(feats_alphabet)))
+    return weights
+
+def main(args):
+    if len(args) < 1:
+        sys.stderr.write("Error - one required argument: <embeddings .vec file> ...\n")
+        sys.exit(-1)
+
+    for vec_path in args:
+        matrix_path, vocab_path = convert(vec_path)
+        print("Wrote %s and %s" % (matrix_path, vocab_path))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
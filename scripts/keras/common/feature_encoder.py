@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+from itertools import repeat
+
+import numpy as np
+
+try:
+    from itertools import imap
+except ImportError:
+    imap = map
+
+def is_tag(unigram):
+    """Same test as fnmatch(unigram, '<*>') without the regex"""
+    return len(unigram) > 1 and unigram[0] == '<' and unigram[-1] == '>'
+
+def pad_flat(ids, lengths, width):
+    """Pad rows stored back to back in ids into a (rows, width) matrix.
+
+    Same layout as pad_sequences(padding='pre', truncating='post'): padding
+    at the front, rows longer than width keep their first width values.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    kept = np.minimum(lengths, width)
+
+    ## position of every value inside its own row, then drop the tail
+    starts = np.cumsum(lengths) - lengths
+    row_of = np.repeat(np.arange(len(lengths)), lengths)
+    position = np.arange(len(ids)) - starts[row_of]
+    keep = position < width
+
+    matrix = np.zeros((len(lengths), width), dtype=np.int32)
+    matrix[row_of[keep], (width - kept)[row_of[keep]] + position[keep]] = ids[keep]
+    return matrix
+
+class FeatureEncoder:
+    """Token to index conversion built once from a feature alphabet.
+
+    Lookups run as a single map() over all tokens of a batch, so there is no
+    Python-level loop per token, and rows are scattered into the padded
+    matrix with numpy indexing.  Padding goes at the front and long rows keep
+    their first maxlen tokens, as in the predict scripts.
+
+    oov is the index used for unknown tokens; with oov=None unknown tokens
+    raise KeyError like a plain alphabet[unigram] lookup.
+    """
+
+    def __init__(self, alphabet, oov=None):
+        self.alphabet = alphabet
+        self.oov = oov
+
+        ## which indices are <tag> region markers
+        size = max(alphabet.values()) + 1 if alphabet else 0
+        self.tag_flags = np.zeros(size, dtype=bool)
+        for unigram, index in alphabet.items():
+            if is_tag(unigram):
+                self.tag_flags[index] = True
+
+    def lookup(self, tokens):
+        """Indices of a flat list of tokens as an int32 array"""
+        if self.oov is None:
+            ids = imap(self.alphabet.__getitem__, tokens)
+        else:
+            ids = imap(self.alphabet.get, tokens, repeat(self.oov))
+        return np.fromiter(ids, dtype=np.int32, count=len(tokens))
+
+    def encode(self, line):
+        """Indices of the tokens of one line"""
+        return self.lookup(line.split())
+
+    def encode_batch(self, lines, maxlen=None):
+        """Return (padded int32 matrix, lengths) for a list of lines.
+
+        The matrix is maxlen wide, or as wide as the longest line if maxlen
+        is None.
+        """
+        rows = [line.split() for line in lines]
+        lengths = np.array([len(row) for row in rows], dtype=np.int64)
+        ids = self.lookup([unigram for row in rows for unigram in row])
+
+        width = lengths.max() if maxlen is None else maxlen
+        return pad_flat(ids, lengths, width), np.minimum(lengths, width)
+
+    def regions(self, line, num_regions=5):
+        """Split a line at its <tag> tokens into lists of indices.
+
+        Returns num_regions lists (pre, arg1, cont, arg2, post for relation
+        instances); tags themselves are dropped and tokens after the last
+        region are ignored.
+        """
+        ids = self.encode(line)
+        flags = self.tag_flags[ids]
+        region = np.cumsum(flags)
+        return [ids[(region == r) & ~flags].tolist() for r in range(num_regions)]
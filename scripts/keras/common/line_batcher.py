@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+import os
+import select
+import time
+from collections import deque
+
+## Environment variables read by the predict scripts.  ClearTK starts
+## classify.sh with a fixed argument list, so batching is configured through
+## the environment of the calling JVM instead of the command line.
+BATCH_SIZE_VAR = 'PREDICT_BATCH_SIZE'
+BATCH_WAIT_VAR = 'PREDICT_BATCH_WAIT_MS'
+
+default_batch_size = 1
+default_batch_wait_ms = 5
+
+def _text(line):
+    """A line read as bytes, rstripped, as the native str type"""
+    line = line.rstrip()
+    return line if isinstance(line, str) else line.decode('utf-8')
+
+def get_batch_settings():
+    """Return (max batch size, max wait in seconds) from the environment"""
+    batch_size = int(os.environ.get(BATCH_SIZE_VAR, default_batch_size))
+    wait_ms = float(os.environ.get(BATCH_WAIT_VAR, default_batch_wait_ms))
+    return max(1, batch_size), max(0.0, wait_ms) / 1000.0
+
+class LineBatcher:
+    """Group lines arriving on a stream into micro-batches.
+
+    The first line of a batch is waited for indefinitely; after that lines
+    are collected until either max_size lines are available or max_wait
+    seconds have passed without the batch filling up.  A client that sends
+    one line and then waits for the answer therefore gets it after at most
+    max_wait seconds, while a client that streams many lines gets them
+    classified max_size at a time.
+
+    Reading goes straight to the file descriptor so that select() sees
+    exactly the bytes that have not been consumed yet.
+    """
+
+    def __init__(self, stream, max_size=1, max_wait=0.0):
+        self.fd = stream.fileno()
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.buf = b''
+        self.lines = deque()
+        self.eof = False
+
+    def _fill(self, timeout):
+        """Read whatever is available within timeout, False if nothing was"""
+        if self.eof:
+            return False
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+
+        chunk = os.read(self.fd, 65536)
+        if not chunk:
+            self.eof = True
+            if self.buf:
+                self.lines.append(self.buf)
+                self.buf = b''
+            return False
+
+        parts = (self.buf + chunk).split(b'\n')
+        self.buf = parts.pop()
+        self.lines.extend(parts)
+        return True
+
+    def next_batch(self):
+        """Return the next list of rstripped lines, or None at end of input"""
+        while not self.lines and not self.eof:
+            self._fill(None)
+
+        if not self.lines:
+            return None
+
+        deadline = time.time() + self.max_wait
+        while len(self.lines) < self.max_size and not self.eof:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self._fill(remaining):
+                break
+
+        batch = []
+        while self.lines and len(batch) < self.max_size:
+            batch.append(_text(self.lines.popleft()))
+
+        return batch
+
+    def take(self, count):
+        """Block until count more lines are read, fewer only at end of input"""
+        while len(self.lines) < count and not self.eof:
+            self._fill(None)
+        return [_text(self.lines.popleft()) for _ in range(min(count, len(self.lines)))]
+
+    def __iter__(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            yield batch
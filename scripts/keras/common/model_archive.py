@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import io
+import json
+import os
+import os.path
+import pickle
+import tempfile
+import threading
+from zipfile import ZipFile
+
+from keras.models import Sequential, model_from_json
+
+import bucketing
+import quantize
+
+_models = {}
+_lock = threading.Lock()
+
+def read_archive(path):
+    """Return the members of a script.model archive as {name: bytes}.
+
+    Archives hold model_0.json, alphabets.pkl, the float32 weights in
+    model_0.h5 and, when the trainer exported them, the quantized ones in
+    model_0.q.npz.
+    """
+    with ZipFile(path, 'r') as myzip:
+        names = set(myzip.namelist())
+        return {name: myzip.read(name) for name in ('model_0.json', 'model_0.h5', quantize.quantized_name, 'alphabets.pkl')
+                if name in names}
+
+def read_alphabets(working_dir):
+    """The pickled alphabets of working_dir/script.model, without building the model"""
+    with ZipFile(os.path.join(working_dir, 'script.model'), 'r') as myzip:
+        return pickle.loads(myzip.read('alphabets.pkl'))
+
+def _mask_embeddings(config):
+    """Set mask_zero on every Embedding in a model config, Merge branches included"""
+    if isinstance(config, dict):
+        if config.get('class_name') == 'Embedding':
+            config['config']['mask_zero'] = True
+        for value in config.values():
+            _mask_embeddings(value)
+    elif isinstance(config, list):
+        for value in config:
+            _mask_embeddings(value)
+
+def _masked_json(model_json):
+    config = json.loads(model_json)
+    _mask_embeddings(config)
+    return json.dumps(config)
+
+def masked_copy(model):
+    """A copy of model, weights included, whose embeddings mask index 0.
+
+    Raises if a layer after the embedding cannot take the mask.  The copy
+    is not compiled.
+    """
+    masked = model_from_json(_masked_json(model.to_json()))
+    masked.set_weights(model.get_weights())
+    return masked
+
+def _load_weights_in_memory(model, data):
+    """Load HDF5 weights from bytes without a file, False if not possible.
+
+    Needs h5py >= 2.9 (file-like objects) and a functional Model; Sequential
+    models in Keras 1 flatten their Merge branches inside load_weights(), so
+    they go through a file.
+    """
+    if isinstance(model, Sequential) or not hasattr(model, 'load_weights_from_hdf5_group'):
+        return False
+
+    import h5py
+    try:
+        f = h5py.File(io.BytesIO(data), 'r')
+    except Exception:
+        return False
+
+    try:
+        group = f
+        if 'layer_names' not in f.attrs and 'model_weights' in f:
+            group = f['model_weights']
+        model.load_weights_from_hdf5_group(group)
+    finally:
+        f.close()
+    return True
+
+def load_weights_from_bytes(model, data):
+    """Set model weights from the bytes of a model_0.h5 file.
+
+    When the weights cannot be read from memory they go through a private
+    temporary file, never the model directory, so concurrent processes do
+    not race and read-only model directories work.
+    """
+    if _load_weights_in_memory(model, data):
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.h5')
+    try:
+        os.write(fd, data)
+        os.close(fd)
+        model.load_weights(path)
+    finally:
+        os.remove(path)
+
+def load_model(working_dir, mask_padding=False, quantized=None, variable_length=False):
+    """Build the model in working_dir/script.model, return (model, alphabets).
+
+    Nothing is extracted to disk.  Built models are cached per process and
+    reused as long as the archive is unchanged, so a server asked for the
+    same model twice builds it once.  With mask_padding the embeddings mask
+    index 0, so recurrent layers step over padding as if it were absent;
+    building fails if a layer after the embedding cannot take the mask.
+    The quantized weights are used when the archive has them, unless
+    quantized is False; None leaves it to PREDICT_QUANTIZED.  With
+    variable_length the model takes batches of any width, see
+    bucketing.variable_length_config().
+    """
+    if quantized is None:
+        quantized = quantize.use_quantized()
+    path = os.path.realpath(os.path.join(working_dir, 'script.model'))
+    stat = os.stat(path)
+    key = (path, stat.st_mtime, stat.st_size, mask_padding, quantized, variable_length)
+
+    with _lock:
+        if not key in _models:
+            members = read_archive(path)
+            alphabets = pickle.loads(members['alphabets.pkl'])
+            model_json = members['model_0.json']
+            if mask_padding:
+                model_json = _masked_json(model_json)
+            if variable_length:
+                model_json = json.dumps(bucketing.variable_length_config(json.loads(model_json)))
+            model = model_from_json(model_json)
+            if quantize.quantized_name in members and (quantized or not 'model_0.h5' in members):
+                quantize.load_quantized_weights(model, members[quantize.quantized_name])
+            else:
+                load_weights_from_bytes(model, members['model_0.h5'])
+            _models[key] = (model, alphabets)
+        return _models[key]
@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+
+"""Keras-free inference for the feed-forward CNN and ResNet models.
+
+load_model(working_dir) reads script.model like model_archive.load_model
+but builds a NumpyModel, which evaluates the graph in model_0.json with
+vectorized NumPy.  It covers the layers the docTimeRel and event-time
+models use: InputLayer, Embedding, Convolution1D, MaxPooling1D,
+BatchNormalization (mode 0), Activation, Merge (sum, mul, ave, max,
+concat), Flatten, Dense and Dropout, which is the identity at inference.
+Anything else raises NotImplementedError, so callers can fall back to
+Keras.  Only numpy and h5py are imported.
+
+Weights come from the quantized model_0.q.npz when the archive has it and
+PREDICT_QUANTIZED is not 0, otherwise from model_0.h5; float16 embedding
+tables stay float16 in memory and only the looked-up rows are widened.
+
+    numpy_engine.py <model directory> [instances]
+
+compares the NumPy outputs, with and without token deduplication, with
+Keras on random input.
+"""
+
+import io
+import json
+import os
+import os.path
+import pickle
+import sys
+import tempfile
+import time
+from zipfile import ZipFile
+
+import numpy as np
+
+from quantize import quantized_name, use_quantized
+
+def _backend():
+    """Keras backend the model was trained with, without importing Keras"""
+    if 'KERAS_BACKEND' in os.environ:
+        return os.environ['KERAS_BACKEND']
+    try:
+        with open(os.path.join(os.path.expanduser('~'), '.keras', 'keras.json')) as f:
+            return json.load(f).get('backend', 'tensorflow')
+    except (IOError, ValueError):
+        return 'tensorflow'
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+## largest distinct tokens / positions ratio at which dedup_tokens pays off
+dedup_ratio = 0.5
+
+activations = {'linear': lambda x: x,
+               'relu': lambda x: np.maximum(x, 0),
+               'tanh': np.tanh,
+               'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+               'hard_sigmoid': lambda x: np.clip(0.2 * x + 0.5, 0.0, 1.0),
+               'softplus': lambda x: np.log1p(np.exp(x)),
+               'softmax': _softmax}
+
+def _activation(config):
+    name = config.get('activation', 'linear')
+    if not name in activations:
+        raise NotImplementedError("activation %s" % (name))
+    return activations[name]
+
+def _windows(x, length, stride):
+    """(batch, out, length, channels) strided view of (batch, steps, channels)"""
+    x = np.ascontiguousarray(x)
+    (batch, steps, channels) = x.shape
+    out = (steps - length) // stride + 1
+    (s0, s1, s2) = x.strides
+    return np.lib.stride_tricks.as_strided(x, shape=(batch, out, length, channels),
+                                           strides=(s0, s1 * stride, s1, s2))
+
+def _pad_steps(x, left, right, value=0.0):
+    return np.pad(x, ((0, 0), (left, right), (0, 0)), mode='constant', constant_values=value)
+
+## One builder per layer class: (config, weights) -> function of the list of
+## input arrays.
+
+def input_layer(config, weights):
+    return lambda inputs: inputs[0]
+
+def identity(config, weights):
+    return lambda inputs: inputs[0]
+
+class Embedding:
+
+    def __init__(self, config, weights):
+        self.table = weights[0]
+
+    def rows(self, ids):
+        return self.table[ids.astype(np.int64)].astype(np.float32)
+
+    def __call__(self, inputs):
+        return self.rows(inputs[0])
+
+class Convolution1D:
+
+    def __init__(self, config, weights):
+        self.length = config['filter_length']
+        self.stride = config.get('subsample_length', 1)
+        self.border_mode = config.get('border_mode', 'valid')
+        self.activation = _activation(config)
+        if not self.border_mode in ('valid', 'same'):
+            raise NotImplementedError("Convolution1D border_mode %s" % (self.border_mode))
+
+        ## Keras 1 stores (length, 1, input_dim, nb_filter) and convolves with the
+        ## 'tf' ordering; Theano flips the kernel, TensorFlow does not
+        self.theano = _backend() == 'theano'
+        kernel = weights[0][:, 0]
+        if self.theano:
+            kernel = kernel[::-1]
+        self.kernel = kernel
+        self.bias = weights[1] if len(weights) > 1 else 0.0
+
+    def _padding(self, steps):
+        """(left, right, output steps) for an input of the given length"""
+        if self.border_mode == 'valid':
+            return 0, 0, (steps - self.length) // self.stride + 1
+        out = (steps + self.stride - 1) // self.stride
+        if self.theano:
+            ## 'half' padding, cropped to the 'same' length
+            return self.length // 2, self.length // 2, out
+        total = max((out - 1) * self.stride + self.length - steps, 0)
+        return total // 2, total - total // 2, out
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        (left, right, out) = self._padding(x.shape[1])
+        if left or right:
+            x = _pad_steps(x, left, right)
+        windows = _windows(x, self.length, self.stride)[:, :out]
+        (batch, out, _, channels) = windows.shape
+        y = np.dot(windows.reshape(batch * out, self.length * channels), self.kernel.reshape(-1, self.kernel.shape[-1]))
+        return self.activation(y.reshape(batch, out, -1) + self.bias)
+
+    def from_tokens(self, rows, ids):
+        """Same result as self([rows[ids]]), with each distinct row multiplied once.
+
+        Every window is a sum of one row's response per offset, so the
+        (distinct rows, length, nb_filter) responses are computed up front
+        and gathered per position.
+        """
+        (length, channels, filters) = self.kernel.shape
+        responses = np.dot(rows, self.kernel.transpose(1, 0, 2).reshape(channels, length * filters))
+        ## padding positions point at an extra all-zero row
+        responses = np.concatenate([responses.reshape(len(rows), length, filters),
+                                    np.zeros((1, length, filters), dtype=responses.dtype)])
+
+        (left, right, out) = self._padding(ids.shape[1])
+        ids = np.pad(ids, ((0, 0), (left, right)), mode='constant', constant_values=len(rows))
+        windows = _windows(ids[:, :, None], length, self.stride)[:, :out, :, 0]
+
+        y = responses[windows[:, :, 0], 0]
+        for offset in range(1, length):
+            y += responses[windows[:, :, offset], offset]
+        return self.activation(y + self.bias)
+
+def maxpooling1d(config, weights):
+    length = config['pool_length']
+    stride = config.get('stride') or length
+    if config.get('border_mode', 'valid') != 'valid':
+        raise NotImplementedError("MaxPooling1D border_mode %s" % (config['border_mode']))
+    return lambda inputs: _windows(inputs[0], length, stride).max(axis=2)
+
+def batchnormalization(config, weights):
+    if config.get('mode', 0) != 0:
+        raise NotImplementedError("BatchNormalization mode %d" % (config['mode']))
+    axis = config.get('axis', -1)
+    epsilon = config.get('epsilon', 1e-3)
+
+    ## Keras 1 keeps the running variance in its "running_std" weight
+    (gamma, beta, mean, var) = weights
+    scale = gamma / np.sqrt(var + epsilon)
+    shift = beta - mean * scale
+
+    def call(inputs):
+        x = inputs[0]
+        shape = [1] * x.ndim
+        shape[axis] = -1
+        return x * scale.reshape(shape) + shift.reshape(shape)
+
+    return call
+
+def activation(config, weights):
+    function = _activation(config)
+    return lambda inputs: function(inputs[0])
+
+def merge(config, weights):
+    mode = config.get('mode', 'sum')
+    if mode == 'concat':
+        axis = config.get('concat_axis', -1)
+        return lambda inputs: np.concatenate(inputs, axis=axis)
+    if mode == 'sum':
+        return lambda inputs: sum(inputs[1:], inputs[0])
+    if mode == 'mul':
+        return lambda inputs: np.prod(inputs, axis=0)
+    if mode == 'ave':
+        return lambda inputs: np.mean(inputs, axis=0)
+    if mode == 'max':
+        return lambda inputs: np.max(inputs, axis=0)
+    raise NotImplementedError("Merge mode %s" % (mode))
+
+def flatten(config, weights):
+    return lambda inputs: inputs[0].reshape(len(inputs[0]), -1)
+
+def dense(config, weights):
+    function = _activation(config)
+    (kernel, bias) = (weights[0], weights[1]) if len(weights) > 1 else (weights[0], 0.0)
+    return lambda inputs: function(np.dot(inputs[0], kernel) + bias)
+
+layer_builders = {'InputLayer': input_layer,
+                  'Embedding': Embedding,
+                  'Convolution1D': Convolution1D,
+                  'MaxPooling1D': maxpooling1d,
+                  'BatchNormalization': batchnormalization,
+                  'Activation': activation,
+                  'Merge': merge,
+                  'Flatten': flatten,
+                  'Dense': dense,
+                  'Dropout': identity,
+                  'SpatialDropout1D': identity,
+                  'GaussianNoise': identity,
+                  'GaussianDropout': identity}
+
+def weight_count(class_name, config):
+    """Number of weight arrays a layer has, in model.get_weights() order"""
+    if class_name == 'Embedding':
+        return 1
+    if class_name in ('Convolution1D', 'Dense'):
+        return 2 if config.get('bias', True) else 1
+    if class_name == 'BatchNormalization':
+        return 4
+    return 0
+
+class NumpyModel:
+    """A functional Keras 1 model evaluated with NumPy.
+
+    Has the parts of the Keras Model interface the predictors use: inputs
+    (one entry per input layer) and predict(x, batch_size).
+
+    With dedup_tokens, a convolution reading straight from an embedding
+    (the first layer of every CNN branch) looks up and multiplies each
+    distinct token of the batch once instead of once per position; the
+    instances of one sentence share most of their tokens.  Batches with
+    more than dedup_ratio distinct tokens per position use the plain path.
+    """
+
+    def __init__(self, model_config, layer_weights, dedup_tokens=True):
+        if model_config.get('class_name') != 'Model':
+            raise NotImplementedError("%s models" % (model_config.get('class_name')))
+        config = model_config['config']
+
+        self.functions = {}
+        self.inbound = {}
+        for layer in config['layers']:
+            (class_name, name) = (layer['class_name'], layer['name'])
+            if not class_name in layer_builders:
+                raise NotImplementedError("%s layers" % (class_name))
+            if len(layer['inbound_nodes']) > 1:
+                raise NotImplementedError("layer %s is called more than once" % (name))
+
+            self.functions[name] = layer_builders[class_name](layer['config'], layer_weights.get(name, []))
+            self.inbound[name] = [node[0] for node in layer['inbound_nodes'][0]] if layer['inbound_nodes'] else []
+
+        self.inputs = [layer[0] for layer in config['input_layers']]
+        self.outputs = [layer[0] for layer in config['output_layers']]
+
+        ## convolution -> the embedding it reads
+        self.token_convs = {}
+        if dedup_tokens:
+            for (name, function) in self.functions.items():
+                if isinstance(function, Convolution1D) and len(self.inbound[name]) == 1:
+                    inbound = self.inbound[name][0]
+                    if isinstance(self.functions[inbound], Embedding):
+                        self.token_convs[name] = inbound
+
+    def _distinct_tokens(self, embedding, values):
+        """(rows, ids into rows) for the input of an embedding, None if not worth it"""
+        source = self.inbound[embedding][0]
+        if not ('distinct', source) in values:
+            ids = self._evaluate(source, values)
+            (tokens, inverse) = np.unique(ids, return_inverse=True)
+            if len(tokens) > dedup_ratio * ids.size:
+                values[('distinct', source)] = None
+            else:
+                values[('distinct', source)] = (tokens, inverse.reshape(ids.shape))
+
+        distinct = values[('distinct', source)]
+        if distinct is None:
+            return None
+        if not ('rows', embedding) in values:
+            values[('rows', embedding)] = self.functions[embedding].rows(distinct[0])
+        return values[('rows', embedding)], distinct[1]
+
+    def _evaluate(self, name, values):
+        if not name in values and name in self.token_convs:
+            tokens = self._distinct_tokens(self.token_convs[name], values)
+            if tokens is not None:
+                values[name] = self.functions[name].from_tokens(*tokens)
+
+        if not name in values:
+            inputs = [self._evaluate(inbound, values) for inbound in self.inbound[name]]
+            values[name] = self.functions[name](inputs)
+        return values[name]
+
+    def predict_batch(self, x):
+        if len(self.inputs) == 1:
+            x = [x]
+        values = dict(zip(self.inputs, x))
+        outputs = [self._evaluate(name, values) for name in self.outputs]
+        return outputs[0] if len(outputs) == 1 else outputs
+
+    def predict(self, x, batch_size=32):
+        """Like Model.predict; batches only bound the size of intermediate arrays"""
+        rows = len(x[0]) if len(self.inputs) > 1 else len(x)
+        if batch_size is None or rows <= batch_size:
+            return self.predict_batch(x)
+
+        parts = []
+        for start in range(0, rows, batch_size):
+            if len(self.inputs) > 1:
+                parts.append(self.predict_batch([part[start:start+batch_size] for part in x]))
+            else:
+                parts.append(self.predict_batch(x[start:start+batch_size]))
+        return np.concatenate(parts)
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+def _h5_weights(f):
+    group = f
+    if 'layer_names' not in f.attrs and 'model_weights' in f:
+        group = f['model_weights']
+    weights = {}
+    for name in group.attrs['layer_names']:
+        layer = group[name]
+        weights[_text(name)] = [np.asarray(layer[weight_name]) for weight_name in layer.attrs['weight_names']]
+    return weights
+
+def read_h5_weights(data):
+    """{layer name: [arrays]} from the bytes of a model_0.h5 file"""
+    import h5py
+    try:
+        f = h5py.File(io.BytesIO(data), 'r')
+    except Exception:
+        ## h5py before 2.9 only opens files by name
+        fd, path = tempfile.mkstemp(suffix='.h5')
+        try:
+            os.write(fd, data)
+            os.close(fd)
+            f = h5py.File(path, 'r')
+        finally:
+            os.remove(path)
+
+    try:
+        return _h5_weights(f)
+    finally:
+        f.close()
+
+def read_quantized_weights(data, model_config):
+    """{layer name: [arrays]} from the bytes of a model_0.q.npz file"""
+    arrays = np.load(io.BytesIO(data))
+    weights = {}
+    index = 0
+    for layer in model_config['config']['layers']:
+        layer_weights = []
+        for _ in range(weight_count(layer['class_name'], layer['config'])):
+            weight = arrays['w%d' % index]
+            if 'scale%d' % index in arrays.files:
+                weight = weight.astype(np.float32) * arrays['scale%d' % index]
+            elif weight.dtype != np.float16:
+                weight = weight.astype(np.float32)
+            layer_weights.append(weight)
+            index += 1
+        weights[layer['name']] = layer_weights
+    return weights
+
+def load_model(working_dir, dedup_tokens=True, quantized=None):
+    """Build the model in working_dir/script.model, return (NumpyModel, alphabets).
+
+    The quantized weights are used when the archive has them, unless
+    quantized is False; None leaves it to PREDICT_QUANTIZED.
+    """
+    if quantized is None:
+        quantized = use_quantized()
+    with ZipFile(os.path.join(working_dir, 'script.model'), 'r') as myzip:
+        names = set(myzip.namelist())
+        model_config = json.loads(myzip.read('model_0.json'))
+        alphabets = pickle.loads(myzip.read('alphabets.pkl'))
+        if quantized_name in names and (quantized or not 'model_0.h5' in names):
+            weights = read_quantized_weights(myzip.read(quantized_name), model_config)
+        else:
+            weights = read_h5_weights(myzip.read('model_0.h5'))
+
+    return NumpyModel(model_config, weights, dedup_tokens), alphabets
+
+def main(args):
+    if len(args) < 1:
+        sys.stderr.write("Error - one required argument: <model directory> [instances]\n")
+        sys.exit(-1)
+
+    working_dir = args[0]
+    count = int(args[1]) if len(args) > 1 else 100
+
+    model, alphabets = load_model(working_dir)
+    plain_model, _ = load_model(working_dir, dedup_tokens=False)
+    (feature_alphabet, maxlen) = (alphabets[0], alphabets[2])
+
+    ## instances drawn from the tokens of one long "sentence", like the
+    ## candidate pairs of a document, so the dedup path is exercised
+    rng = np.random.RandomState(1337)
+    sentence = rng.randint(0, len(feature_alphabet), maxlen)
+    x = rng.choice(sentence, (count, maxlen)).astype(np.int32)
+
+    import model_archive
+    keras_model, _ = model_archive.load_model(working_dir)
+    keras_out = keras_model.predict(x if len(keras_model.inputs) == 1 else [x] * len(keras_model.inputs), batch_size=count)
+
+    for (label, numpy_model) in (('deduplicated', model), ('plain', plain_model)):
+        start = time.time()
+        numpy_out = numpy_model.predict(x, batch_size=count)
+        seconds = time.time() - start
+        print("%s: max absolute difference %g, argmax agreement %.4f over %d instances, %.1f ms" %
+              (label, np.abs(numpy_out - keras_out).max(), (numpy_out.argmax(-1) == keras_out.argmax(-1)).mean(),
+               count, seconds * 1000))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""Fast-starting entry point shared by the predict scripts.
+
+    predict.py <kind> <model directory>
+
+where kind is dima, resnet or timex, as for classifier_server.py.  Only the
+standard library is imported up front; numpy, the inference engine and,
+for models that need it, Keras are imported while the predictor is built.
+Once the model is loaded a line such as
+
+    Startup 0.62s: interpreter 0.04s, imports 0.11s, model 0.47s
+
+is written to stderr, so a slow cold start can be traced to its cause.  Set
+PREDICT_STARTUP_REPORT=0 to leave it out.
+"""
+
+import os
+import sys
+import time
+
+REPORT_VAR = 'PREDICT_STARTUP_REPORT'
+
+def process_age():
+    """Seconds since this process was started, None without /proc"""
+    try:
+        with open('/proc/self/stat') as f:
+            ## fields after the parenthesized command name start at field 3
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        ## field 22 is the start time in clock ticks after boot
+        started = float(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+    return max(0.0, uptime - started)
+
+def startup_report(interpreter, imports, model):
+    if interpreter is None:
+        return "Startup %.2fs: imports %.2fs, model %.2fs" % (imports + model, imports, model)
+    return ("Startup %.2fs: interpreter %.2fs, imports %.2fs, model %.2fs"
+            % (interpreter + imports + model, interpreter, imports, model))
+
+def main(args):
+    if len(args) < 2:
+        sys.stderr.write("Error - two required arguments: <model kind> <model directory>\n")
+        sys.exit(-1)
+
+    (kind, working_dir) = args[:2]
+    interpreter = process_age()
+    entered = time.time()
+
+    from predictors import make_predictor, serve
+    imported = time.time()
+
+    predictor = make_predictor(kind, working_dir)
+    loaded = time.time()
+
+    if os.environ.get(REPORT_VAR, '1') != '0':
+        sys.stderr.write(startup_report(interpreter, imported - entered, loaded - imported) + '\n')
+
+    serve(predictor, sys.stdin, sys.stdout)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import threading
+
+import numpy as np
+
+import bucketing
+import numpy_engine
+import result_cache
+from line_batcher import LineBatcher, get_batch_settings
+from feature_encoder import FeatureEncoder, pad_flat
+
+## Which implementation runs the feed-forward models: 'numpy' (numpy_engine),
+## 'keras', or 'auto' for numpy_engine unless the model needs Keras.  Keras
+## and its backend are only imported when they are used.
+ENGINE_VAR = 'PREDICT_ENGINE'
+
+def _default_graph():
+    """The TensorFlow graph models are built in, None for other backends"""
+    from keras import backend as K
+    if K.backend() == 'tensorflow':
+        import tensorflow as tf
+        return tf.get_default_graph()
+    return None
+
+def load_sequence_model(working_dir, prepare_model=None):
+    """(model, alphabets) for working_dir with the engine ENGINE_VAR selects.
+
+    prepare_model is applied to Keras models only; numpy_engine does not load
+    the multi-input models it exists for.
+    """
+    engine = os.environ.get(ENGINE_VAR, 'auto')
+    if engine != 'keras':
+        try:
+            return numpy_engine.load_model(working_dir)
+        except NotImplementedError as e:
+            if engine == 'numpy':
+                raise
+            sys.stderr.write("Using Keras, numpy_engine does not support %s\n" % (e))
+
+    from model_archive import load_model
+    model, alphabets = load_model(working_dir)
+    if prepare_model is not None:
+        model = prepare_model(model)
+    return model, alphabets
+
+class Predictor:
+    """A loaded model that turns lines of features into lines of labels.
+
+    predict() is serialized with a per-model lock so one predictor can be
+    shared between the connection threads of classifier_server.py.  cache
+    is a result_cache.ResultCache or None.
+    """
+
+    def __init__(self, model, cache=None):
+        self.model = model
+        self.graph = None if isinstance(model, numpy_engine.NumpyModel) else _default_graph()
+        self.lock = threading.Lock()
+        self.cache = cache
+
+    def predict(self, x):
+        with self.lock:
+            if self.graph is None:
+                return self.model.predict(x, batch_size=len(x))
+            with self.graph.as_default():
+                return self.model.predict(x, batch_size=len(x))
+
+    def cached(self, keys, compute):
+        """Labels for the encoded inputs keys; compute(indices) labels the uncached ones"""
+        if self.cache is None:
+            return compute(range(len(keys)))
+        return self.cache.map(keys, compute)
+
+    def classify(self, lines):
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist the result cache, called when serve() ends"""
+        if self.cache is not None:
+            self.cache.save()
+
+    def stats(self):
+        """Lines summarizing the session, written to stderr when serve() ends"""
+        if self.cache is None:
+            return []
+        return [self.cache.stats()]
+
+class SequencePredictor(Predictor):
+    """One label per line of tokens: the docTimeRel/event-time CNNs and ResNet"""
+
+    def __init__(self, working_dir, prepare_model=None):
+        model, alphabets = load_sequence_model(working_dir, prepare_model)
+        Predictor.__init__(self, model, result_cache.open_cache(working_dir, 'sequence %s' % type(model).__name__))
+
+        (self.feature_alphabet, label_alphabet, self.maxlen) = alphabets
+        self.label_lookup = {val:key for (key,val) in label_alphabet.iteritems()}
+        self.num_inputs = len(model.inputs)
+        self.encoder = FeatureEncoder(self.feature_alphabet, oov=self.feature_alphabet["none"])
+
+    def classify(self, lines):
+        test_x, _ = self.encoder.encode_batch(lines, self.maxlen)
+        ## lines that encode to the same indices get the same label
+        keys = [row.tobytes() for row in test_x]
+        return self.cached(keys, lambda rows: self._labels(test_x[rows]))
+
+    def _labels(self, test_x):
+        ## models saved as Merge branches take one copy of the input per branch
+        if self.num_inputs > 1:
+            outs = self.predict([test_x] * self.num_inputs)
+        else:
+            outs = self.predict(test_x)
+
+        return [self.label_lookup[out.argmax()] for out in outs]
+
+## sentences longer than this many tokens are tagged in overlapping windows
+## of this size, bounding the cost of a line; 0 tags every line whole
+WINDOW_VAR = 'PREDICT_TIMEX_WINDOW'
+default_window = 128
+## tokens neighbouring windows share; their predictions are averaged there
+window_overlap = 32
+
+def padding_is_ignored(model, seq, padding=3):
+    """True if front padding leaves the outputs for seq unchanged.
+
+    Only a model whose every layer honours a masked padding index gives a
+    sentence the same labels alone and in a padded pass with longer ones.
+    """
+    alone = model.predict(np.array([seq], dtype=np.int32), batch_size=1)[0]
+    padded = model.predict(np.array([[0] * padding + list(seq)], dtype=np.int32), batch_size=1)[0]
+    return np.allclose(alone, padded[padding:], atol=1e-5)
+
+def repair_bio(labels, positions):
+    """Turn an I- label at positions that does not continue a chunk into B-.
+
+    Averaging the windows at an overlap can leave an I- after an O or
+    after a chunk of another type; the chunker would drop it.
+    """
+    for j in positions:
+        label = labels[j]
+        if not label.startswith('I'):
+            continue
+        previous = labels[j-1] if j > 0 else 'O'
+        if previous[1:] != label[1:] or previous[:1] not in ('B', 'I'):
+            labels[j] = 'B' + label[1:]
+    return labels
+
+class TimexPredictor(Predictor):
+    """A space-separated BIO label sequence per line of tokens.
+
+    Sentences sent together, e.g. every sentence of a document in one
+    "#batch", are padded per length bucket and tagged in one LSTM pass per
+    bucket.  The embedding masks the padding index, so every sentence gets
+    the labels it would get alone.  When index 0 is a real feature, or the
+    model cannot be built with a mask or ignores it (see
+    padding_is_ignored()), only sentences of equal length share a pass.
+    Sentences longer than PREDICT_TIMEX_WINDOW tokens are split into
+    overlapping windows, tagged with the rest of the batch and merged.
+    """
+
+    def __init__(self, working_dir):
+        from model_archive import load_model, read_alphabets
+        (self.feature_alphabet, label_alphabet) = read_alphabets(working_dir)
+
+        model = None
+        self.masked = not 0 in self.feature_alphabet.values()
+        if self.masked:
+            try:
+                model, _ = load_model(working_dir, mask_padding=True, variable_length=True)
+            except Exception as e:
+                sys.stderr.write("Padding is not masked, the model does not support it: %s\n" % (e))
+                self.masked = False
+        if self.masked and not padding_is_ignored(model, sorted(self.feature_alphabet.values())[:4]):
+            sys.stderr.write("Padding changes the labels of the masked model, tagging equal lengths together only\n")
+            self.masked = False
+        if model is None:
+            model, _ = load_model(working_dir, variable_length=True)
+
+        self.label_lookup = {val:key for (key,val) in label_alphabet.iteritems()}
+        self.padding = bucketing.PaddingReport()
+        self.window = int(os.environ.get(WINDOW_VAR, default_window))
+        self.overlap = min(window_overlap, self.window // 2)
+        self.windowed = 0
+
+        ## windowing and masking change the labels, so cached ones must match them
+        settings = 'timex window=%d overlap=%d masked=%s' % (self.window, self.overlap, self.masked)
+        Predictor.__init__(self, model, result_cache.open_cache(working_dir, settings))
+
+    def classify(self, lines):
+        import cleartk_io as ctk_io
+
+        seqs = [[ctk_io.read_bio_feats_with_alphabet(feat, self.feature_alphabet) for feat in line.split()] for line in lines]
+        keys = [np.asarray(seq, dtype=np.int32).tobytes() for seq in seqs]
+        return self.cached(keys, lambda todo: self._tag([seqs[i] for i in todo]))
+
+    def _tag(self, seqs):
+        """One label string per index sequence"""
+        ## (sentence, offset, length) of every piece to tag: the sentence
+        ## itself or, for a long one, its overlapping windows
+        pieces = []
+        for (i, seq) in enumerate(seqs):
+            if not seq:
+                continue
+            starts = bucketing.window_starts(len(seq), self.window, self.overlap)
+            if len(starts) > 1:
+                self.windowed += 1
+            length = self.window if len(starts) > 1 else len(seq)
+            pieces.extend((i, start, length) for start in starts)
+        lengths = [length for (i, start, length) in pieces]
+
+        ## class scores summed over the pieces covering each token
+        scores = [None] * len(seqs)
+        coverage = [np.zeros(len(seq), dtype=np.int32) for seq in seqs]
+
+        ## pieces of similar length share one padded forward pass; without
+        ## a mask the padding would change the labels, so only equal lengths
+        if self.masked:
+            ids = bucketing.assign_buckets(lengths, bucketing.inference_bounds)
+        else:
+            ids = lengths
+        for bucket in set(ids):
+            members = [p for p in range(len(pieces)) if ids[p] == bucket]
+            width = max(lengths[p] for p in members)
+            self.padding.add([lengths[p] for p in members], width, max(lengths))
+
+            tokens = np.concatenate([seqs[pieces[p][0]][pieces[p][1]:pieces[p][1]+lengths[p]] for p in members])
+            x = pad_flat(tokens.astype(np.int32), [lengths[p] for p in members], width)
+            outputs = self.predict(x)
+            for (p, output) in zip(members, outputs):
+                (i, start, length) = pieces[p]
+                ## padding is at the front, the piece is the last length steps
+                if scores[i] is None:
+                    scores[i] = np.zeros((len(seqs[i]), output.shape[-1]), dtype=output.dtype)
+                scores[i][start:start+length] += output[width-length:]
+                coverage[i][start:start+length] += 1
+
+        results = []
+        for i in range(len(seqs)):
+            pred_classes = scores[i].argmax(axis=-1) if scores[i] is not None else []
+            labels = [self.label_lookup[pred_class] for pred_class in pred_classes]
+            ## tokens at and right after an overlap can start a chunk there
+            overlaps = [j for j in range(len(labels)) if coverage[i][j] > 1 or (j > 0 and coverage[i][j-1] > 1)]
+            results.append(' '.join(repair_bio(labels, overlaps)))
+
+        return results
+
+    def stats(self):
+        lines = Predictor.stats(self) + [str(self.padding)]
+        if self.window > 0:
+            lines.append("Tagged %d sentences longer than %d tokens in windows" % (self.windowed, self.window))
+        return lines
+
+def _dima_predictor(working_dir):
+    def single_input_model(model):
+        ## dima_cnn lives in docTimeRel and imports Keras, so it is only
+        ## loaded when a Keras model needs rebuilding
+        import dima_cnn
+        return dima_cnn.single_input_model(model)
+
+    ## models trained as six Merge branches are rebuilt with a single input
+    return SequencePredictor(working_dir, prepare_model=single_input_model)
+
+predictor_factories = {
+    'dima': _dima_predictor,
+    'resnet': SequencePredictor,
+    'timex': TimexPredictor,
+}
+
+def make_predictor(kind, working_dir):
+    """The predictor for a dima, resnet or timex model directory"""
+    if not kind in predictor_factories:
+        raise Exception("Unknown model kind %s" % (kind))
+    return predictor_factories[kind](working_dir)
+
+## "#batch N" announces that the next N lines form one batch, answered with
+## N label lines once all of them have been read
+BATCH_HEADER = '#batch'
+
+def batch_count(line):
+    """N for a batch header line, None for an ordinary instance line"""
+    fields = line.split()
+    if len(fields) == 2 and fields[0] == BATCH_HEADER and fields[1].isdigit():
+        return int(fields[1])
+    return None
+
+def _answer(predictor, lines, outstream):
+    try:
+        labels = predictor.classify(lines)
+    except Exception as e:
+        labels = ["Exception thrown: %s" % (e)] * len(lines)
+
+    outstream.write(''.join(label + '\n' for label in labels))
+    outstream.flush()
+
+def serve(predictor, instream, outstream):
+    """Answer every line read from instream with one line on outstream.
+
+    Lines are classified in micro-batches (see line_batcher).  A caller that
+    has many instances at once, e.g. all candidate pairs of a sentence, can
+    instead send a "#batch N" header followed by the N instances; they are
+    classified as one batch however long reading them takes, and the N
+    labels are written together.  Reading stops at end of input or at the
+    first empty line outside a batch; a failed batch is answered with one
+    exception message per line so the caller never loses its place.
+    """
+    max_size, max_wait = get_batch_settings()
+    batcher = LineBatcher(instream, max_size, max_wait)
+
+    done = False
+    for lines in batcher:
+        while lines and not done:
+            count = batch_count(lines[0])
+            if count is not None:
+                group = lines[1:count+1]
+                lines = lines[count+1:]
+                if len(group) < count:
+                    group.extend(batcher.take(count - len(group)))
+            else:
+                ## plain lines up to the next header; an empty line ends the
+                ## session, classify whatever came before it
+                end = 0
+                while end < len(lines) and lines[end] != '' and batch_count(lines[end]) is None:
+                    end += 1
+                group = lines[:end]
+                done = end < len(lines) and lines[end] == ''
+                lines = lines[end:]
+
+            if group:
+                _answer(predictor, group, outstream)
+
+        if done:
+            break
+
+    predictor.flush()
+    for line in predictor.stats():
+        sys.stderr.write(line + '\n')
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""Quantized copies of model weights for smaller script.model archives.
+
+Embedding tables are stored as float16.  Every other weight matrix (Dense,
+convolution and recurrent kernels) is stored as int8 with one float32
+scale per output unit, see output_axis().  Biases and batch normalization
+parameters are small and stay float32.  The weights are expanded back to
+float32 when the model is loaded, since Keras layers compute in float32.
+
+export() writes model_0.q.npz next to model_0.h5 and measures the accuracy
+change on held-out data, so a trainer can archive the quantized weights
+alongside model_0.h5 when the change is negligible.  The predictors load
+model_0.q.npz when an archive has it, unless PREDICT_QUANTIZED is 0;
+model_0.h5 stays in the archive as the float32 original, e.g. for warm
+starts.
+"""
+
+import io
+import os
+import os.path
+
+import numpy as np
+
+quantized_name = 'model_0.q.npz'
+
+## largest accuracy drop, as a fraction, that still archives quantized weights
+max_accuracy_drop = 0.005
+
+## set to 0 to predict with model_0.h5 even when an archive has model_0.q.npz
+QUANTIZED_VAR = 'PREDICT_QUANTIZED'
+
+def use_quantized():
+    return os.environ.get(QUANTIZED_VAR, '1') != '0'
+
+def output_axis(layer, weight):
+    """The axis of a layer's weight that holds its output units.
+
+    The last one for Dense and recurrent kernels, and for Convolution1D,
+    which Keras 1 stores as (length, 1, input_dim, nb_filter) whatever the
+    dim_ordering.  The 2D and 3D convolutions put nb_filter first with the
+    'th' ordering.
+    """
+    if weight.ndim >= 4 and getattr(layer, 'dim_ordering', None) == 'th':
+        return 0
+    return weight.ndim - 1
+
+def quantize(model):
+    """Return the model's weights as a dict of arrays ready for np.savez"""
+    from keras.layers.embeddings import Embedding
+
+    arrays = {}
+    index = 0
+    for layer in model.layers:
+        for weight in layer.get_weights():
+            key = 'w%d' % index
+            if isinstance(layer, Embedding):
+                arrays[key] = weight.astype(np.float16)
+            elif weight.ndim >= 2:
+                ## symmetric, per output unit; the scale keeps its axis so
+                ## that it broadcasts against the weight in dequantize()
+                axis = output_axis(layer, weight)
+                axes = tuple(i for i in range(weight.ndim) if i != axis)
+                scale = np.abs(weight).max(axis=axes, keepdims=True) / 127.0
+                scale[scale == 0] = 1.0
+                arrays[key] = np.round(weight / scale).astype(np.int8)
+                arrays['scale%d' % index] = scale.astype(np.float32)
+            else:
+                arrays[key] = weight.astype(np.float32)
+            index += 1
+    return arrays
+
+def dequantize(arrays):
+    """float32 weights in model.get_weights() order"""
+    weights = []
+    index = 0
+    while 'w%d' % index in arrays:
+        weight = arrays['w%d' % index]
+        if 'scale%d' % index in arrays:
+            weights.append(weight.astype(np.float32) * arrays['scale%d' % index])
+        else:
+            weights.append(weight.astype(np.float32))
+        index += 1
+    return weights
+
+def load_quantized_weights(model, data):
+    """Set model weights from the bytes of a model_0.q.npz file"""
+    arrays = np.load(io.BytesIO(data))
+    model.set_weights(dequantize({key: arrays[key] for key in arrays.files}))
+
+def accuracy(model, batches):
+    """Fraction of argmax predictions matching y over the (x, y) batches.
+
+    y is one-hot or holds the label indices.
+    """
+    correct = 0
+    total = 0
+    for (x, y) in batches:
+        predicted = model.predict(x, batch_size=len(x)).argmax(axis=-1)
+        ## a trailing axis of 1 holds sparse indices, a wider one one-hot rows
+        gold = y.argmax(axis=-1) if y.ndim > predicted.ndim and y.shape[-1] > 1 else y.reshape(predicted.shape)
+        correct += (predicted == gold).sum()
+        total += gold.size
+    return float(correct) / total if total else 0.0
+
+def export(model, working_dir, valid_batches):
+    """Write model_0.q.npz and return (float32 accuracy, quantized accuracy).
+
+    valid_batches() returns the held-out (x, y) batches to measure on; it
+    is called once per weight set.  The model's own weights are restored
+    afterwards.
+    """
+    arrays = quantize(model)
+    np.savez(os.path.join(working_dir, quantized_name), **arrays)
+
+    original = model.get_weights()
+    full_accuracy = accuracy(model, valid_batches())
+    model.set_weights(dequantize(arrays))
+    quantized_accuracy = accuracy(model, valid_batches())
+    model.set_weights(original)
+
+    full_size = os.path.getsize(os.path.join(working_dir, 'model_0.h5'))
+    quantized_size = os.path.getsize(os.path.join(working_dir, quantized_name))
+    print("Quantized weights: %.1f MB instead of %.1f MB, held-out accuracy %.4f instead of %.4f (%+.4f)" %
+          (quantized_size / 1e6, full_size / 1e6, quantized_accuracy, full_accuracy, quantized_accuracy - full_accuracy))
+    return full_accuracy, quantized_accuracy
+
+def weights_members(accuracies):
+    """Names of the weights files to archive given export()'s accuracies"""
+    (full_accuracy, quantized_accuracy) = accuracies
+    if full_accuracy - quantized_accuracy <= max_accuracy_drop:
+        return ['model_0.h5', quantized_name]
+    print("Quantization costs more than %.1f%% accuracy, archiving float32 weights only" % (max_accuracy_drop * 100))
+    return ['model_0.h5']
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""Labels of recently classified inputs, so repeated inputs skip the model.
+
+Clinical notes repeat a lot of boilerplate, and the same token window
+comes back across thousands of documents.  A ResultCache maps the encoded
+index sequence of an input to the label the model gave it.  The cache is
+off unless PREDICT_CACHE_SIZE is set; it then keeps that many of the most
+recently used entries.  Only when PREDICT_CACHE_DIR is also set is the
+cache loaded from and saved to <dir>/<model fingerprint>.cache, so it
+survives between runs; otherwise it lives in memory only.  The
+fingerprint covers the model archive and the predictor settings, so a
+retrained model never sees labels from its predecessor.
+"""
+
+import hashlib
+import os
+import os.path
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+SIZE_VAR = 'PREDICT_CACHE_SIZE'
+DIR_VAR = 'PREDICT_CACHE_DIR'
+
+## no caching unless SIZE_VAR asks for it
+default_size = 0
+
+def model_fingerprint(working_dir, settings=''):
+    """SHA-1 of working_dir/script.model and the settings string"""
+    digest = hashlib.sha1(settings.encode('utf-8'))
+    with open(os.path.join(working_dir, 'script.model'), 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultCache:
+    """A least recently used map from input keys to labels"""
+
+    def __init__(self, capacity, path=None):
+        self.capacity = capacity
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                items = pickle.load(f)
+        except Exception as e:
+            sys.stderr.write("Ignoring unreadable result cache %s: %s\n" % (self.path, e))
+            return
+        for (key, label) in items[-self.capacity:]:
+            self.entries[key] = label
+
+    def get(self, key):
+        """The cached label for key, None if absent; a hit becomes most recent"""
+        with self.lock:
+            label = self.entries.pop(key, None)
+            if label is None:
+                self.misses += 1
+                return None
+            self.entries[key] = label
+            self.hits += 1
+            return label
+
+    def put(self, key, label):
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = label
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def map(self, keys, compute):
+        """Labels for every key, calling the model only for the uncached ones.
+
+        compute(indices) returns the labels of the keys at indices; a key
+        repeated within keys is computed once.
+        """
+        labels = [self.get(key) for key in keys]
+        first = {}
+        for (i, label) in enumerate(labels):
+            if label is None and not keys[i] in first:
+                first[keys[i]] = i
+        todo = sorted(first.values())
+        if todo:
+            computed = dict(zip([keys[i] for i in todo], compute(todo)))
+            for i in todo:
+                self.put(keys[i], computed[keys[i]])
+            labels = [label if label is not None else computed[key] for (key, label) in zip(keys, labels)]
+        return labels
+
+    def save(self):
+        """Write the entries to path, oldest first, if they changed"""
+        if self.path is None or not self.dirty:
+            return
+        with self.lock:
+            items = list(self.entries.items())
+            self.dirty = False
+
+        directory = os.path.dirname(self.path)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(items, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, self.path)
+        except Exception as e:
+            sys.stderr.write("Could not save result cache %s: %s\n" % (self.path, e))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return ("Result cache: %d hits in %d lookups (%.1f%%), %d of %d entries used"
+                % (self.hits, lookups, rate, len(self.entries), self.capacity))
+
+def open_cache(working_dir, settings=''):
+    """The ResultCache for a model directory as the environment configures it, None when disabled"""
+    capacity = int(os.environ.get(SIZE_VAR, default_size))
+    if capacity <= 0:
+        return None
+
+    path = None
+    directory = os.environ.get(DIR_VAR)
+    if directory:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, model_fingerprint(working_dir, settings) + '.cache')
+    return ResultCache(capacity, path)
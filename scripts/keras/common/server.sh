@@ -0,0 +1,23 @@
+#!/bin/bash
+
+## Start the shared classifier server, e.g.
+##   server.sh dima:<docTimeRel model dir> dima:<event-time model dir> timex:<timex model dir>
+## Add -w <n> before the models to fork n worker processes that share the
+## loaded weights, e.g. one per pipeline copy on an n-core machine.
+## With -w every preloaded model must run on numpy_engine, so timex models are
+## left to load on demand.
+## Set CLASSIFIER_SOCKET to use a socket other than
+## ${XDG_RUNTIME_DIR:-/tmp}/neural-temporal-<uid>/classifier.sock
+## and KERAS_ENV to point at a virtualenv other than the docTimeRel one.
+
+source ${KERAS_ENV:-$(dirname $0)/../../../../ctakes/ctakes-temporal/scripts/keras/env}/bin/activate
+
+export PYTHONPATH=$PYTHONPATH:$(dirname $0)/../../../../ctakes/ctakes-neural/scripts:$(dirname $0):$(dirname $0)/../docTimeRel
+
+python $(dirname $0)/classifier_server.py $*
+
+ret=$?
+
+deactivate
+
+exit $ret
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+"""On-disk cache of parsed ClearTK training data.
+
+cached_read(reader, working_dir) returns what reader(working_dir) returns,
+e.g. cleartk_io.read_token_sequence_data or read_bio_sequence_data:
+(labels, label_alphabet, feats, feats_alphabet).  The first call parses the
+data and stores the encoded sequences as flat .npy arrays plus lengths
+under <working_dir>/.tensor_cache, keyed by a hash of the data files.
+Later calls with unchanged data memory-map those arrays instead of parsing
+any text.
+
+Sequences come back as Ragged objects, which index, slice and iterate like
+the lists of lists the readers return and pad without a Python loop.
+"""
+
+import hashlib
+import os
+import os.path
+import pickle
+import shutil
+import sys
+import tempfile
+from fnmatch import fnmatch
+
+import numpy as np
+
+from feature_encoder import pad_flat
+
+cache_dir_name = '.tensor_cache'
+
+## files the trainers write into the data directory, not part of the data
+output_patterns = ('model_*', 'script.model', 'alphabets.pkl', 'alphabet.p', 'maxlen.p',
+                   '*.tmp', '*.json', '*.prof', '*.npz', '.*')
+
+def fingerprint(working_dir):
+    """SHA-1 over the names and contents of the data files in working_dir"""
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(working_dir)):
+        path = os.path.join(working_dir, name)
+        if not os.path.isfile(path) or any(fnmatch(name, pattern) for pattern in output_patterns):
+            continue
+        digest.update(name.encode('utf-8'))
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+class Ragged:
+    """Variable-length integer sequences stored back to back in one array"""
+
+    def __init__(self, flat, lengths):
+        self.flat = flat
+        self.lengths = np.asarray(lengths)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+
+    @staticmethod
+    def from_lists(seqs):
+        lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+        flat = np.fromiter((value for seq in seqs for value in seq), dtype=np.int32, count=lengths.sum())
+        return Ragged(flat, lengths)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Ragged only supports contiguous slices")
+            return Ragged(self.flat[self.offsets[start]:self.offsets[stop]], self.lengths[start:stop])
+        return self.flat[self.offsets[index]:self.offsets[index+1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, indices):
+        """Ragged holding the sequences at indices, in that order"""
+        lengths = self.lengths[indices]
+        starts = self.offsets[:-1][indices]
+        out_starts = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) + np.repeat(starts - out_starts, lengths)
+        return Ragged(self.flat[positions], lengths)
+
+    @staticmethod
+    def concatenate(parts):
+        return Ragged(np.concatenate([part.flat for part in parts]),
+                      np.concatenate([part.lengths for part in parts]))
+
+    def pad(self, maxlen):
+        """int32 (len, maxlen) matrix, front padded, long rows keep their start"""
+        return pad_flat(self.flat, self.lengths, maxlen)
+
+def _convert(labels, label_alphabet, feats, feats_alphabet):
+    """A reader's result with the sequences as Ragged and single labels as an array"""
+    ## BIO data has a label sequence per example, token data a single label
+    if len(labels) and hasattr(labels[0], '__len__'):
+        labels = Ragged.from_lists(labels)
+    else:
+        labels = np.array(labels, dtype=np.int32)
+    return labels, label_alphabet, Ragged.from_lists(feats), feats_alphabet
+
+def _save(path, labels, label_alphabet, feats, feats_alphabet):
+    np.save(os.path.join(path, 'feats_flat.npy'), feats.flat)
+    np.save(os.path.join(path, 'feats_lengths.npy'), feats.lengths)
+
+    if isinstance(labels, Ragged):
+        np.save(os.path.join(path, 'labels_flat.npy'), labels.flat)
+        np.save(os.path.join(path, 'labels_lengths.npy'), labels.lengths)
+    else:
+        np.save(os.path.join(path, 'labels.npy'), labels)
+
+    with open(os.path.join(path, 'alphabets.pkl'), 'wb') as f:
+        pickle.dump((label_alphabet, feats_alphabet), f, pickle.HIGHEST_PROTOCOL)
+
+def _load(path):
+    def load(name):
+        return np.load(os.path.join(path, name), mmap_mode='r')
+
+    feats = Ragged(load('feats_flat.npy'), load('feats_lengths.npy'))
+    if os.path.exists(os.path.join(path, 'labels.npy')):
+        labels = load('labels.npy')
+    else:
+        labels = Ragged(load('labels_flat.npy'), load('labels_lengths.npy'))
+
+    with open(os.path.join(path, 'alphabets.pkl'), 'rb') as f:
+        (label_alphabet, feats_alphabet) = pickle.load(f)
+    return labels, label_alphabet, feats, feats_alphabet
+
+def cached_read(reader, working_dir):
+    """reader(working_dir) with the result cached on disk, see module doc"""
+    cache_root = os.path.join(working_dir, cache_dir_name)
+    key = '%s-%s' % (reader.__name__, fingerprint(working_dir))
+    path = os.path.join(cache_root, key)
+
+    if os.path.isdir(path):
+        sys.stderr.write("Loading cached training data from %s\n" % (path))
+        return _load(path)
+
+    result = _convert(*reader(working_dir))
+
+    try:
+        if not os.path.isdir(cache_root):
+            os.makedirs(cache_root)
+        tmp_path = tempfile.mkdtemp(prefix=key, dir=cache_root)
+        _save(tmp_path, *result)
+        os.rename(tmp_path, path)
+
+        ## the data changed if an older entry from this reader is still around
+        for name in os.listdir(cache_root):
+            if name.startswith(reader.__name__ + '-') and name != key:
+                shutil.rmtree(os.path.join(cache_root, name), ignore_errors=True)
+    except (IOError, OSError) as e:
+        sys.stderr.write("Could not cache training data in %s: %s\n" % (cache_root, e))
+
+    ## if the cache could not be written the in-memory result has the same types
+    return _load(path) if os.path.isdir(path) else result
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""Training throughput and memory statistics as a Keras callback.
+
+    stats = TrainingStats(working_dir, 'dima_cnn')
+    model.fit(..., callbacks=[stats])
+
+writes <working_dir>/train_stats.json next to model_0.json when training
+ends: examples per second, time per batch split into data preparation
+(between batches, including generator waits) and compute (inside the
+batch), validation time, and the peak RSS of the process, per epoch and in
+total, along with the model size and the machine it ran on.
+
+Setting TRAIN_PROFILE=<first>:<last> runs cProfile over that range of
+batches, counted from the start of training, and writes
+train_profile.prof next to the statistics (read it with pstats).
+"""
+
+import cProfile
+import json
+import multiprocessing
+import os
+import os.path
+import platform
+import resource
+import time
+
+import numpy as np
+from keras.callbacks import Callback
+
+PROFILE_VAR = 'TRAIN_PROFILE'
+
+stats_name = 'train_stats.json'
+profile_name = 'train_profile.prof'
+
+def get_profile_window():
+    """(first, last) batch to profile from the environment, or None"""
+    value = os.environ.get(PROFILE_VAR)
+    if not value:
+        return None
+    (first, _, last) = value.partition(':')
+    first = int(first)
+    return first, int(last) if last else first
+
+def peak_rss_mb():
+    """High-water mark of this process; ru_maxrss is in KB on Linux, bytes on OS X"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024.0 * 1024.0) if platform.system() == 'Darwin' else maxrss / 1024.0
+
+class TrainingStats(Callback):
+
+    def __init__(self, working_dir, architecture, profile_window=None):
+        Callback.__init__(self)
+        self.working_dir = working_dir
+        self.architecture = architecture
+        self.profile_window = profile_window if profile_window is not None else get_profile_window()
+        self.profiler = None
+
+    def on_train_begin(self, logs={}):
+        self.train_start = time.time()
+        self.batch_count = 0
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs={}):
+        self.epoch_start = self.last_end = time.time()
+        self.examples = 0
+        self.data_time = 0.0
+        self.batch_times = []
+
+    def on_batch_begin(self, batch, logs={}):
+        now = time.time()
+        self.data_time += now - self.last_end
+        self.batch_start = now
+
+        if self.profile_window is not None and self.batch_count == self.profile_window[0]:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def on_batch_end(self, batch, logs={}):
+        now = time.time()
+        self.batch_times.append(now - self.batch_start)
+        self.examples += logs.get('size', 0)
+        self.last_end = now
+
+        if self.profiler is not None and self.batch_count == self.profile_window[1]:
+            self._dump_profile()
+        self.batch_count += 1
+
+    def on_epoch_end(self, epoch, logs={}):
+        now = time.time()
+        compute = sum(self.batch_times)
+        training = compute + self.data_time
+        ## Keras runs validation after the last batch, before this call
+        self.epochs.append({'epoch': epoch,
+                            'examples': self.examples,
+                            'seconds': now - self.epoch_start,
+                            'examples_per_sec': self.examples / training if training else 0.0,
+                            'data_seconds': self.data_time,
+                            'compute_seconds': compute,
+                            'validation_seconds': now - self.last_end,
+                            'batch_ms_p50': float(np.percentile(self.batch_times, 50)) * 1000 if self.batch_times else 0.0,
+                            'batch_ms_p99': float(np.percentile(self.batch_times, 99)) * 1000 if self.batch_times else 0.0,
+                            'peak_rss_mb': peak_rss_mb(),
+                            'loss': float(logs['loss']) if 'loss' in logs else None,
+                            'val_loss': float(logs['val_loss']) if 'val_loss' in logs else None})
+
+    def on_train_end(self, logs={}):
+        if self.profiler is not None:
+            self._dump_profile()
+
+        from keras import backend as K
+        examples = sum(epoch['examples'] for epoch in self.epochs)
+        compute = sum(epoch['compute_seconds'] for epoch in self.epochs)
+        data = sum(epoch['data_seconds'] for epoch in self.epochs)
+        stats = {'architecture': self.architecture,
+                 'params': self.model.count_params(),
+                 'machine': {'node': platform.node(),
+                             'processor': platform.processor(),
+                             'cpus': multiprocessing.cpu_count(),
+                             'backend': K.backend(),
+                             'python': platform.python_version()},
+                 'seconds': time.time() - self.train_start,
+                 'examples': examples,
+                 'examples_per_sec': examples / (data + compute) if data + compute else 0.0,
+                 'data_seconds': data,
+                 'compute_seconds': compute,
+                 'validation_seconds': sum(epoch['validation_seconds'] for epoch in self.epochs),
+                 'peak_rss_mb': peak_rss_mb(),
+                 'profile': self.profile_path() if self.profile_window is not None else None,
+                 'epochs': self.epochs}
+
+        with open(os.path.join(self.working_dir, stats_name), 'w') as f:
+            json.dump(stats, f, indent=2, sort_keys=True)
+
+    def profile_path(self):
+        return os.path.join(self.working_dir, profile_name)
+
+    def _dump_profile(self):
+        self.profiler.disable()
+        self.profiler.dump_stats(self.profile_path())
+        self.profiler = None
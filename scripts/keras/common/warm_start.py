@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+"""Fine-tune a previous script.model on new data instead of training from scratch.
+
+Set WARM_START_MODEL to the directory of the previous script.model.  The
+trainer then:
+- keeps the previous alphabets and adds any new tokens or labels after
+  them;
+- builds the same architecture with a larger embedding (and output layer,
+  for new labels) and copies the previous weights into it;
+- trains for warm_epochs on the new data.
+
+Set WARM_START_OLD_DATA to the previous training data directory to mix in
+a random sample of old instances (old_sample_ratio per new one), so the
+model does not drift away from the old data.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+import tensor_cache
+from tensor_cache import Ragged
+
+MODEL_VAR = 'WARM_START_MODEL'
+OLD_DATA_VAR = 'WARM_START_OLD_DATA'
+
+## old instances replayed per new instance
+old_sample_ratio = 1.0
+## epochs of fine-tuning
+warm_epochs = 3
+
+def get_settings():
+    """(previous model directory, old data directory), each None if unset"""
+    return os.environ.get(MODEL_VAR) or None, os.environ.get(OLD_DATA_VAR) or None
+
+def load_previous(model_dir):
+    """(Keras model, alphabets) of the script.model in model_dir"""
+    from model_archive import load_model
+    sys.stderr.write("Warm start from %s\n" % (os.path.join(model_dir, 'script.model')))
+    ## fine-tune from the float32 weights, not their quantized copy
+    return load_model(model_dir, quantized=False)
+
+def extend_alphabet(alphabet, new_alphabet):
+    """Return (alphabet plus the keys only in new_alphabet, new index -> extended index array).
+
+    Added keys get indices after the largest existing one, in the order of
+    their index in new_alphabet, so existing indices never move.
+    """
+    extended = dict(alphabet)
+    next_index = max(alphabet.values()) + 1 if alphabet else 0
+    remap = np.zeros(max(new_alphabet.values()) + 1 if new_alphabet else 0, dtype=np.int32)
+    for (key, index) in sorted(new_alphabet.items(), key=lambda item: item[1]):
+        if not key in extended:
+            extended[key] = next_index
+            next_index += 1
+        remap[index] = extended[key]
+    return extended, remap
+
+def _into(label_alphabet, feats_alphabet, data):
+    """data, a tensor_cache.cached_read() result, re-indexed into extended alphabets"""
+    (labels, data_label_alphabet, feats, data_feats_alphabet) = data
+    (label_alphabet, label_remap) = extend_alphabet(label_alphabet, data_label_alphabet)
+    (feats_alphabet, feats_remap) = extend_alphabet(feats_alphabet, data_feats_alphabet)
+
+    feats = Ragged(feats_remap[feats.flat], feats.lengths)
+    if isinstance(labels, Ragged):
+        labels = Ragged(label_remap[labels.flat], labels.lengths)
+    else:
+        labels = label_remap[np.asarray(labels)]
+    return labels, label_alphabet, feats, feats_alphabet
+
+def _take(seqs, indices):
+    return seqs.take(indices) if isinstance(seqs, Ragged) else seqs[indices]
+
+def _concatenate(parts):
+    return Ragged.concatenate(parts) if isinstance(parts[0], Ragged) else np.concatenate(parts)
+
+def prepare_data(previous_alphabets, data, reader, old_data_dir=None, seed=1337):
+    """Return data in the index space of the previous model, extended as needed.
+
+    previous_alphabets is (feats alphabet, label alphabet) of the previous
+    model and data what tensor_cache.cached_read(reader, ...) returned for
+    the new data.  With old_data_dir, a sample of the old instances is
+    appended.  Instances are shuffled, so the validation split that fit()
+    takes from the tail sees both.
+    """
+    (feats_alphabet, label_alphabet) = previous_alphabets
+    old_size = len(feats_alphabet)
+    (labels, label_alphabet, feats, feats_alphabet) = _into(label_alphabet, feats_alphabet, data)
+
+    rng = np.random.RandomState(seed)
+    if old_data_dir is not None:
+        old_data = tensor_cache.cached_read(reader, old_data_dir)
+        (old_labels, label_alphabet, old_feats, feats_alphabet) = _into(label_alphabet, feats_alphabet, old_data)
+        count = min(len(old_feats), int(old_sample_ratio * len(feats)))
+        sample = np.sort(rng.choice(len(old_feats), count, replace=False))
+        feats = Ragged.concatenate([feats, old_feats.take(sample)])
+        labels = _concatenate([labels, _take(old_labels, sample)])
+        print("Replaying %d of %d old instances" % (count, len(old_feats)))
+
+    order = rng.permutation(len(feats))
+    print("Alphabet grows from %d to %d features" % (old_size, len(feats_alphabet)))
+    return _take(labels, order), label_alphabet, feats.take(order), feats_alphabet
+
+def _embeddings(model):
+    from keras.layers.embeddings import Embedding
+    return [layer for layer in model.layers if isinstance(layer, Embedding)]
+
+def embedding_rows(model):
+    """Input dimension of the model's first embedding layer"""
+    embeddings = _embeddings(model)
+    if not embeddings:
+        raise ValueError("Model has no embedding layer")
+    return embeddings[0].input_dim
+
+def embedding_count(model):
+    """Number of embedding tables, e.g. 1 for a dima_cnn with a shared embedding"""
+    return len(_embeddings(model))
+
+def vocab_size(previous_model, previous_feats_alphabet, feats_alphabet):
+    """Embedding rows for the extended alphabet: one more per added feature"""
+    return embedding_rows(previous_model) + len(feats_alphabet) - len(previous_feats_alphabet)
+
+def transfer_weights(previous_model, model):
+    """Copy previous weights into a model of the same architecture.
+
+    Layers are matched in order.  Only the embedding rows (new features)
+    and the units of the output layer (new labels) may have grown; the
+    previous values fill the leading part and the rest keeps its fresh
+    initialization.  Any other difference in shape is an error.
+    """
+    previous_layers = [layer for layer in previous_model.layers if layer.get_weights()]
+    layers = [layer for layer in model.layers if layer.get_weights()]
+    if len(previous_layers) != len(layers):
+        raise ValueError("Previous model has %d layers with weights, the new one %d"
+                         % (len(previous_layers), len(layers)))
+
+    embeddings = _embeddings(model)
+    for (n, (previous_layer, layer)) in enumerate(zip(previous_layers, layers)):
+        weights = layer.get_weights()
+        previous_weights = previous_layer.get_weights()
+        if len(weights) != len(previous_weights):
+            raise ValueError("Layer %s does not match previous layer %s" % (layer.name, previous_layer.name))
+
+        for (weight, previous) in zip(weights, previous_weights):
+            if weight.ndim != previous.ndim:
+                raise ValueError("Layer %s does not match previous layer %s" % (layer.name, previous_layer.name))
+            for (axis, (new, old)) in enumerate(zip(weight.shape, previous.shape)):
+                if new == old:
+                    continue
+                ## embedding rows and, in the last layer, output units
+                growable = ((layer in embeddings and axis == 0) or
+                            (n == len(layers) - 1 and axis == weight.ndim - 1))
+                if not growable or new < old:
+                    raise ValueError("Layer %s has a weight of shape %s where previous layer %s has %s; "
+                                     "only embedding rows and output units may grow"
+                                     % (layer.name, weight.shape, previous_layer.name, previous.shape))
+            region = tuple(slice(0, old) for old in previous.shape)
+            weight[region] = previous
+        layer.set_weights(weights)
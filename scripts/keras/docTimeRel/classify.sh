@@ -1,15 +1,25 @@
 #!/bin/bash
 
-source $(dirname $0)/../../../../ctakes/ctakes-temporal/scripts/keras/env/bin/activate
+## hand the work to a running classifier_server.py if there is one; the
+## client exits with 2 before reading any input when the server is unusable
+if [ -S "${CLASSIFIER_SOCKET:-${XDG_RUNTIME_DIR:-/tmp}/neural-temporal-$(id -u)/classifier.sock}" ]; then
+    python $(dirname $0)/../common/classify_client.py dima $1
+    ret=$?
+    if [ $ret -ne 2 ]; then
+        exit $ret
+    fi
+fi
 
-export PYTHONPATH=$PYTHONPATH:$(dirname $0)/../../../../ctakes/ctakes-neural/scripts
+## run the virtualenv's interpreter directly, it finds its own site-packages
+## without sourcing activate
+python=$(dirname $0)/../../../../ctakes/ctakes-temporal/scripts/keras/env/bin/python
+
+export PYTHONPATH=$PYTHONPATH:$(dirname $0)/../../../../ctakes/ctakes-neural/scripts:$(dirname $0)/../common
 
 subdir=`dirname $0`
 
-python $(dirname $0)/dima-predict.py $* $subdir 2> python_err.out
+$python $(dirname $0)/dima-predict.py $* $subdir 2> python_err.out
 
 ret=$?
 
-deactivate
-
 exit $ret
\ No newline at end of file
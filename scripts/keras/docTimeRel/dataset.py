@@ -9,7 +9,7 @@ import ConfigParser
 
 import glob, string, collections, operator
 
-from fnmatch import fnmatch
+from feature_encoder import FeatureEncoder
 
 label2int = {
   'none':0,
@@ -32,6 +32,13 @@ label2int = {
 #   'overlap-1': 10,
 # }
 
+def one_hot(y, classes):
+  """(examples, classes) float32 rows for int labels y"""
+
+  rows = np.zeros((len(y), classes), dtype=np.float32)
+  rows[np.arange(len(y)), y] = 1
+  return rows
+
 class DatasetProvider:
   """THYME relation data"""
   
@@ -40,14 +47,14 @@ class DatasetProvider:
 
     self.alphabet = {} # words indexed by frequency
 
-    unigrams = [] # read entire corpus into a list
+    # count line by line, memory grows with the vocabulary not the corpus
+    unigram_counts = collections.Counter()
     for file_name in file_names:
       for line in open(file_name):
         label, text = line.strip().split('|')
-        unigrams.extend(text.split())
+        unigram_counts.update(text.split())
 
     index = 1 # zero used to encode unknown words
-    unigram_counts = collections.Counter(unigrams)
     self.alphabet['oov_word'] = 0
     for unigram, count in unigram_counts.most_common():
       self.alphabet[unigram] = index
@@ -56,36 +63,129 @@ class DatasetProvider:
   def load(self, path):
     """Convert sentences (examples) into lists of indices"""
 
+    encoder = FeatureEncoder(self.alphabet)
     examples = []
     labels = []
     for line in open(path):
       label, text = line.strip().split('|')
-      example = []
-      for unigram in text.split():
-        example.append(self.alphabet[unigram])
-      examples.append(example)
+      examples.append(encoder.encode(text).tolist())
       labels.append(label2int[label])
 
     return examples, labels
 
   def load_if_oov(self, path):
 
+    encoder = FeatureEncoder(self.alphabet, oov=self.alphabet["none"])
     examples = []
     labels = []
     for line in open(path):
       label,text = line.strip().split('|')
-      example = []
-      for unigram in text.split():
-        if(self.alphabet.has_key(unigram)):
-            example.append(self.alphabet[unigram])
-        else:
-            example.append(self.alphabet["none"])
-      examples.append(example)
+      examples.append(encoder.encode(text).tolist())
       labels.append(label2int[label])
 
     return examples, labels
 
+  def scan(self, path):
+    """Return (number of examples, longest example, label counts) in one pass"""
+
+    count = 0
+    maxlen = 0
+    label_counts = collections.Counter()
+    for line in open(path):
+      label, text = line.strip().split('|')
+      count = count + 1
+      maxlen = max(maxlen, len(text.split()))
+      label_counts[label2int[label]] += 1
+
+    return count, maxlen, label_counts
+
+  def iter_chunks(self, path, chunk_size, maxlen, start=0, stop=None, oov=None):
+    """Yield (x, y) numpy chunks of up to chunk_size examples.
+
+    x is an int32 (chunk, maxlen) matrix padded like pad_sequences, y the
+    int label vector.  Only examples start <= i < stop are used, and at most
+    one chunk of lines is held in memory at a time.
+    """
+
+    encoder = FeatureEncoder(self.alphabet, oov=oov)
+    texts = []
+    labels = []
+    for (i, line) in enumerate(open(path)):
+      if i < start:
+        continue
+      if stop is not None and i >= stop:
+        break
+      label, text = line.strip().split('|')
+      texts.append(text)
+      labels.append(label2int[label])
+      if len(texts) == chunk_size:
+        yield encoder.encode_batch(texts, maxlen)[0], np.array(labels)
+        texts = []
+        labels = []
+
+    if texts:
+      yield encoder.encode_batch(texts, maxlen)[0], np.array(labels)
+
+  def chunk_offsets(self, path, chunk_size, start=0, stop=None):
+    """Return [file offset, number of examples] of every chunk_size examples in start <= i < stop"""
+
+    chunks = []
+    f = open(path)
+    i = 0
+    while stop is None or i < stop:
+      offset = f.tell()
+      if not f.readline():
+        break
+      if i >= start:
+        if (i - start) % chunk_size == 0:
+          chunks.append([offset, 0])
+        chunks[-1][1] += 1
+      i = i + 1
+    f.close()
+
+    return chunks
+
+  def read_chunk(self, path, offset, count, encoder, maxlen):
+    """The (x, y) chunk of count examples starting at a chunk_offsets() offset"""
+
+    texts = []
+    labels = []
+    f = open(path)
+    f.seek(offset)
+    for i in range(count):
+      label, text = f.readline().strip().split('|')
+      texts.append(text)
+      labels.append(label2int[label])
+    f.close()
+
+    return encoder.encode_batch(texts, maxlen)[0], np.array(labels)
+
+  def batch_generator(self, path, batch_size, maxlen, classes, start=0, stop=None, oov=None,
+                      shuffle=False, shuffle_size=10000):
+    """Endless (x, one-hot y) batches for fit_generator, re-reading path every pass.
+
+    With shuffle every pass reads the chunks of shuffle_size examples in a
+    new order and shuffles the examples within each chunk, so batches mix
+    like fit(shuffle=True) with at most one chunk in memory.
+    """
+
+    if not shuffle:
+      while True:
+        for x, y in self.iter_chunks(path, batch_size, maxlen, start, stop, oov):
+          yield x, one_hot(y, classes)
+
+    encoder = FeatureEncoder(self.alphabet, oov=oov)
+    chunks = self.chunk_offsets(path, shuffle_size, start, stop)
+    while True:
+      for c in np.random.permutation(len(chunks)):
+        x, y = self.read_chunk(path, chunks[c][0], chunks[c][1], encoder, maxlen)
+        rows = np.random.permutation(len(y))
+        for b in range(0, len(rows), batch_size):
+          batch = rows[b:b + batch_size]
+          yield x[batch], one_hot(y[batch], classes)
+
   def load_by_region(self, path):
+    encoder = FeatureEncoder(self.alphabet)
     pres = []
     arg1s = []
     conts = []
@@ -94,7 +194,7 @@ class DatasetProvider:
     labels = []
     for line in open(path):
       label,text = line.strip().split('|')
-      pre,arg1,cont,arg2,post = self.processText(text)
+      pre,arg1,cont,arg2,post = self.processText(text, encoder)
       pres.append(pre)
       arg1s.append(arg1)
       conts.append(cont)
@@ -104,32 +204,12 @@ class DatasetProvider:
 
     return pres, arg1s, conts, arg2s, posts, labels
 
-  def processText(self, text):
-    pre= []
-    arg1= []
-    cont= []
-    arg2= []
-    post= []
-
-    tag = 0
-    for unigram in text.split():
-      idx = self.alphabet[unigram]
-      if( fnmatch(unigram, '<*>')):
-        tag = tag + 1
-        continue
-      if(tag ==0 ):
-        pre.append(idx)
-      elif(tag == 1):
-        arg1.append(idx)
-      elif(tag == 2):
-        cont.append(idx)
-      elif(tag == 3):
-        arg2.append(idx)
-      elif(tag == 4):
-        post.append(idx)
-
-    return pre, arg1, cont, arg2, post
+  def processText(self, text, encoder=None):
+    """Split an instance at its <tag> tokens into pre, arg1, cont, arg2, post"""
 
+    if encoder is None:
+      encoder = FeatureEncoder(self.alphabet)
+    return tuple(encoder.regions(text))
 
 
 if __name__ == "__main__":
@@ -12,6 +12,12 @@ import sys
 import os.path
 
 import dataset
+import bucketing
+import tensor_cache
+from train_stats import TrainingStats
+import quantize
+import warm_start
+import dima_cnn
 
 import keras as k
 from keras.utils.np_utils import to_categorical
@@ -39,6 +45,21 @@ def _bn_relu_conv(nb_filter, subsample=1):
 
     return f
 
+## set to True to feed all six convolution branches from one embedding table;
+## by default every branch has its own table, as the original Merge model did
+shared_embedding = False
+
+## percentile of instance lengths used as the input width; 100 keeps every
+## token, a lower value narrows the model by truncating the longest instances
+maxlen_percentile = 100
+
+## also write int8/float16 weights, archived next to model_0.h5 when they
+## cost at most quantize.max_accuracy_drop on the validation split
+export_quantized = False
+
+## integer targets with sparse_categorical_crossentropy instead of one-hot rows
+sparse_labels = True
+
 def main(args):
     if len(args) < 1:
         sys.stderr.write("Error - one required argument: <data directory>\n")
@@ -46,18 +67,35 @@ def main(args):
 
     working_dir = args[0]
 
-    (train_y, label_alphabet, train_x, feats_alphabet) = ctk_io.read_token_sequence_data(working_dir)
+    (train_y, label_alphabet, train_x, feats_alphabet) = tensor_cache.cached_read(ctk_io.read_token_sequence_data, working_dir)
 
+    (warm_dir, old_data_dir) = warm_start.get_settings()
+    previous_model = None
+    if warm_dir is not None:
+        ## fine-tune the previous model; its width is fixed by its weights
+        (previous_model, (previous_feats, previous_labels, maxlen)) = warm_start.load_previous(warm_dir)
+        previous_model = dima_cnn.single_input_model(previous_model)
+        (train_y, label_alphabet, train_x, feats_alphabet) = warm_start.prepare_data(
+            (previous_feats, previous_labels), (train_y, label_alphabet, train_x, feats_alphabet),
+            ctk_io.read_token_sequence_data, old_data_dir)
 
     init_vectors = None #used for pre-trained embeddings
     
     # turn x and y into numpy array among other things
-    maxlen = max([len(seq) for seq in train_x])
+    ## the flattened conv output fixes the input width; it is the longest
+    ## instance unless maxlen_percentile opts into truncating the tail
+    lengths = train_x.lengths
+    if previous_model is None:
+        maxlen = bucketing.capped_maxlen(lengths, maxlen_percentile)
+    print(bucketing.capped_summary(lengths, maxlen))
     outcomes = set(train_y)
-    classes = len(outcomes)
+    classes = len(outcomes) if previous_model is None else len(label_alphabet)
 
-    train_x = pad_sequences(train_x, maxlen=maxlen)
-    train_y = to_categorical(np.array(train_y), classes)
+    train_x = train_x.pad(maxlen)
+    if sparse_labels:
+        train_y = np.asarray(train_y, dtype='int32').reshape(-1, 1)
+    else:
+        train_y = to_categorical(np.array(train_y), classes)
 
     #pickle.dump(maxlen, open(os.path.join(working_dir, 'maxlen.p'),"wb"))
     #pickle.dump(dataset1.alphabet, open(os.path.join(working_dir, 'alphabet.p'),"wb"))
@@ -67,72 +105,38 @@ def main(args):
     print 'train_x shape:', train_x.shape
     print 'train_y shape:', train_y.shape
 
-    branches = [] # models to be merged
-    train_xs = [] # train x for each branch
-    #test_xs = []  # test x for each branch
-
-    filtlens = "1,2,3,4,5"
-    for filter_len in filtlens.split(','):
-        branch = Sequential()
-        branch.add(Embedding(len(feats_alphabet),
-                         300,
-                         input_length=maxlen,
-                         weights=init_vectors))
-        branch.add(Convolution1D(nb_filter=200,
-                             filter_length=int(filter_len),
-                             border_mode='valid',
-                             activation='relu',
-                             subsample_length=1))
-        branch.add(MaxPooling1D(pool_length=2))
-        branch.add(Flatten())
-
-        branches.append(branch)
-        train_xs.append(train_x)
-        #test_xs.append(test_x)
-    branch = Sequential()
-    branch.add(Embedding(len(feats_alphabet),
-                         300,
-                         input_length=maxlen,
-                         weights=init_vectors))
-    branch.add(Convolution1D(nb_filter=200,
-                             filter_length=3,
-                             border_mode='valid',
-                             activation='relu',
-                             subsample_length=1))
-    branch.add(Convolution1D(nb_filter=200,
-                             filter_length=3,
-                             border_mode='same',
-                             activation='relu',
-                             subsample_length=1))
-    branch.add(MaxPooling1D(pool_length=2))
-    branch.add(Flatten())
-
-    branches.append(branch)
-    train_xs.append(train_x)
-
-    model = Sequential()
-    model.add(Merge(branches, mode='concat'))
-
-    model.add(Dense(250))#cfg.getint('cnn', 'hidden')))
-    model.add(Dropout(0.25))#cfg.getfloat('cnn', 'dropout')))
-    model.add(Activation('relu'))
-
-    model.add(Dropout(0.25))#cfg.getfloat('cnn', 'dropout')))
-    model.add(Dense(classes))
-    model.add(Activation('softmax'))
+    vocab_size = len(feats_alphabet)
+    nb_epoch = 20 #cfg.getint('cnn', 'epochs')
+    if previous_model is not None:
+        vocab_size = warm_start.vocab_size(previous_model, previous_feats, feats_alphabet)
+        nb_epoch = warm_start.warm_epochs
+
+    ## a warm start keeps the previous layout: models trained before the
+    ## shared embedding have one table per branch
+    shared = shared_embedding
+    if previous_model is not None:
+        shared = warm_start.embedding_count(previous_model) == 1
+
+    model, _ = dima_cnn.multi_cnn(maxlen, vocab_size, classes,
+                                  embed_dim=300,
+                                  weights=init_vectors,
+                                  shared_embedding=shared)
+    if previous_model is not None:
+        warm_start.transfer_weights(previous_model, model)
 
     optimizer = RMSprop(lr=0.0001,#cfg.getfloat('cnn', 'learnrt'),
                       rho=0.9, epsilon=1e-08)
-    model.compile(loss='categorical_crossentropy',
+    model.compile(loss='sparse_categorical_crossentropy' if sparse_labels else 'categorical_crossentropy',
                 optimizer=optimizer,
                 metrics=['accuracy'])
-    model.fit(train_xs,
+    model.fit(train_x,
             train_y,
-            nb_epoch=20,#cfg.getint('cnn', 'epochs'),
+            nb_epoch=nb_epoch,
             batch_size=50,#cfg.getint('cnn', 'batches'),
             verbose=1,
             validation_split=0.1,
-            class_weight=None)
+            class_weight=None,
+            callbacks=[TrainingStats(working_dir, 'dima_cnn')])
 
     model.summary()
 
@@ -140,13 +144,21 @@ def main(args):
     open(os.path.join(working_dir, 'model_0.json'), 'w').write(json_string)
     model.save_weights(os.path.join(working_dir, 'model_0.h5'), overwrite=True)
 
+    weights_members = ['model_0.h5']
+    if export_quantized:
+        ## the same tail fit() held out for validation
+        split_at = int(len(train_x) * (1. - 0.1))
+        accuracies = quantize.export(model, working_dir, lambda: [(train_x[split_at:], train_y[split_at:])])
+        weights_members = quantize.weights_members(accuracies)
+
     fn = open(os.path.join(working_dir, 'alphabets.pkl'), 'w')
     pickle.dump( (feats_alphabet, label_alphabet, maxlen), fn)
     fn.close()
 
     with ZipFile(os.path.join(working_dir, 'script.model'), 'w') as myzip:
         myzip.write(os.path.join(working_dir, 'model_0.json'), 'model_0.json')
-        myzip.write(os.path.join(working_dir, 'model_0.h5'), 'model_0.h5')
+        for name in weights_members:
+            myzip.write(os.path.join(working_dir, name), name)
         myzip.write(os.path.join(working_dir, 'alphabets.pkl'), 'alphabets.pkl')
 
     sys.exit(0)
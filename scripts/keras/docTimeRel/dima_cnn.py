@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+import sys
+import os.path
+import pickle
+import shutil
+import tempfile
+from zipfile import ZipFile
+
+import numpy as np
+
+from keras.models import Model
+from keras.layers import Input, merge
+from keras.layers.core import Dense, Dropout, Activation, Flatten
+from keras.layers.convolutional import Convolution1D, MaxPooling1D
+from keras.layers.embeddings import Embedding
+
+import model_archive
+
+## One entry per branch, each a list of (nb_filter, filter_length, border_mode)
+## convolutions.  Five single-conv branches with filter lengths 1-5 plus one
+## branch stacking two length-3 convolutions.
+dima_branches = [ [(200, 1, 'valid')],
+                  [(200, 2, 'valid')],
+                  [(200, 3, 'valid')],
+                  [(200, 4, 'valid')],
+                  [(200, 5, 'valid')],
+                  [(200, 3, 'valid'), (200, 3, 'same')] ]
+
+def multi_cnn(maxlen, vocab_size, classes, embed_dim=300, branches=dima_branches,
+              shared_embedding=False, weights=None, trainable=True, pool_length=2,
+              hidden=250, dropout=0.25):
+    """Build the multi-filter CNN with the functional API.
+
+    The model takes a single (batch, maxlen) int32 input.  By default each
+    branch gets its own embedding table, which reproduces the old
+    Merge-of-Sequentials architecture with a single input; with
+    shared_embedding=True one table fans out to every convolution branch.
+
+    Returns (model, layer_map) where layer_map lists the layers with weights
+    as [(embedding, [conv, ...]) per branch] + [dense_hidden, dense_out], the
+    order convert_merge_model() relies on.
+    """
+    input = Input(shape=(maxlen,), dtype='int32')
+
+    init = None if weights is None else [weights]
+
+    def embedding():
+        return Embedding(vocab_size, embed_dim, input_length=maxlen,
+                         weights=init, trainable=trainable)
+
+    shared = embedding() if shared_embedding else None
+    shared_embeds = shared(input) if shared_embedding else None
+
+    flats = []
+    branch_layers = []
+    for convs in branches:
+        if shared_embedding:
+            embed_layer = shared
+            x = shared_embeds
+        else:
+            embed_layer = embedding()
+            x = embed_layer(input)
+
+        conv_layers = []
+        for (nb_filter, filter_length, border_mode) in convs:
+            conv = Convolution1D(nb_filter=nb_filter,
+                                 filter_length=filter_length,
+                                 border_mode=border_mode,
+                                 activation='relu',
+                                 subsample_length=1)
+            x = conv(x)
+            conv_layers.append(conv)
+
+        x = MaxPooling1D(pool_length=pool_length)(x)
+        flats.append(Flatten()(x))
+        branch_layers.append((embed_layer, conv_layers))
+
+    hidden_layer = Dense(hidden)
+    output_layer = Dense(classes)
+
+    x = merge(flats, mode='concat')
+    x = hidden_layer(x)
+    x = Dropout(dropout)(x)
+    x = Activation('relu')(x)
+    x = Dropout(dropout)(x)
+    x = output_layer(x)
+    output = Activation('softmax')(x)
+
+    model = Model(input=input, output=output)
+    return model, branch_layers + [hidden_layer, output_layer]
+
+def convert_merge_model(old_model):
+    """Convert a Sequential(Merge(branches)) model into a single-input model.
+
+    The converted model computes exactly the same function.  If every branch
+    of the old model holds an identical embedding table (pre-trained, frozen
+    embeddings) the table is stored once and shared; otherwise each branch
+    keeps its own table but all branches read the same input tensor, so
+    callers pass the padded matrix once instead of once per branch.
+
+    Running this file with a model directory converts its script.model,
+    so later predict runs skip the conversion; the new archive replaces the
+    old one in a single rename.
+    """
+    merge_layer = old_model.layers[0]
+    old_branches = merge_layer.layers
+    dense_layers = [layer for layer in old_model.layers[1:] if isinstance(layer, Dense)]
+    dropouts = [layer for layer in old_model.layers[1:] if isinstance(layer, Dropout)]
+
+    specs = []
+    old_branch_layers = []
+    for branch in old_branches:
+        embed_layer = branch.layers[0]
+        conv_layers = [layer for layer in branch.layers if isinstance(layer, Convolution1D)]
+        pool_layer = [layer for layer in branch.layers if isinstance(layer, MaxPooling1D)][0]
+        specs.append([(conv.nb_filter, conv.filter_length, conv.border_mode) for conv in conv_layers])
+        old_branch_layers.append((embed_layer, conv_layers))
+
+    tables = [embed.get_weights()[0] for (embed, convs) in old_branch_layers]
+    shared = all(np.array_equal(tables[0], table) for table in tables[1:])
+
+    first_embed = old_branch_layers[0][0]
+    model, layer_map = multi_cnn(first_embed.input_length,
+                                 first_embed.input_dim,
+                                 dense_layers[-1].output_dim,
+                                 embed_dim=first_embed.output_dim,
+                                 branches=specs,
+                                 shared_embedding=shared,
+                                 pool_length=pool_layer.pool_length,
+                                 hidden=dense_layers[0].output_dim,
+                                 dropout=dropouts[0].p if dropouts else 0.)
+
+    for (new_branch, old_branch) in zip(layer_map[:-2], old_branch_layers):
+        (new_embed, new_convs) = new_branch
+        (old_embed, old_convs) = old_branch
+        new_embed.set_weights(old_embed.get_weights())
+        for (new_conv, old_conv) in zip(new_convs, old_convs):
+            new_conv.set_weights(old_conv.get_weights())
+
+    for (new_dense, old_dense) in zip(layer_map[-2:], dense_layers):
+        new_dense.set_weights(old_dense.get_weights())
+
+    return model
+
+def single_input_model(model):
+    """Return model unchanged if it takes one input, converted otherwise"""
+    if len(model.inputs) > 1:
+        return convert_merge_model(model)
+    return model
+
+def main(args):
+    if len(args) < 1:
+        sys.stderr.write("Error - one required argument: <model directory>\n")
+        sys.exit(-1)
+
+    working_dir = args[0]
+
+    ## the float32 weights, a converted archive has no quantized copy
+    model, alphabets = model_archive.load_model(working_dir, quantized=False)
+
+    if len(model.inputs) == 1:
+        print("Model already takes a single input, nothing to convert")
+        sys.exit(0)
+
+    model = convert_merge_model(model)
+    model.summary()
+
+    ## build the new archive next to the old one and swap it in with one
+    ## rename, so a predictor never reads a half-written script.model
+    build_dir = tempfile.mkdtemp(dir=working_dir)
+    try:
+        model.save_weights(os.path.join(build_dir, 'model_0.h5'), overwrite=True)
+        archive = os.path.join(build_dir, 'script.model')
+        with ZipFile(archive, 'w') as myzip:
+            myzip.writestr('model_0.json', model.to_json())
+            myzip.write(os.path.join(build_dir, 'model_0.h5'), 'model_0.h5')
+            myzip.writestr('alphabets.pkl', pickle.dumps(alphabets))
+        os.rename(archive, os.path.join(working_dir, 'script.model'))
+    finally:
+        shutil.rmtree(build_dir)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
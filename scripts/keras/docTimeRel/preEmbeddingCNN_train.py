@@ -12,6 +12,9 @@ import sys
 import os.path
 
 import dataset
+import dima_cnn
+import embedding_store
+import tensor_cache
 
 import keras as k
 from keras.utils.np_utils import to_categorical
@@ -39,6 +42,9 @@ def _bn_relu_conv(nb_filter, subsample=1):
 
     return f
 
+## integer targets with sparse_categorical_crossentropy instead of one-hot rows
+sparse_labels = True
+
 def main(args):
     if len(args) < 1:
         sys.stderr.write("Error - one required argument: <data directory>\n")
@@ -46,14 +52,14 @@ def main(args):
 
     working_dir = args[0]
 
-    (train_y, label_alphabet, train_x, feats_alphabet) = ctk_io.read_token_sequence_data(working_dir)
+    (train_y, label_alphabet, train_x, feats_alphabet) = tensor_cache.cached_read(ctk_io.read_token_sequence_data, working_dir)
 
 
     init_vectors = None #used for pre-trained embeddings
 
     #load embeddings file
     embedingFile = '/Users/chenlin/Programming/ctakesWorkspace/neural-temporal/src/main/resources/org/apache/ctakes/temporal/thyme_word2vec_timex_50.vec'
-    weights = ctk_io.read_embeddings(embedingFile, feats_alphabet)
+    weights = embedding_store.read_embeddings(embedingFile, feats_alphabet)
     # if len(args) > 1 and best_config['pretrain'] == True:
     #     weights = ctk_io.read_embeddings(args[1], feats_alphabet)
     # elif best_config['pretrain'] and len(args) == 1:
@@ -61,12 +67,15 @@ def main(args):
     #     sys.exit(-1)
     
     # turn x and y into numpy array among other things
-    maxlen = max([len(seq) for seq in train_x])
+    maxlen = int(train_x.lengths.max())
     outcomes = set(train_y)
     classes = len(outcomes)
 
-    train_x = pad_sequences(train_x, maxlen=maxlen)
-    train_y = to_categorical(np.array(train_y), classes)
+    train_x = train_x.pad(maxlen)
+    if sparse_labels:
+        train_y = np.asarray(train_y, dtype='int32').reshape(-1, 1)
+    else:
+        train_y = to_categorical(np.array(train_y), classes)
 
     #pickle.dump(maxlen, open(os.path.join(working_dir, 'maxlen.p'),"wb"))
     #pickle.dump(dataset1.alphabet, open(os.path.join(working_dir, 'alphabet.p'),"wb"))
@@ -76,68 +85,20 @@ def main(args):
     print 'train_x shape:', train_x.shape
     print 'train_y shape:', train_y.shape
 
-    branches = [] # models to be merged
-    train_xs = [] # train x for each branch
-    #test_xs = []  # test x for each branch
-
-    filtlens = "1,2,3,4,5"
-    for filter_len in filtlens.split(','):
-        branch = Sequential()
-        branch.add(Embedding(len(feats_alphabet),
-                         weights.shape[1],
-                         input_length=maxlen,
-                         weights=[weights],
-                         trainable = False))
-        branch.add(Convolution1D(nb_filter=200,
-                             filter_length=int(filter_len),
-                             border_mode='valid',
-                             activation='relu',
-                             subsample_length=1))
-        branch.add(MaxPooling1D(pool_length=2))
-        branch.add(Flatten())
-
-        branches.append(branch)
-        train_xs.append(train_x)
-        #test_xs.append(test_x)
-    branch = Sequential()
-    branch.add(Embedding(len(feats_alphabet),
-                         weights.shape[1],
-                         input_length=maxlen,
-                         weights=[weights],
-                         trainable = False))
-    branch.add(Convolution1D(nb_filter=200,
-                             filter_length=3,
-                             border_mode='valid',
-                             activation='relu',
-                             subsample_length=1))
-    branch.add(Convolution1D(nb_filter=200,
-                             filter_length=3,
-                             border_mode='same',
-                             activation='relu',
-                             subsample_length=1))
-    branch.add(MaxPooling1D(pool_length=2))
-    branch.add(Flatten())
-
-    branches.append(branch)
-    train_xs.append(train_x)
-
-    model = Sequential()
-    model.add(Merge(branches, mode='concat'))
-
-    model.add(Dense(250))#cfg.getint('cnn', 'hidden')))
-    model.add(Dropout(0.25))#cfg.getfloat('cnn', 'dropout')))
-    model.add(Activation('relu'))
-
-    model.add(Dropout(0.25))#cfg.getfloat('cnn', 'dropout')))
-    model.add(Dense(classes))
-    model.add(Activation('softmax'))
+    ## the pre-trained embeddings are frozen, so one shared table replaces
+    ## six identical copies
+    model, _ = dima_cnn.multi_cnn(maxlen, len(feats_alphabet), classes,
+                                  embed_dim=weights.shape[1],
+                                  weights=weights,
+                                  trainable=False,
+                                  shared_embedding=True)
 
     optimizer = RMSprop(lr=0.0001,#cfg.getfloat('cnn', 'learnrt'),
                       rho=0.9, epsilon=1e-08)
-    model.compile(loss='categorical_crossentropy',
+    model.compile(loss='sparse_categorical_crossentropy' if sparse_labels else 'categorical_crossentropy',
                 optimizer=optimizer,
                 metrics=['accuracy'])
-    model.fit(train_xs,
+    model.fit(train_x,
             train_y,
             nb_epoch=20,#cfg.getint('cnn', 'epochs'),
             batch_size=50,#cfg.getint('cnn', 'batches'),
@@ -12,6 +12,10 @@ import sys
 import os.path
 
 import dataset
+import bucketing
+import tensor_cache
+from train_stats import TrainingStats
+import quantize
 
 import keras as k
 from keras.utils.np_utils import to_categorical
@@ -99,6 +103,21 @@ def resnet(maxlen, alphabet, classes):
     model = Model(input=input, output=dense)
     return model
 
+## percentile of instance lengths used as the input width; 100 keeps every
+## token, a lower value narrows the model by truncating the longest instances
+maxlen_percentile = 100
+
+## also write int8/float16 weights, archived next to model_0.h5 when they
+## cost at most quantize.max_accuracy_drop on the validation split
+export_quantized = False
+
+batch_size = 50
+validation_split = 0.1
+## batches fit_generator() prepares ahead on its background thread
+prefetch_batches = 10
+## integer targets with sparse_categorical_crossentropy instead of one-hot rows
+sparse_labels = True
+
 def main(args):
     if len(args) < 1:
         sys.stderr.write("Error - one required argument: <data directory>\n")
@@ -106,25 +125,39 @@ def main(args):
 
     working_dir = args[0]
 
-    (train_y, label_alphabet, train_x, feats_alphabet) = ctk_io.read_token_sequence_data(working_dir)
+    (train_y, label_alphabet, train_x, feats_alphabet) = tensor_cache.cached_read(ctk_io.read_token_sequence_data, working_dir)
 
     init_vectors = None #used for pre-trained embeddings
     
     # turn x and y into numpy array among other things
-    maxlen = max([len(seq) for seq in train_x])
+    ## the flattened conv output fixes the input width; it is the longest
+    ## instance unless maxlen_percentile opts into truncating the tail
+    lengths = train_x.lengths
+    maxlen = bucketing.capped_maxlen(lengths, maxlen_percentile)
+    print(bucketing.capped_summary(lengths, maxlen))
     outcomes = set(train_y)
     classes = len(outcomes)
 
-    train_x = pad_sequences(train_x, maxlen=maxlen)
-    train_y = to_categorical(np.array(train_y), classes)
+    ## batches are padded and their labels expanded as they are needed, from
+    ## the memory-mapped cache, so memory does not grow with the corpus
+    if sparse_labels:
+        y_transform = lambda y: y.reshape(-1, 1)
+    else:
+        y_transform = lambda y: to_categorical(y, classes)
+
+    ## hold out the same tail validation_split would
+    split_at = int(len(train_x) * (1. - validation_split))
+    valid_x = train_x[split_at:]
+    valid_y = train_y[split_at:]
+    train_x = train_x[:split_at]
+    train_y = train_y[:split_at]
 
     #pickle.dump(maxlen, open(os.path.join(working_dir, 'maxlen.p'),"wb"))
     #pickle.dump(dataset1.alphabet, open(os.path.join(working_dir, 'alphabet.p'),"wb"))
     #test_x = pad_sequences(test_x, maxlen=maxlen)
     #test_y = to_categorical(np.array(test_y), classes)
 
-    print 'train_x shape:', train_x.shape
-    print 'train_y shape:', train_y.shape
+    print 'train instances:', len(train_x), 'validation instances:', len(valid_x), 'width:', maxlen
 
     #branches = [] # models to be merged
     #train_xs = [] # train x for each branch
@@ -134,16 +167,18 @@ def main(args):
 
     optimizer = RMSprop(lr=0.0001,#cfg.getfloat('cnn', 'learnrt'),
                       rho=0.9, epsilon=1e-08)
-    model.compile(loss='categorical_crossentropy',
+    model.compile(loss='sparse_categorical_crossentropy' if sparse_labels else 'categorical_crossentropy',
                 optimizer=optimizer,
                 metrics= ['accuracy'])#{'0':'accuracy'})#
-    model.fit(train_x,
-            train_y,
+    model.fit_generator(bucketing.padded_generator(train_x, train_y, batch_size, maxlen, y_transform),
+            samples_per_epoch=len(train_x),
             nb_epoch=10,#cfg.getint('cnn', 'epochs'),
-            batch_size=50,#cfg.getint('cnn', 'batches'),
             verbose=1,
-            validation_split=0.1,
-            class_weight=None)
+            validation_data=bucketing.padded_generator(valid_x, valid_y, batch_size, maxlen, y_transform, shuffle=False),
+            nb_val_samples=len(valid_x),
+            class_weight=None,
+            max_q_size=prefetch_batches,
+            callbacks=[TrainingStats(working_dir, 'resnet')])
 
     model.summary()
 
@@ -151,13 +186,20 @@ def main(args):
     open(os.path.join(working_dir, 'model_0.json'), 'w').write(json_string)
     model.save_weights(os.path.join(working_dir, 'model_0.h5'), overwrite=True)
 
+    weights_members = ['model_0.h5']
+    if export_quantized:
+        accuracies = quantize.export(model, working_dir,
+                                     lambda: bucketing.padded_batches(valid_x, valid_y, batch_size, maxlen, y_transform))
+        weights_members = quantize.weights_members(accuracies)
+
     fn = open(os.path.join(working_dir, 'alphabets.pkl'), 'w')
     pickle.dump( (feats_alphabet, label_alphabet, maxlen), fn)
     fn.close()
 
     with ZipFile(os.path.join(working_dir, 'script.model'), 'w') as myzip:
         myzip.write(os.path.join(working_dir, 'model_0.json'), 'model_0.json')
-        myzip.write(os.path.join(working_dir, 'model_0.h5'), 'model_0.h5')
+        for name in weights_members:
+            myzip.write(os.path.join(working_dir, name), name)
         myzip.write(os.path.join(working_dir, 'alphabets.pkl'), 'alphabets.pkl')
     sys.exit(0)
 
@@ -2,7 +2,7 @@
 
 source $(dirname $0)/../../../../ctakes/ctakes-temporal/scripts/keras/env/bin/activate
 
-export PYTHONPATH=$PYTHONPATH:$(dirname $0)/../../../../ctakes/ctakes-neural/scripts
+export PYTHONPATH=$PYTHONPATH:$(dirname $0)/../../../../ctakes/ctakes-neural/scripts:$(dirname $0)/../common
 
 subdir=`dirname $0`
 
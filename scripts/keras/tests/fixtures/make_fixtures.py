@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""Write the Keras reference outputs test_numpy_engine.py compares against.
+
+Run with Keras 1 and docTimeRel on the path:
+
+    PYTHONPATH=../../common:../../docTimeRel python make_fixtures.py
+
+For every model this writes <name>.json, the config as Keras saves it, and
+<name>.npz holding the weights of every layer ('<layer>/<index>'), a batch
+of inputs 'x', the Keras predictions 'y' and the 'backend' they came from.
+"""
+
+import json
+import os.path
+import sys
+
+import numpy as np
+
+from keras import backend as K
+from keras.layers import Input, merge
+from keras.layers.core import Dense, Activation, Flatten
+from keras.layers.convolutional import Convolution1D, MaxPooling1D
+from keras.layers.embeddings import Embedding
+from keras.layers.normalization import BatchNormalization
+from keras.models import Model
+
+import dima_cnn
+
+vocab_size = 30
+maxlen = 12
+
+def dima_model():
+    """The docTimeRel/event-time CNN from dima_cnn.py, narrowed"""
+    branches = [[(6, 3, 'valid')], [(5, 2, 'valid'), (4, 3, 'same')]]
+    model, _ = dima_cnn.multi_cnn(maxlen, vocab_size, 3, embed_dim=8, branches=branches, hidden=10)
+    return model
+
+def resnet_model():
+    """A residual block shaped like resnet_train.py: strided 'same' convs, batch normalization, sum"""
+    input = Input(shape=(maxlen,), dtype='int32')
+    embeds = Embedding(vocab_size, 8, input_length=maxlen)(input)
+    conv = Convolution1D(nb_filter=6, filter_length=3, subsample_length=2, border_mode='same')(embeds)
+    conv = Activation('relu')(BatchNormalization(mode=0)(conv))
+    pool = MaxPooling1D(pool_length=2)(conv)
+
+    norm = BatchNormalization(mode=0)(pool)
+    residual = Activation('relu')(Convolution1D(nb_filter=4, filter_length=3, border_mode='same')(norm))
+    shortcut = Convolution1D(nb_filter=4, filter_length=3, border_mode='same')(pool)
+    block = merge([shortcut, residual], mode='sum')
+
+    output = Dense(3, activation='softmax')(Flatten()(block))
+    return Model(input=input, output=output)
+
+def randomize(model, rng):
+    """Random weights, with positive variances and scales for batch normalization"""
+    for layer in model.layers:
+        weights = [rng.uniform(-0.5, 0.5, w.shape).astype(np.float32) for w in layer.get_weights()]
+        if isinstance(layer, BatchNormalization):
+            weights[0] = rng.uniform(0.5, 1.5, weights[0].shape).astype(np.float32)
+            weights[3] = rng.uniform(0.5, 2.0, weights[3].shape).astype(np.float32)
+        layer.set_weights(weights)
+
+def write(name, model, rng):
+    randomize(model, rng)
+    ## repeated tokens, so numpy_engine's deduplication is exercised
+    x = rng.randint(0, vocab_size // 3, (10, maxlen)).astype(np.int32)
+    arrays = {'x': x, 'y': model.predict(x), 'backend': np.array(K.backend())}
+    for layer in model.layers:
+        for (i, weight) in enumerate(layer.get_weights()):
+            arrays['%s/%d' % (layer.name, i)] = weight
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(directory, name + '.json'), 'w') as f:
+        f.write(model.to_json())
+    np.savez(os.path.join(directory, name + '.npz'), **arrays)
+
+def main(args):
+    rng = np.random.RandomState(11)
+    write('dima_cnn', dima_model(), rng)
+    write('resnet_block', resnet_model(), rng)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
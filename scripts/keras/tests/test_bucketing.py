@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import numpy as np
+
+import bucketing
+
+def keras_1():
+    try:
+        import keras
+    except ImportError:
+        return False
+    return keras.__version__.startswith('1.')
+
+class VariableLengthConfigTest(unittest.TestCase):
+
+    def test_drops_the_step_dimension(self):
+        config = {'class_name': 'Sequential', 'config': [
+            {'class_name': 'Embedding', 'config': {'input_dim': 10, 'input_length': 40, 'batch_input_shape': [None, 40]}},
+            {'class_name': 'LSTM', 'config': {'output_dim': 4, 'input_length': 40}},
+            {'class_name': 'TimeDistributed', 'config': {'layer': {'class_name': 'Dense', 'config': {'output_dim': 3}}}}]}
+        bucketing.variable_length_config(config)
+
+        layers = config['config']
+        self.assertEqual(layers[0]['config']['input_length'], None)
+        self.assertEqual(layers[0]['config']['batch_input_shape'], [None, None])
+        self.assertEqual(layers[1]['config']['input_length'], None)
+        self.assertEqual(layers[2]['config']['layer']['config'], {'output_dim': 3})
+
+@unittest.skipUnless(keras_1(), "needs Keras 1")
+class VariableLengthModelTest(unittest.TestCase):
+
+    def tagger(self, maxlen):
+        from keras.layers import Embedding, LSTM, Dense
+        from keras.layers.wrappers import TimeDistributed
+        from keras.models import Sequential
+
+        model = Sequential()
+        model.add(Embedding(10, 4, input_length=maxlen))
+        model.add(LSTM(5, return_sequences=True))
+        model.add(TimeDistributed(Dense(3, activation='softmax')))
+        model.compile(loss='categorical_crossentropy', optimizer='rmsprop', metrics=['accuracy'])
+        return model
+
+    def test_trains_on_a_short_bucket(self):
+        model = bucketing.variable_length_model(self.tagger(12))
+        rng = np.random.RandomState(3)
+        x = rng.randint(1, 10, (4, 5)).astype(np.int32)
+        y = np.eye(3)[rng.randint(0, 3, (4, 5))]
+
+        before = [w.copy() for w in model.get_weights()]
+        model.train_on_batch(x, y)
+        self.assertEqual(model.predict(x).shape, (4, 5, 3))
+        self.assertTrue(any(not np.allclose(b, a) for (b, a) in zip(before, model.get_weights())))
+
+    def test_keeps_weights(self):
+        fixed = self.tagger(6)
+        x = np.random.RandomState(4).randint(1, 10, (2, 6)).astype(np.int32)
+        np.testing.assert_allclose(bucketing.variable_length_model(fixed).predict(x), fixed.predict(x), rtol=1e-5, atol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+try:
+    import classifier_server
+except ImportError:
+    ## SocketServer, the server runs under Python 2 only
+    classifier_server = None
+
+class StubPredictor:
+    def __init__(self, model):
+        self.model = model
+
+if classifier_server is not None:
+    class EmptyNumpyModel(classifier_server.NumpyModel):
+        def __init__(self):
+            pass
+
+@unittest.skipIf(classifier_server is None, "needs Python 2")
+class SocketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, 'classifier.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_removes_a_stale_socket(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.socket_path)
+        sock.close()
+
+        self.assertTrue(classifier_server.remove_stale_socket(self.socket_path))
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_keeps_a_live_socket(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.socket_path)
+        sock.listen(1)
+        try:
+            self.assertFalse(classifier_server.remove_stale_socket(self.socket_path))
+            self.assertTrue(os.path.exists(self.socket_path))
+        finally:
+            sock.close()
+
+    def test_private_socket_dir(self):
+        socket_path = os.path.join(self.directory, 'neural-temporal', 'classifier.sock')
+        classifier_server.private_socket_dir(socket_path)
+        self.assertEqual(os.stat(os.path.dirname(socket_path)).st_mode & 0o777, 0o700)
+
+        os.chmod(os.path.dirname(socket_path), 0o755)
+        self.assertRaises(Exception, classifier_server.private_socket_dir, socket_path)
+
+    def test_default_socket_is_per_user(self):
+        directory = os.path.dirname(classifier_server.default_socket())
+        self.assertTrue(directory.endswith('neural-temporal-%d' % os.getuid()))
+
+@unittest.skipIf(classifier_server is None, "needs Python 2")
+class RegistryTest(unittest.TestCase):
+
+    def test_keras_models(self):
+        registry = classifier_server.PredictorRegistry()
+        registry.predictors[('dima', '/numpy')] = StubPredictor(EmptyNumpyModel())
+        self.assertEqual(registry.keras_models(), [])
+
+        registry.predictors[('timex', '/keras')] = StubPredictor(object())
+        self.assertEqual(registry.keras_models(), [('timex', '/keras')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import numpy as np
+
+import embedding_store
+
+vectors = """3 3
+the 0.1 0.2 0.3
+patient -1.5 2.0 0.25
+denies 3 -4 5e-1
+"""
+
+def cleartk_io_available():
+    try:
+        import cleartk_io
+    except ImportError:
+        return False
+    return True
+
+class ReadEmbeddingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.vec_path = os.path.join(self.directory, 'small.vec')
+        with open(self.vec_path, 'w') as f:
+            f.write(vectors)
+        self.alphabet = {'none': 0, 'patient': 1, 'the': 2, 'fever': 3, 'denies': 4}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def text_rows(self):
+        """Vectors straight from the text file"""
+        rows = {}
+        for line in vectors.splitlines()[1:]:
+            fields = line.split()
+            rows[fields[0]] = np.array([float(value) for value in fields[1:]], dtype=np.float32)
+        return rows
+
+    def test_known_words_match_the_text_file(self):
+        weights = embedding_store.read_embeddings(self.vec_path, self.alphabet)
+        self.assertEqual(weights.shape, (5, 3))
+        for (word, row) in self.text_rows().items():
+            np.testing.assert_array_equal(weights[self.alphabet[word]], row)
+        for word in ('none', 'fever'):
+            self.assertTrue(np.all(np.abs(weights[self.alphabet[word]]) <= embedding_store.unknown_scale))
+
+    def test_stored_copy_matches_the_first_read(self):
+        first = embedding_store.read_embeddings(self.vec_path, self.alphabet)
+        self.assertTrue(embedding_store.is_current(self.vec_path))
+        np.testing.assert_array_equal(embedding_store.read_embeddings(self.vec_path, self.alphabet), first)
+
+    def test_leaves_the_global_random_state_alone(self):
+        np.random.seed(5)
+        expected = np.random.uniform(size=4)
+        np.random.seed(5)
+        embedding_store.read_embeddings(self.vec_path, self.alphabet)
+        np.testing.assert_array_equal(np.random.uniform(size=4), expected)
+
+    @unittest.skipUnless(cleartk_io_available(), "needs cleartk_io from ctakes-neural")
+    def test_matches_cleartk_io(self):
+        import cleartk_io as ctk_io
+        text = ctk_io.read_embeddings(self.vec_path, self.alphabet)
+        weights = embedding_store.read_embeddings(self.vec_path, self.alphabet)
+        for word in self.text_rows():
+            np.testing.assert_allclose(weights[self.alphabet[word]], text[self.alphabet[word]], rtol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
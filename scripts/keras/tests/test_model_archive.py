@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from zipfile import ZipFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import numpy as np
+
+def keras_1():
+    try:
+        import keras
+    except ImportError:
+        return False
+    return keras.__version__.startswith('1.')
+
+@unittest.skipUnless(keras_1(), "needs Keras 1")
+class LoadModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.alphabets = ({'a': 1, 'b': 2}, {'yes': 0, 'no': 1}, 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def write_archive(self, model):
+        build_dir = tempfile.mkdtemp()
+        try:
+            model.save_weights(os.path.join(build_dir, 'model_0.h5'))
+            with ZipFile(os.path.join(self.working_dir, 'script.model'), 'w') as myzip:
+                myzip.writestr('model_0.json', model.to_json())
+                myzip.write(os.path.join(build_dir, 'model_0.h5'), 'model_0.h5')
+                myzip.writestr('alphabets.pkl', pickle.dumps(self.alphabets))
+        finally:
+            shutil.rmtree(build_dir)
+
+    def check(self, model):
+        import model_archive
+        self.write_archive(model)
+        (loaded, alphabets) = model_archive.load_model(self.working_dir)
+
+        self.assertEqual(alphabets, self.alphabets)
+        x = np.random.RandomState(5).randint(0, 3, (4, 5)).astype(np.int32)
+        np.testing.assert_allclose(loaded.predict(x), model.predict(x), rtol=1e-5, atol=1e-6)
+        ## nothing is extracted next to the archive, and the model is built once
+        self.assertEqual(os.listdir(self.working_dir), ['script.model'])
+        self.assertTrue(model_archive.load_model(self.working_dir)[0] is loaded)
+
+    def test_sequential(self):
+        from keras.layers import Embedding, Flatten, Dense
+        from keras.models import Sequential
+
+        model = Sequential()
+        model.add(Embedding(3, 2, input_length=5))
+        model.add(Flatten())
+        model.add(Dense(2, activation='softmax'))
+        self.check(model)
+
+    def test_functional(self):
+        from keras.layers import Input, Embedding, Flatten, Dense
+        from keras.models import Model
+
+        input = Input(shape=(5,), dtype='int32')
+        output = Dense(2, activation='softmax')(Flatten()(Embedding(3, 2)(input)))
+        self.check(Model(input=input, output=output))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+import io
+import json
+import os
+import os.path
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from zipfile import ZipFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import numpy as np
+
+import numpy_engine
+
+vocab_size = 20
+embed_dim = 4
+filters = 3
+filter_length = 2
+maxlen = 7
+classes = 3
+
+def layer(class_name, name, config, inbound):
+    return {'class_name': class_name, 'name': name, 'config': dict(config, name=name),
+            'inbound_nodes': [[[source, 0, 0] for source in inbound]] if inbound else []}
+
+def cnn_config():
+    """Input -> Embedding -> Convolution1D -> MaxPooling1D -> Flatten -> Dense, as Keras 1 saves it"""
+    layers = [layer('InputLayer', 'input', {}, []),
+              layer('Embedding', 'embedding', {}, ['input']),
+              layer('Convolution1D', 'conv', {'filter_length': filter_length, 'activation': 'relu'}, ['embedding']),
+              layer('MaxPooling1D', 'pool', {'pool_length': 2}, ['conv']),
+              layer('Flatten', 'flatten', {}, ['pool']),
+              layer('Dense', 'dense', {'activation': 'softmax'}, ['flatten'])]
+    return {'class_name': 'Model',
+            'config': {'layers': layers, 'input_layers': [['input', 0, 0]], 'output_layers': [['dense', 0, 0]]}}
+
+def random_weights(rng):
+    pooled = (maxlen - filter_length + 1) // 2
+    return {'embedding': [rng.randn(vocab_size, embed_dim).astype(np.float32)],
+            'conv': [rng.randn(filter_length, 1, embed_dim, filters).astype(np.float32),
+                     rng.randn(filters).astype(np.float32)],
+            'dense': [rng.randn(pooled * filters, classes).astype(np.float32),
+                      rng.randn(classes).astype(np.float32)]}
+
+def reference(weights, x):
+    """The same network written out step by step"""
+    embedded = weights['embedding'][0][x]
+    (kernel, bias) = (weights['conv'][0][:, 0], weights['conv'][1])
+    steps = maxlen - filter_length + 1
+    conv = np.zeros((len(x), steps, filters))
+    for t in range(steps):
+        for offset in range(filter_length):
+            conv[:, t] += np.dot(embedded[:, t + offset], kernel[offset])
+    conv = np.maximum(conv + bias, 0)
+    pooled = np.maximum(conv[:, 0:steps - 1:2], conv[:, 1:steps:2])
+    scores = np.dot(pooled.reshape(len(x), -1), weights['dense'][0]) + weights['dense'][1]
+    scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+    return scores / scores.sum(axis=-1, keepdims=True)
+
+class NumpyModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = os.environ.get('KERAS_BACKEND')
+        os.environ['KERAS_BACKEND'] = 'tensorflow'
+        rng = np.random.RandomState(7)
+        self.weights = random_weights(rng)
+        ## few distinct tokens, so the deduplicated path is taken
+        self.x = rng.randint(0, 5, (12, maxlen)).astype(np.int32)
+
+    def tearDown(self):
+        if self.backend is None:
+            del os.environ['KERAS_BACKEND']
+        else:
+            os.environ['KERAS_BACKEND'] = self.backend
+
+    def test_matches_reference(self):
+        model = numpy_engine.NumpyModel(cnn_config(), self.weights, dedup_tokens=False)
+        np.testing.assert_allclose(model.predict(self.x), reference(self.weights, self.x), rtol=1e-4, atol=1e-6)
+
+    def test_dedup_matches_plain(self):
+        plain = numpy_engine.NumpyModel(cnn_config(), self.weights, dedup_tokens=False)
+        dedup = numpy_engine.NumpyModel(cnn_config(), self.weights)
+        self.assertTrue(dedup.token_convs)
+        np.testing.assert_allclose(dedup.predict(self.x), plain.predict(self.x), rtol=1e-5, atol=1e-6)
+
+    def test_small_batches(self):
+        model = numpy_engine.NumpyModel(cnn_config(), self.weights)
+        np.testing.assert_allclose(model.predict(self.x, batch_size=5), model.predict(self.x), rtol=1e-5, atol=1e-6)
+
+    def test_unsupported_layer(self):
+        config = cnn_config()
+        config['config']['layers'][4]['class_name'] = 'LSTM'
+        self.assertRaises(NotImplementedError, numpy_engine.NumpyModel, config, self.weights)
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class SavedKerasOutputTest(unittest.TestCase):
+    """NumpyModel against predictions Keras made, see fixtures/make_fixtures.py"""
+
+    def setUp(self):
+        self.backend = os.environ.get('KERAS_BACKEND')
+
+    def tearDown(self):
+        if self.backend is None:
+            os.environ.pop('KERAS_BACKEND', None)
+        else:
+            os.environ['KERAS_BACKEND'] = self.backend
+
+    def check(self, name):
+        with open(os.path.join(fixtures, name + '.json')) as f:
+            config = json.load(f)
+        arrays = np.load(os.path.join(fixtures, name + '.npz'))
+        ## the backend decides whether convolution kernels are flipped
+        os.environ['KERAS_BACKEND'] = str(arrays['backend'])
+
+        weights = {}
+        for layer in config['config']['layers']:
+            count = numpy_engine.weight_count(layer['class_name'], layer['config'])
+            weights[layer['name']] = [arrays['%s/%d' % (layer['name'], i)] for i in range(count)]
+
+        for dedup_tokens in (False, True):
+            model = numpy_engine.NumpyModel(config, weights, dedup_tokens)
+            np.testing.assert_allclose(model.predict(arrays['x']), arrays['y'], rtol=1e-4, atol=1e-6)
+
+    def test_dima_cnn(self):
+        self.check('dima_cnn')
+
+    def test_resnet_block(self):
+        self.check('resnet_block')
+
+def keras_1():
+    try:
+        import keras
+    except ImportError:
+        return False
+    return keras.__version__.startswith('1.')
+
+def has_h5py():
+    try:
+        import h5py
+    except ImportError:
+        return False
+    return True
+
+def h5_bytes(weights):
+    """weights saved the way Keras 1 save_weights() lays them out"""
+    import h5py
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'model_0.h5')
+        f = h5py.File(path, 'w')
+        f.attrs['layer_names'] = [name.encode('utf-8') for name in weights]
+        for (name, arrays) in weights.items():
+            group = f.create_group(name)
+            names = ['%s_W%d' % (name, i) for i in range(len(arrays))]
+            group.attrs['weight_names'] = [weight_name.encode('utf-8') for weight_name in names]
+            for (weight_name, array) in zip(names, arrays):
+                group.create_dataset(weight_name, data=array)
+        f.close()
+        return open(path, 'rb').read()
+    finally:
+        shutil.rmtree(directory)
+
+@unittest.skipUnless(has_h5py(), "needs h5py")
+class LoadModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(9)
+        self.weights = random_weights(rng)
+        self.quantized_weights = random_weights(rng)
+        self.x = rng.randint(0, vocab_size, (6, maxlen)).astype(np.int32)
+
+        ## the q.npz holds other weights, so the outputs tell which were loaded
+        arrays = {}
+        index = 0
+        for name in ('embedding', 'conv', 'dense'):
+            for array in self.quantized_weights[name]:
+                arrays['w%d' % index] = array
+                index += 1
+        quantized = io.BytesIO()
+        np.savez(quantized, **arrays)
+
+        with ZipFile(os.path.join(self.working_dir, 'script.model'), 'w') as myzip:
+            myzip.writestr('model_0.json', json.dumps(cnn_config()))
+            myzip.writestr('model_0.h5', h5_bytes(self.weights))
+            myzip.writestr(numpy_engine.quantized_name, quantized.getvalue())
+            myzip.writestr('alphabets.pkl', pickle.dumps(({'a': 1}, {'yes': 0}, maxlen)))
+
+        self.backend = os.environ.get('KERAS_BACKEND')
+        self.quantized = os.environ.pop('PREDICT_QUANTIZED', None)
+        os.environ['KERAS_BACKEND'] = 'tensorflow'
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+        for (name, value) in (('KERAS_BACKEND', self.backend), ('PREDICT_QUANTIZED', self.quantized)):
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def loaded_weights(self, **kwargs):
+        (model, alphabets) = numpy_engine.load_model(self.working_dir, **kwargs)
+        outputs = model.predict(self.x)
+        if np.allclose(outputs, reference(self.weights, self.x), rtol=1e-4, atol=1e-6):
+            return 'h5'
+        if np.allclose(outputs, reference(self.quantized_weights, self.x), rtol=1e-4, atol=1e-6):
+            return 'quantized'
+        return None
+
+    def test_prefers_quantized(self):
+        self.assertEqual(self.loaded_weights(), 'quantized')
+
+    def test_opt_out(self):
+        self.assertEqual(self.loaded_weights(quantized=False), 'h5')
+        os.environ['PREDICT_QUANTIZED'] = '0'
+        self.assertEqual(self.loaded_weights(), 'h5')
+
+@unittest.skipUnless(keras_1(), "needs Keras 1")
+class KerasAgreementTest(unittest.TestCase):
+
+    def test_matches_keras(self):
+        from keras import backend as K
+        from keras.layers import Input, Embedding, Convolution1D, MaxPooling1D, Flatten, Dense
+        from keras.models import Model
+
+        input = Input(shape=(maxlen,), dtype='int32')
+        hidden = Embedding(vocab_size, embed_dim)(input)
+        hidden = Convolution1D(filters, filter_length, activation='relu')(hidden)
+        hidden = MaxPooling1D(pool_length=2)(hidden)
+        output = Dense(classes, activation='softmax')(Flatten()(hidden))
+        keras_model = Model(input=input, output=output)
+
+        if 'KERAS_BACKEND' in os.environ:
+            self.addCleanup(os.environ.__setitem__, 'KERAS_BACKEND', os.environ['KERAS_BACKEND'])
+        else:
+            self.addCleanup(os.environ.pop, 'KERAS_BACKEND', None)
+        os.environ['KERAS_BACKEND'] = K.backend()
+        weights = {layer.name: layer.get_weights() for layer in keras_model.layers}
+        model = numpy_engine.NumpyModel(json.loads(keras_model.to_json()), weights)
+
+        x = np.random.RandomState(3).randint(0, vocab_size, (16, maxlen)).astype(np.int32)
+        np.testing.assert_allclose(model.predict(x), keras_model.predict(x), rtol=1e-4, atol=1e-5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import numpy as np
+
+import predictors
+
+def keras_1():
+    try:
+        import keras
+    except ImportError:
+        return False
+    return keras.__version__.startswith('1.')
+
+def lstm_tagger(mask_zero, bidirectional=False, seed=0):
+    """A small timex-style tagger: Embedding, LSTM over every step, softmax per step"""
+    from keras.layers import Embedding, LSTM, Dense
+    from keras.layers.wrappers import Bidirectional, TimeDistributed
+    from keras.models import Sequential
+
+    model = Sequential()
+    model.add(Embedding(10, 4, mask_zero=mask_zero, input_length=None))
+    lstm = LSTM(5, return_sequences=True)
+    model.add(Bidirectional(lstm) if bidirectional else lstm)
+    model.add(TimeDistributed(Dense(3, activation='softmax')))
+    rng = np.random.RandomState(seed)
+    model.set_weights([rng.uniform(-1, 1, w.shape).astype(np.float32) for w in model.get_weights()])
+    return model
+
+@unittest.skipUnless(keras_1(), "needs Keras 1")
+class PaddingIsIgnoredTest(unittest.TestCase):
+
+    def test_masked_model(self):
+        self.assertTrue(predictors.padding_is_ignored(lstm_tagger(True), [3, 1, 2]))
+        self.assertTrue(predictors.padding_is_ignored(lstm_tagger(True, bidirectional=True), [3, 1, 2]))
+
+    def test_model_that_sees_padding(self):
+        self.assertFalse(predictors.padding_is_ignored(lstm_tagger(False), [3, 1, 2]))
+        self.assertFalse(predictors.padding_is_ignored(lstm_tagger(False, bidirectional=True), [3, 1, 2]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import numpy as np
+
+import quantize
+
+def keras_1():
+    try:
+        import keras
+    except ImportError:
+        return False
+    return keras.__version__.startswith('1.')
+
+class Layer:
+    def __init__(self, dim_ordering=None):
+        if dim_ordering is not None:
+            self.dim_ordering = dim_ordering
+
+class OutputAxisTest(unittest.TestCase):
+
+    def test_output_axis(self):
+        ## Dense, Convolution1D, and 2D convolutions in both orderings
+        self.assertEqual(quantize.output_axis(Layer(), np.zeros((6, 3))), 1)
+        self.assertEqual(quantize.output_axis(Layer(), np.zeros((3, 1, 6, 4))), 3)
+        self.assertEqual(quantize.output_axis(Layer('th'), np.zeros((4, 6, 3, 3))), 0)
+        self.assertEqual(quantize.output_axis(Layer('tf'), np.zeros((3, 3, 6, 4))), 3)
+
+    def test_use_quantized(self):
+        previous = os.environ.pop(quantize.QUANTIZED_VAR, None)
+        try:
+            self.assertTrue(quantize.use_quantized())
+            os.environ[quantize.QUANTIZED_VAR] = '0'
+            self.assertFalse(quantize.use_quantized())
+        finally:
+            if previous is None:
+                os.environ.pop(quantize.QUANTIZED_VAR, None)
+            else:
+                os.environ[quantize.QUANTIZED_VAR] = previous
+
+@unittest.skipUnless(keras_1(), "needs Keras 1")
+class QuantizeTest(unittest.TestCase):
+
+    def test_scales_every_filter(self):
+        from keras.layers import Convolution2D
+        from keras.models import Sequential
+
+        model = Sequential()
+        model.add(Convolution2D(4, 3, 3, dim_ordering='th', input_shape=(2, 5, 5)))
+        ## filters of very different magnitude each keep their precision
+        kernel = np.random.RandomState(2).randn(4, 2, 3, 3).astype(np.float32)
+        kernel *= np.array([1e-3, 1e-1, 1.0, 10.0], dtype=np.float32)[:, np.newaxis, np.newaxis, np.newaxis]
+        model.set_weights([kernel, np.zeros(4, dtype=np.float32)])
+
+        restored = quantize.dequantize(quantize.quantize(model))[0]
+        for f in range(4):
+            np.testing.assert_allclose(restored[f], kernel[f], atol=np.abs(kernel[f]).max() / 127.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import result_cache
+from result_cache import ResultCache
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.computed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compute(self, keys):
+        def labels(indices):
+            self.computed.append([keys[i] for i in indices])
+            return [keys[i].upper() for i in indices]
+        return labels
+
+    def test_map_computes_each_missing_key_once(self):
+        cache = ResultCache(10)
+        keys = ['a', 'b', 'a']
+        self.assertEqual(cache.map(keys, self.compute(keys)), ['A', 'B', 'A'])
+        keys = ['b', 'c']
+        self.assertEqual(cache.map(keys, self.compute(keys)), ['B', 'C'])
+        self.assertEqual(self.computed, [['a', 'b'], ['c']])
+
+    def test_least_recently_used_goes_first(self):
+        cache = ResultCache(2)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        cache.get('a')
+        cache.put('c', 'C')
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertEqual(cache.get('c'), 'C')
+
+    def test_zero_capacity_stores_nothing(self):
+        cache = ResultCache(0)
+        cache.put('a', 'A')
+        self.assertEqual(cache.get('a'), None)
+
+    def test_saved_entries_are_loaded(self):
+        path = os.path.join(self.directory, 'model.cache')
+        cache = ResultCache(10, path)
+        cache.put('a', 'A')
+        cache.save()
+        self.assertEqual(ResultCache(10, path).get('a'), 'A')
+
+    def test_unreadable_cache_is_ignored(self):
+        path = os.path.join(self.directory, 'model.cache')
+        with open(path, 'w') as f:
+            f.write('not a pickle')
+        self.assertEqual(ResultCache(10, path).get('a'), None)
+
+    def test_fingerprint_covers_model_and_settings(self):
+        with open(os.path.join(self.directory, 'script.model'), 'wb') as f:
+            f.write(b'weights')
+        first = result_cache.model_fingerprint(self.directory, 'timex window=128')
+        self.assertNotEqual(first, result_cache.model_fingerprint(self.directory, 'timex window=0'))
+        with open(os.path.join(self.directory, 'script.model'), 'wb') as f:
+            f.write(b'retrained')
+        self.assertNotEqual(first, result_cache.model_fingerprint(self.directory, 'timex window=128'))
+
+class OpenCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'script.model'), 'wb') as f:
+            f.write(b'weights')
+        self.environ = dict((name, os.environ.pop(name, None)) for name in (result_cache.SIZE_VAR, result_cache.DIR_VAR))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        for (name, value) in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def test_off_by_default(self):
+        self.assertEqual(result_cache.open_cache(self.directory), None)
+
+    def test_in_memory_without_a_directory(self):
+        os.environ[result_cache.SIZE_VAR] = '100'
+        cache = result_cache.open_cache(self.directory)
+        self.assertEqual((cache.capacity, cache.path), (100, None))
+
+    def test_saved_in_the_given_directory(self):
+        cache_dir = os.path.join(self.directory, 'cache')
+        os.environ[result_cache.SIZE_VAR] = '100'
+        os.environ[result_cache.DIR_VAR] = cache_dir
+        cache = result_cache.open_cache(self.directory)
+        self.assertEqual(os.path.dirname(cache.path), cache_dir)
+
+if __name__ == '__main__':
+    unittest.main()
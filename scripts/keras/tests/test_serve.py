@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import io
+import os
+import os.path
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import line_batcher
+import predictors
+
+class UpperPredictor:
+    """Labels a line with its upper case, remembering each classify() call"""
+
+    def __init__(self):
+        self.calls = []
+        self.flushed = False
+
+    def classify(self, lines):
+        self.calls.append(list(lines))
+        return [line.upper() for line in lines]
+
+    def flush(self):
+        self.flushed = True
+
+    def stats(self):
+        return []
+
+class FailingPredictor(UpperPredictor):
+    def classify(self, lines):
+        raise ValueError("bad input")
+
+def serve(predictor, text):
+    (read_fd, write_fd) = os.pipe()
+    os.write(write_fd, text.encode('utf-8'))
+    os.close(write_fd)
+    out = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+    with os.fdopen(read_fd, 'rb') as instream:
+        predictors.serve(predictor, instream, out)
+    return out.getvalue().splitlines()
+
+class ServeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = dict(os.environ)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+
+    def test_one_label_per_line(self):
+        predictor = UpperPredictor()
+        self.assertEqual(serve(predictor, 'a b\nc\n'), ['A B', 'C'])
+        self.assertTrue(predictor.flushed)
+
+    def test_empty_line_ends_the_session(self):
+        predictor = UpperPredictor()
+        self.assertEqual(serve(predictor, 'a\n\nb\n'), ['A'])
+
+    def test_batch_is_classified_together(self):
+        predictor = UpperPredictor()
+        self.assertEqual(serve(predictor, '#batch 3\na\nb\nc\nd\n'), ['A', 'B', 'C', 'D'])
+        self.assertEqual(predictor.calls[0], ['a', 'b', 'c'])
+
+    def test_batch_within_a_micro_batch(self):
+        os.environ[line_batcher.BATCH_SIZE_VAR] = '10'
+        predictor = UpperPredictor()
+        self.assertEqual(serve(predictor, 'a\n#batch 2\nb\nc\nd\n\n'), ['A', 'B', 'C', 'D'])
+        self.assertEqual(predictor.calls, [['a'], ['b', 'c'], ['d']])
+
+    def test_empty_line_inside_a_batch_is_an_instance(self):
+        predictor = UpperPredictor()
+        self.assertEqual(serve(predictor, '#batch 2\n\nb\n\n'), ['', 'B'])
+
+    def test_failed_batch_answers_every_line(self):
+        labels = serve(FailingPredictor(), '#batch 2\na\nb\n')
+        self.assertEqual(labels, ['Exception thrown: bad input'] * 2)
+
+if __name__ == '__main__':
+    unittest.main()
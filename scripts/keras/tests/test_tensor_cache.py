@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import numpy as np
+
+import tensor_cache
+from tensor_cache import Ragged
+
+def read_bio_data(working_dir):
+    read_bio_data.calls += 1
+    return ([[1, 2], [2], [1, 1, 2]], {'B': 1, 'O': 2},
+            [[5, 6], [7], [8, 9, 10]], {'a': 5, 'b': 6})
+read_bio_data.calls = 0
+
+class RaggedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.seqs = [[1, 2, 3], [], [4], [5, 6]]
+        self.ragged = Ragged.from_lists(self.seqs)
+
+    def test_index_and_iterate(self):
+        self.assertEqual(len(self.ragged), 4)
+        self.assertEqual([list(seq) for seq in self.ragged], self.seqs)
+        self.assertEqual(list(self.ragged[3]), [5, 6])
+
+    def test_slice(self):
+        part = self.ragged[1:3]
+        self.assertEqual([list(seq) for seq in part], [[], [4]])
+        self.assertRaises(ValueError, lambda: self.ragged[::2])
+
+    def test_take_and_concatenate(self):
+        taken = self.ragged.take(np.array([3, 0]))
+        self.assertEqual([list(seq) for seq in taken], [[5, 6], [1, 2, 3]])
+        both = Ragged.concatenate([taken, self.ragged[2:3]])
+        self.assertEqual([list(seq) for seq in both], [[5, 6], [1, 2, 3], [4]])
+
+    def test_pad(self):
+        padded = self.ragged.pad(2)
+        self.assertEqual(padded.tolist(), [[1, 2], [0, 0], [0, 4], [5, 6]])
+
+class CachedReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.working_dir, 'training-data.liblinear'), 'w') as f:
+            f.write('data\n')
+        read_bio_data.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def check(self, result):
+        (labels, label_alphabet, feats, feats_alphabet) = result
+        self.assertTrue(isinstance(labels, Ragged))
+        self.assertTrue(isinstance(feats, Ragged))
+        self.assertEqual([list(seq) for seq in feats], [[5, 6], [7], [8, 9, 10]])
+        self.assertEqual([list(seq) for seq in labels], [[1, 2], [2], [1, 1, 2]])
+        self.assertEqual(label_alphabet, {'B': 1, 'O': 2})
+
+    def test_second_read_uses_cache(self):
+        self.check(tensor_cache.cached_read(read_bio_data, self.working_dir))
+        self.check(tensor_cache.cached_read(read_bio_data, self.working_dir))
+        self.assertEqual(read_bio_data.calls, 1)
+
+    def test_unwritable_cache_still_returns_ragged(self):
+        ## a plain file where the cache directory should go
+        with open(os.path.join(self.working_dir, tensor_cache.cache_dir_name), 'w') as f:
+            f.write('')
+        self.check(tensor_cache.cached_read(read_bio_data, self.working_dir))
+
+if __name__ == '__main__':
+    unittest.main()
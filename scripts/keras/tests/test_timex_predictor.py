@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+import numpy as np
+
+import bucketing
+import predictors
+
+labels = {0: 'O', 1: 'B-DATE', 2: 'I-DATE'}
+
+def keras_1():
+    try:
+        import keras
+    except ImportError:
+        return False
+    return keras.__version__.startswith('1.')
+
+class TokenModel:
+    """Scores each step by its own token, so padding never changes a label"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, x, batch_size=None):
+        self.batches.append(x.shape)
+        return np.eye(len(labels), dtype=np.float32)[x % len(labels)]
+
+class BareTimexPredictor(predictors.TimexPredictor):
+    def __init__(self):
+        pass
+
+def timex_predictor(model, masked=True, window=0, overlap=0):
+    """A TimexPredictor around model, without reading a model directory"""
+    predictor = BareTimexPredictor()
+    (predictor.model, predictor.graph, predictor.lock, predictor.cache) = (model, None, threading.Lock(), None)
+    predictor.label_lookup = labels
+    predictor.padding = bucketing.PaddingReport()
+    (predictor.masked, predictor.window, predictor.overlap, predictor.windowed) = (masked, window, overlap, 0)
+    return predictor
+
+class BatchedTaggingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.seqs = [[3, 1, 2], [4], [], [1, 2, 2, 0, 5], [6, 7]]
+
+    def test_batch_matches_one_at_a_time(self):
+        alone = [timex_predictor(TokenModel())._tag([seq])[0] for seq in self.seqs]
+        model = TokenModel()
+        self.assertEqual(timex_predictor(model)._tag(self.seqs), alone)
+        self.assertEqual(alone[0], 'O B-DATE I-DATE')
+        self.assertEqual(alone[2], '')
+        ## every sentence is in the first length bucket
+        self.assertEqual(len(model.batches), 1)
+
+    def test_unmasked_groups_equal_lengths_only(self):
+        model = TokenModel()
+        timex_predictor(model, masked=False)._tag(self.seqs)
+        self.assertEqual(sorted(shape[1] for shape in model.batches), [1, 2, 3, 5])
+
+@unittest.skipUnless(keras_1(), "needs Keras 1")
+class KerasBatchedTaggingTest(unittest.TestCase):
+
+    def test_masked_lstm_batch_matches_one_at_a_time(self):
+        from test_predictors import lstm_tagger
+        model = lstm_tagger(True, bidirectional=True)
+        seqs = [[3, 1, 2], [4], [1, 2, 2, 5, 5], [6, 7]]
+        alone = [timex_predictor(model)._tag([seq])[0] for seq in seqs]
+        self.assertEqual(timex_predictor(model)._tag(seqs), alone)
+
+class WindowTest(unittest.TestCase):
+
+    def test_window_starts(self):
+        self.assertEqual(bucketing.window_starts(5, 8, 2), [0])
+        self.assertEqual(bucketing.window_starts(50, 0, 2), [0])
+        self.assertEqual(bucketing.window_starts(10, 4, 1), [0, 3, 6])
+        ## the last window ends with the sequence, overlapping more if needed
+        self.assertEqual(bucketing.window_starts(11, 4, 1), [0, 3, 6, 7])
+
+    def test_windows_cover_every_token(self):
+        for length in range(1, 40):
+            starts = bucketing.window_starts(length, 8, 3)
+            covered = set(j for start in starts for j in range(start, min(start + 8, length)))
+            self.assertEqual(covered, set(range(length)))
+            for (first, second) in zip(starts, starts[1:]):
+                self.assertTrue(first + 8 - second >= 3)
+
+    def test_windowed_matches_whole(self):
+        seq = [1, 2, 2, 0] * 6
+        whole = timex_predictor(TokenModel())._tag([seq])
+        windowed = timex_predictor(TokenModel(), window=8, overlap=3)
+        self.assertEqual(windowed._tag([seq]), whole)
+        self.assertEqual(windowed.windowed, 1)
+
+    def test_repair_bio(self):
+        self.assertEqual(predictors.repair_bio(['O', 'I-DATE', 'I-DATE'], [1, 2]), ['O', 'B-DATE', 'I-DATE'])
+        self.assertEqual(predictors.repair_bio(['B-TIME', 'I-DATE'], [1]), ['B-TIME', 'B-DATE'])
+        self.assertEqual(predictors.repair_bio(['I-DATE', 'O'], [0]), ['B-DATE', 'O'])
+        ## only the given positions are repaired
+        self.assertEqual(predictors.repair_bio(['O', 'I-DATE'], []), ['O', 'I-DATE'])
+
+    def test_overlap_is_repaired(self):
+        class OverlapModel(TokenModel):
+            ## I- wherever a window starts past the sentence start, B- at the
+            ## first token: the merge leaves an I- after an O at the overlap
+            def predict(self, x, batch_size=None):
+                scores = np.zeros(x.shape + (len(labels),), dtype=np.float32)
+                scores[:, :, 0] = 1.0
+                scores[:, 0, 0] = 0.0
+                scores[:, 0, np.where(x[:, 0] == 9, 1, 2)] = 3.0
+                return scores
+
+        tagged = timex_predictor(OverlapModel(), window=4, overlap=2)._tag([[9, 1, 1, 1, 1, 1]])[0]
+        self.assertEqual(tagged, 'B-DATE O B-DATE O O O')
+
+if __name__ == '__main__':
+    unittest.main()
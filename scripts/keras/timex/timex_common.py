@@ -1,6 +1,11 @@
+import numpy as np
+
+import cleartk_io as ctk_io
 import nn_models as models
+import bucketing
+import model_archive
 
-def get_model_for_config(dimension, vocab_size, num_outputs, config, weights = None):
+def get_model_for_config(dimension, vocab_size, num_outputs, config, weights = None, sparse_targets = True, mask_padding = False):
     if not weights is None and not weights.shape[1] == config['embed_dim']:
         print("WARNING: Pre-trained embedding weights have dimensionality %d which is different than config embedding dimensionality %d -- modifying config" % (weights.shape[1], config['embed_dim']) )
         config['embed_dim'] = weights.shape[1]
@@ -9,7 +14,44 @@ def get_model_for_config(dimension, vocab_size, num_outputs, config, weights = N
         model = models.get_bio_bilstm_model(dimension=dimension, vocab_size=vocab_size, num_outputs=num_outputs, layers=config['layers'], embed_dim=config['embed_dim'], activation=config['activation'], go_backwards=config['backwards'], weights=weights, lr=config['lr'])
     else:
         model = models.get_bio_lstm_model(dimension=dimension, vocab_size=vocab_size, num_outputs=num_outputs, layers=config['layers'], embed_dim=config['embed_dim'], activation=config['activation'], go_backwards=config['backwards'], weights=weights, lr=config['lr'])
-    
+
+    ## nn_models builds for dimension[1] steps, bucketed batches are narrower
+    return compile_masked(bucketing.variable_length_model(model), sparse_targets, mask_padding)
+
+def maskable(feats_alphabet):
+    """True if index 0 is only ever padding, so it can be masked"""
+    return not 0 in feats_alphabet.values()
+
+def compile_masked(model, sparse_targets, mask_padding=False):
+    """Recompile a tagger from nn_models for per-timestep sample weights.
+
+    The optimizer and metrics are kept; the loss becomes the sparse
+    variant when sparse_targets, so the targets are label indices rather
+    than one-hot rows.  Fit with bucketing.padding_weights() as the sample
+    weights to keep the padding out of the loss.  With mask_padding the
+    model is rebuilt with mask_zero on its embeddings, so the recurrent
+    layers also skip the padded steps; see maskable().
+    """
+    optimizer = model.optimizer
+    metrics = model.metrics
+    if mask_padding:
+        try:
+            model = model_archive.masked_copy(model)
+        except Exception as e:
+            print("WARNING: Model cannot mask padding (%s) -- padding is only left out of the loss" % (e))
+
+    model.compile(loss='sparse_categorical_crossentropy' if sparse_targets else 'categorical_crossentropy',
+                  optimizer=optimizer,
+                  metrics=metrics,
+                  sample_weight_mode='temporal')
     return model
 
+def label_targets(y, label_alphabet, sparse_targets):
+    """Padded label index sequences as targets for a model from get_model_for_config().
 
+    (examples, width, 1) indices when sparse_targets, else the one-hot
+    (examples, width, labels) expansion.
+    """
+    if sparse_targets:
+        return np.asarray(y)[:, :, np.newaxis]
+    return ctk_io.expand_labels(y, label_alphabet)
@@ -8,6 +8,9 @@ import sys
 import os, os.path
 import pickle
 import random
+import ast
+import shutil
+import tempfile
 
 ## library imports
 from keras.callbacks import EarlyStopping
@@ -25,7 +28,11 @@ from zipfile import ZipFile
 from random_search import RandomSearch
 import cleartk_io as ctk_io
 import nn_models as models
-from timex_common import get_model_for_config
+from timex_common import get_model_for_config, label_targets, maskable
+import bucketing
+import embedding_store
+import tensor_cache
+import trial_pool
 
 ## Define parameter space for each hyperparameter
 batch_sizes=(64, 128, 256)
@@ -37,6 +44,21 @@ bilstm = (True, False)
 lrs = (0.1, 0.01, 0.001)
 pretrain = (True, False)
 
+## Search settings: search is 'random' (every trial trains to early stopping)
+## or 'halving' (successive halving).  'random' runs the serial RandomSearch
+## unless TIMEX_WORKERS asks for a pool of worker processes, 0 for one per CPU
+## core; 'halving' always runs its rungs on the pool
+WORKERS_VAR = 'TIMEX_WORKERS'
+search = 'random'
+workers = int(os.environ.get(WORKERS_VAR, 1))
+num_trials = 20
+trial_epochs = 20
+halving_configs = 27
+halving_min_epochs = 1
+halving_eta = 3
+## label indices with sparse_categorical_crossentropy instead of one-hot rows
+sparse_labels = True
+
 def get_random_config(weights=None):
     config = {}
     
@@ -49,6 +71,7 @@ def get_random_config(weights=None):
         else:
             config['embed_dim'] = random.choice(embed_dims)
     else:
+        config['pretrain'] = False
         config['embed_dim'] = random.choice(embed_dims)
         
     config['activation'] = random.choice(activations)
@@ -58,7 +81,9 @@ def get_random_config(weights=None):
     
     return config
 
-def run_one_eval(epochs, config, train_x, train_y, valid_x, valid_y, vocab_size, num_outputs, weights):
+def run_one_eval(epochs, config, train, valid, vocab_size, num_outputs, weights, mask_padding=False):
+    """Train config to early stopping on the (x, y, sample weights) train split"""
+    (train_x, train_y, train_w) = train
 
     print("Running with config: %s"  % str(config) )
     if not config['pretrain']:
@@ -67,26 +92,137 @@ def run_one_eval(epochs, config, train_x, train_y, valid_x, valid_y, vocab_size,
     if config['pretrain'] and weights is None:
         raise Exception("ERROR: Pretrain flag given but no weights passed in!")
         
-    model = get_model_for_config(train_x.shape, vocab_size, num_outputs, config, weights)
+    model = get_model_for_config(train_x.shape, vocab_size, num_outputs, config, weights,
+                                 sparse_targets=sparse_labels, mask_padding=mask_padding)
     
     history = model.fit(train_x,
             train_y,
             nb_epoch=epochs,
             batch_size=config['batch_size'],
             verbose=1,
-            validation_data=(valid_x, valid_y), callbacks=[get_early_stopper()])
+            sample_weight=train_w,
+            validation_data=valid, callbacks=[get_early_stopper()])
     
     #pred_y = model.predict(valid_x)
     
+    loss = last_valid_loss(history)
+    print("Returning loss %f " % (loss) )
+    return loss
+
+def last_valid_loss(history):
     ## Represent the quality of this configuration with loss on the validation set of the last (-1th) epoch
     for i in range(len(history.epoch)):
         loss = history.history['val_loss'][-1-i]
         if not np.isnan(loss):
             break
-    
+    return loss
+
+def run_budgeted_eval(epochs, config, train, valid, vocab_size, num_outputs, weights, checkpoint, mask_padding=False):
+    """Train config for epochs more epochs, resuming from and saving to checkpoint.
+
+    No early stopping: the budget is the stopping rule.  Only the weights are
+    carried between rungs, so the optimizer state starts fresh each time.
+    """
+    print("Running %d epochs with config: %s" % (epochs, str(config)) )
+    (train_x, train_y, train_w) = train
+    if not config['pretrain']:
+        weights = None
+
+    model = get_model_for_config(train_x.shape, vocab_size, num_outputs, config, weights,
+                                 sparse_targets=sparse_labels, mask_padding=mask_padding)
+    if os.path.exists(checkpoint):
+        model.load_weights(checkpoint)
+
+    history = model.fit(train_x,
+            train_y,
+            nb_epoch=epochs,
+            batch_size=config['batch_size'],
+            verbose=1,
+            sample_weight=train_w,
+            validation_data=valid)
+    model.save_weights(checkpoint, overwrite=True)
+
+    loss = last_valid_loss(history)
     print("Returning loss %f " % (loss) )
     return loss
 
+def parallel_search(working_dir, train, valid, vocab_size, num_outputs, weights, mask_padding=False):
+    """Evaluate num_trials random configs across a process pool, return the best"""
+    arrays_path = os.path.join(working_dir, 'trials.npz')
+    trial_pool.save_arrays(arrays_path, vocab_size, num_outputs, train, valid, weights, mask_padding)
+
+    pool = trial_pool.TrialPool(os.path.abspath(__file__), arrays_path, workers)
+    print("Running %d trials on %d workers with %d threads each" % (num_trials, pool.workers, pool.threads))
+
+    configs = [get_random_config(weights) for i in range(num_trials)]
+    try:
+        losses = pool.map([(config, trial_epochs) for config in configs])
+    finally:
+        os.remove(arrays_path)
+
+    for (config, loss) in zip(configs, losses):
+        print("Loss %f for config %s" % (loss, str(config)))
+
+    return configs[int(np.argmin(losses))]
+
+def successive_halving(working_dir, train, valid, vocab_size, num_outputs, weights, mask_padding=False):
+    """Budgeted search: train many configs briefly, keep extending the best.
+
+    halving_configs random configs get halving_min_epochs epochs each; the
+    best 1/halving_eta by validation loss continue until they have trained
+    halving_eta times as long, and so on up to trial_epochs or a single
+    survivor.
+    """
+    arrays_path = os.path.join(working_dir, 'trials.npz')
+    trial_pool.save_arrays(arrays_path, vocab_size, num_outputs, train, valid, weights, mask_padding)
+    checkpoint_dir = tempfile.mkdtemp(prefix='halving', dir=working_dir)
+
+    pool = trial_pool.TrialPool(os.path.abspath(__file__), arrays_path, workers)
+    configs = [get_random_config(weights) for i in range(halving_configs)]
+    checkpoints = [os.path.join(checkpoint_dir, 'trial_%d.h5' % i) for i in range(len(configs))]
+    trained = [0] * len(configs)
+    survivors = range(len(configs))
+    budget = halving_min_epochs
+    total_epochs = 0
+
+    try:
+        while True:
+            budget = min(budget, trial_epochs)
+            trials = [(configs[i], budget - trained[i], checkpoints[i]) for i in survivors]
+            losses = pool.map(trials)
+            for i in survivors:
+                total_epochs += budget - trained[i]
+                trained[i] = budget
+
+            ranked = sorted(zip(losses, survivors))
+            print("After %d epochs the best of %d configs has loss %f: %s" % (budget, len(survivors), ranked[0][0], str(configs[ranked[0][1]])))
+
+            if len(survivors) == 1 or budget >= trial_epochs:
+                best = ranked[0][1]
+                break
+
+            survivors = [i for (loss, i) in ranked[:max(1, len(ranked) // halving_eta)]]
+            budget = budget * halving_eta
+    finally:
+        os.remove(arrays_path)
+        shutil.rmtree(checkpoint_dir)
+
+    print("Successive halving trained %d epochs in total, %d for every config to %d epochs" % (total_epochs, len(configs) * trial_epochs, trial_epochs))
+    return configs[best]
+
+def run_trial(args):
+    """Worker side of the searches: <arrays .npz> <config> <epochs> [checkpoint]"""
+    trial_pool.limit_backend_threads()
+    (vocab_size, num_outputs, train, valid, weights, mask_padding) = trial_pool.load_arrays(args[0])
+    config = ast.literal_eval(args[1])
+    epochs = int(args[2])
+
+    if len(args) > 3:
+        loss = run_budgeted_eval(epochs, config, train, valid, vocab_size, num_outputs, weights, args[3], mask_padding)
+    else:
+        loss = run_one_eval(epochs, config, train, valid, vocab_size, num_outputs, weights, mask_padding)
+    trial_pool.report_loss(loss)
+
 def get_early_stopper():
     return EarlyStopping(monitor='val_loss')
 
@@ -96,22 +232,38 @@ def main(args):
         sys.stderr.write("Error - one required argument: <data directory> [(optional) weights file]\n")
         sys.exit(-1)
 
+    if args[0] == '--trial':
+        run_trial(args[1:])
+        return
+
     working_dir = args[0]
     
-    (labels, label_alphabet, feats, feats_alphabet) = ctk_io.read_bio_sequence_data(working_dir)
+    (labels, label_alphabet, feats, feats_alphabet) = tensor_cache.cached_read(ctk_io.read_bio_sequence_data, working_dir)
     
     weights = None
     if len(args) > 1:
-        weights = ctk_io.read_embeddings(args[1], feats_alphabet)
+        weights = embedding_store.read_embeddings(args[1], feats_alphabet)
         
-    maxlen = max([len(seq) for seq in feats])
-    all_x = pad_sequences(feats, maxlen=maxlen)
-    all_y = ctk_io.expand_labels(pad_sequences(labels, maxlen=maxlen), label_alphabet)
+    maxlen = int(feats.lengths.max())
+    all_x = feats.pad(maxlen)
+    all_y = label_targets(labels.pad(maxlen), label_alphabet, sparse_labels)
+    ## padded timesteps get weight 0 and do not count towards the loss
+    all_w = bucketing.padding_weights(feats.lengths, maxlen)
 
-    train_x, valid_x, train_y, valid_y = train_test_split(all_x, all_y, test_size=0.2, random_state=7)
+    train_x, valid_x, train_y, valid_y, train_w, valid_w = train_test_split(all_x, all_y, all_w, test_size=0.2, random_state=7)
+    train = (train_x, train_y, train_w)
+    valid = (valid_x, valid_y, valid_w)
     
-    optim = RandomSearch(lambda: get_random_config(weights), lambda x, y: run_one_eval(x, y, train_x, train_y, valid_x, valid_y, len(feats_alphabet), len(label_alphabet), weights ) )
-    best_config = optim.optimize()
+    ## recurrent layers skip padded steps when index 0 is only padding
+    mask_padding = maskable(feats_alphabet)
+
+    if search == 'halving':
+        best_config = successive_halving(working_dir, train, valid, len(feats_alphabet), len(label_alphabet), weights, mask_padding)
+    elif workers == 1:
+        optim = RandomSearch(lambda: get_random_config(weights), lambda x, y: run_one_eval(x, y, train, valid, len(feats_alphabet), len(label_alphabet), weights, mask_padding ) )
+        best_config = optim.optimize()
+    else:
+        best_config = parallel_search(working_dir, train, valid, len(feats_alphabet), len(label_alphabet), weights, mask_padding)
     
     open(os.path.join(working_dir, 'model_0.config'), 'w').write( str(best_config) )
     print("Best config returned by optimizer is %s" % str(best_config) )
@@ -119,13 +271,15 @@ def main(args):
     if not best_config['pretrain']:
         weights = None
         
-    model = get_model_for_config(train_x.shape, len(feats_alphabet), len(label_alphabet), best_config, weights=weights)
+    model = get_model_for_config(train_x.shape, len(feats_alphabet), len(label_alphabet), best_config, weights=weights,
+                                 sparse_targets=sparse_labels, mask_padding=mask_padding)
 
     model.fit(all_x,
             all_y,
             nb_epoch=40,
             batch_size=best_config['batch_size'],
             verbose=1,
+            sample_weight=all_w,
             validation_split=0.1)
 
     model.summary()
@@ -16,7 +16,11 @@ from keras.layers.embeddings import Embedding
 from keras.layers import LSTM
 from zipfile import ZipFile
 
-from timex_common import get_model_for_config
+from timex_common import get_model_for_config, label_targets, maskable
+import bucketing
+import embedding_store
+import tensor_cache
+import warm_start
 
 epochs=20
 batch_size=256
@@ -24,6 +28,11 @@ backwards=True
 bilstm=True
 layers=(64,)
 embed_dim=25
+validation_split=0.1
+## length buckets for training batches, 1 pads everything to the longest sentence
+num_buckets=8
+## label indices with sparse_categorical_crossentropy instead of one-hot rows
+sparse_labels=True
 best_config =  {'layers': (128,), 'backwards': True, 'bilstm': True, 'embed_dim': 100, 'activation': 'tanh', 'batch_size': 64, 'lr': 0.01, 'pretrain': False}
 
 def main(args):
@@ -33,28 +42,62 @@ def main(args):
 
     working_dir = args[0]
     
-    (labels, label_alphabet, feats, feats_alphabet) = ctk_io.read_bio_sequence_data(working_dir)
+    (labels, label_alphabet, feats, feats_alphabet) = tensor_cache.cached_read(ctk_io.read_bio_sequence_data, working_dir)
 
+    (warm_dir, old_data_dir) = warm_start.get_settings()
+    previous_model = None
+    if warm_dir is not None:
+        (previous_model, (previous_feats, previous_labels)) = warm_start.load_previous(warm_dir)
+        (labels, label_alphabet, feats, feats_alphabet) = warm_start.prepare_data(
+            (previous_feats, previous_labels), (labels, label_alphabet, feats, feats_alphabet),
+            ctk_io.read_bio_sequence_data, old_data_dir)
+
+    ## a warm start takes its embeddings from the previous model
+    pretrain = best_config['pretrain'] and previous_model is None
     weights = None
-    if len(args) > 1 and best_config['pretrain'] == True:
-        weights = ctk_io.read_embeddings(args[1], feats_alphabet)
-    elif best_config['pretrain'] and len(args) == 1:
+    if len(args) > 1 and pretrain == True:
+        weights = embedding_store.read_embeddings(args[1], feats_alphabet)
+    elif pretrain and len(args) == 1:
         sys.stderr.write("Error: Pretrain specified but no weights file given!")
         sys.exit(-1)
         
-    maxlen = max([len(seq) for seq in feats])
-    train_x = pad_sequences(feats, maxlen=maxlen)
-    train_y = ctk_io.expand_labels(pad_sequences(labels, maxlen=maxlen), label_alphabet)
-    
-    #print("After padding x has shape %s and y has shape %s" %  (str(train_x.shape), str(train_y.shape)))
-    model = get_model_for_config(train_x.shape, len(feats_alphabet), len(label_alphabet), best_config, weights)
+    maxlen = int(feats.lengths.max())
+
+    ## hold out the same trailing 10% that validation_split would, padded once;
+    ## padding is weighted 0 so it does not count towards the loss
+    split_at = int(len(feats) * (1 - validation_split))
+    valid_x = feats[split_at:].pad(maxlen)
+    valid_y = label_targets(labels[split_at:].pad(maxlen), label_alphabet, sparse_labels)
+    valid_w = bucketing.padding_weights(feats.lengths[split_at:], maxlen)
+    train_feats = feats[:split_at]
+    train_labels = labels[:split_at]
+
+    ## train on batches of similar length, each padded to its own longest sentence
+    lengths = train_feats.lengths
+    bounds = bucketing.length_buckets(lengths, num_buckets)
+    report = bucketing.PaddingReport()
+    report.add_batches(lengths, bucketing.bucket_batches(lengths, best_config['batch_size'], bounds, shuffle=False), maxlen)
+    print(str(report))
+
+    vocab_size = len(feats_alphabet)
+    nb_epoch = epochs
+    if previous_model is not None:
+        vocab_size = warm_start.vocab_size(previous_model, previous_feats, feats_alphabet)
+        nb_epoch = warm_start.warm_epochs
+
+    model = get_model_for_config((len(feats), maxlen), vocab_size, len(label_alphabet), best_config, weights,
+                                 sparse_targets=sparse_labels, mask_padding=maskable(feats_alphabet))
+    if previous_model is not None:
+        warm_start.transfer_weights(previous_model, model)
     
-    model.fit(train_x,
-            train_y,
-            nb_epoch=epochs,
-            batch_size=best_config['batch_size'],
+    model.fit_generator(bucketing.bucket_generator(train_feats, train_labels,
+                                                   best_config['batch_size'], bounds,
+                                                   y_transform=lambda y: label_targets(y, label_alphabet, sparse_labels),
+                                                   sample_weights=True),
+            samples_per_epoch=len(train_feats),
+            nb_epoch=nb_epoch,
             verbose=1,
-            validation_split=0.1,
+            validation_data=(valid_x, valid_y, valid_w),
             callbacks=[get_early_stopper()])
 
     model.summary()
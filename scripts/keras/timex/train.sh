@@ -2,7 +2,7 @@
 
 source $(dirname $0)/../../../../neural-assertion/scripts/keras/env/bin/activate
 
-export PYTHONPATH=$PYTHONPATH:$(dirname $0)/../../../../apache-ctakes/ctakes-neural/scripts
+export PYTHONPATH=$PYTHONPATH:$(dirname $0)/../../../../apache-ctakes/ctakes-neural/scripts:$(dirname $0)/../common
 
 subdir=`dirname $0`
 
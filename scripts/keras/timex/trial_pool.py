@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""Run hyperparameter trials in parallel worker processes.
+
+Each trial is a fresh Python process running `<script> --trial ...`, so the
+Keras backend is imported after the thread limits are in the environment
+and no backend state is shared through fork().  The training arrays are
+saved once to an .npz file that every worker loads.
+"""
+
+import multiprocessing
+import os
+import subprocess
+import sys
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+## environment variables that bound the BLAS/OpenMP threads of one worker
+thread_vars = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+LOSS_PREFIX = 'TRIAL_LOSS '
+
+def save_arrays(path, vocab_size, num_outputs, train, valid, weights=None, mask_padding=False):
+    """Save the (x, y, sample weights) train and valid splits for the workers"""
+    (train_x, train_y, train_w) = train
+    (valid_x, valid_y, valid_w) = valid
+    arrays = dict(vocab_size=np.array(vocab_size), num_outputs=np.array(num_outputs),
+                  mask_padding=np.array(mask_padding),
+                  train_x=train_x, train_y=train_y, train_w=train_w,
+                  valid_x=valid_x, valid_y=valid_y, valid_w=valid_w)
+    if weights is not None:
+        arrays['weights'] = weights
+    np.savez(path, **arrays)
+
+def load_arrays(path):
+    """Return (vocab_size, num_outputs, train, valid, weights or None, mask_padding) as saved"""
+    arrays = np.load(path)
+    weights = arrays['weights'] if 'weights' in arrays.files else None
+    return (int(arrays['vocab_size']), int(arrays['num_outputs']),
+            (arrays['train_x'], arrays['train_y'], arrays['train_w']),
+            (arrays['valid_x'], arrays['valid_y'], arrays['valid_w']), weights,
+            bool(arrays['mask_padding']))
+
+def report_loss(loss):
+    """Called by a worker to hand its result back to the pool"""
+    print("%s%r" % (LOSS_PREFIX, float(loss)))
+    sys.stdout.flush()
+
+def limit_backend_threads():
+    """Apply the worker's thread budget to a TensorFlow backend as well"""
+    from keras import backend as K
+    if K.backend() == 'tensorflow':
+        import tensorflow as tf
+        threads = int(os.environ.get(thread_vars[0], 1))
+        K.set_session(tf.Session(config=tf.ConfigProto(intra_op_parallelism_threads=threads,
+                                                       inter_op_parallelism_threads=1)))
+
+class TrialPool:
+    """Evaluate (config, epochs[, checkpoint]) trials across CPU cores.
+
+    A trial with a checkpoint path resumes from the weights saved there by
+    an earlier trial of the same config and saves its own weights back.
+
+    workers defaults to the number of cores; the cores are split evenly so
+    that workers * threads per worker does not exceed them.
+    """
+
+    def __init__(self, script, arrays_path, workers=None):
+        cores = multiprocessing.cpu_count()
+        self.script = script
+        self.arrays_path = arrays_path
+        self.workers = workers or cores
+        self.threads = max(1, cores // self.workers)
+
+    def _env(self):
+        env = dict(os.environ)
+        for var in thread_vars:
+            env[var] = str(self.threads)
+        return env
+
+    def run_trial(self, trial):
+        """Train one (config, epochs[, checkpoint]) trial in a worker, return its loss"""
+        (config, epochs) = trial[:2]
+        command = [sys.executable, self.script, '--trial', self.arrays_path, repr(config), str(epochs)]
+        command.extend(trial[2:])
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, env=self._env())
+        (out, _) = proc.communicate()
+
+        for line in reversed(out.splitlines()):
+            if line.startswith(LOSS_PREFIX):
+                loss = float(line[len(LOSS_PREFIX):])
+                return float('inf') if np.isnan(loss) else loss
+
+        sys.stderr.write("Trial with config %s exited with %d and no loss\n" % (str(config), proc.returncode))
+        return float('inf')
+
+    def map(self, trials):
+        """Losses for a list of trials, in order; NaN losses count as inf"""
+        pool = ThreadPool(self.workers)
+        try:
+            return pool.map(self.run_trial, trials)
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,21 @@
+package org.chboston.cnlp.temporal.neural;
+
+import java.util.List;
+
+import org.cleartk.ml.CleartkProcessingException;
+import org.cleartk.ml.Feature;
+
+/**
+ * A classifier that labels many instances in one exchange.
+ *
+ * {@link ScriptBatchClassifier} implements this for the Keras predict scripts
+ * by writing a "#batch N" header line followed by the N feature lines, and
+ * reading back N label lines, instead of one round trip per instance.
+ */
+public interface BatchClassifier<OUTCOME_TYPE> {
+
+	/**
+	 * @return one outcome per instance, in the same order
+	 */
+	public List<OUTCOME_TYPE> classifyBatch(List<List<Feature>> instances) throws CleartkProcessingException;
+}
@@ -29,6 +29,7 @@ import org.apache.uima.fit.util.JCasUtil;
 import org.apache.uima.jcas.JCas;
 import org.apache.uima.jcas.tcas.Annotation;
 import org.cleartk.ml.CleartkAnnotator;
+import org.cleartk.ml.CleartkProcessingException;
 import org.cleartk.ml.Feature;
 import org.cleartk.ml.Instance;
 import org.cleartk.ml.feature.extractor.CleartkExtractorException;
@@ -59,6 +60,14 @@ public class EventTimeCNNAnnotator extends CleartkAnnotator<String> {
 		}
 	}
 
+	@Override
+	public void collectionProcessComplete() throws AnalysisEngineProcessException {
+		super.collectionProcessComplete();
+		if (this.classifier instanceof ScriptBatchClassifier) {
+			((ScriptBatchClassifier) this.classifier).close();
+		}
+	}
+
 	@Override
 	public void process(JCas jCas) throws AnalysisEngineProcessException {
 		//get all gold relation lookup
@@ -87,6 +96,10 @@ public class EventTimeCNNAnnotator extends CleartkAnnotator<String> {
 			List<IdentifiedAnnotationPair> candidatePairs =
 					getCandidateRelationArgumentPairs(jCas, sentence);
 
+			// instances to classify, all sent in one exchange once the sentence is done
+			List<IdentifiedAnnotationPair> classifyPairs = new ArrayList<>();
+			List<List<Feature>> classifyFeats = new ArrayList<>();
+
 			// walk through the pairs of annotations
 			for (IdentifiedAnnotationPair pair : candidatePairs) {
 				IdentifiedAnnotation arg1 = pair.getArg1();
@@ -121,34 +134,61 @@ public class EventTimeCNNAnnotator extends CleartkAnnotator<String> {
 					this.dataWriter.write(new Instance<>(category, feats));
 				}
 
-				// during classification feed the features to the classifier and create annotations
+				// during classification collect the features for the batch below
 				else {
-					String predictedCategory = this.classifier.classify(feats);
-
-					// add a relation annotation if a true relation was predicted
-					if (predictedCategory != null && !predictedCategory.equals(NO_RELATION_CATEGORY.toLowerCase())) {
-
-						// if we predict an inverted relation, reverse the order of the arguments
-						if (predictedCategory.endsWith("-1")) {
-							predictedCategory = predictedCategory.substring(0, predictedCategory.length() - 2);
-							if(arg1 instanceof TimeMention){
-								IdentifiedAnnotation temp = arg1;
-								arg1 = arg2;
-								arg2 = temp;
-							}
-						}else{
-							if(arg1 instanceof EventMention){
-								IdentifiedAnnotation temp = arg1;
-								arg1 = arg2;
-								arg2 = temp;
-							}
-						}
+					classifyPairs.add(pair);
+					classifyFeats.add(feats);
+				}
+			}
 
-						createRelation(jCas, arg1, arg2, predictedCategory.toUpperCase(), 0.0);
-					}
+			// classify the whole sentence and create annotations
+			if (!classifyFeats.isEmpty()) {
+				List<String> predictions = classifyAll(classifyFeats);
+				for (int i = 0; i < classifyPairs.size(); i++) {
+					addPredictedRelation(jCas, classifyPairs.get(i).getArg1(), classifyPairs.get(i).getArg2(), predictions.get(i));
+				}
+			}
+
+		}
+	}
+
+	/**
+	 * One prediction per instance, in a single exchange when the classifier
+	 * is a {@link BatchClassifier}, e.g. from {@link ScriptBatchClassifierFactory}.
+	 */
+	@SuppressWarnings("unchecked")
+	private List<String> classifyAll(List<List<Feature>> instances) throws CleartkProcessingException {
+		if (this.classifier instanceof BatchClassifier) {
+			return ((BatchClassifier<String>) this.classifier).classifyBatch(instances);
+		}
+		List<String> predictions = new ArrayList<>();
+		for (List<Feature> feats : instances) {
+			predictions.add(this.classifier.classify(feats));
+		}
+		return predictions;
+	}
+
+	private void addPredictedRelation(JCas jCas, IdentifiedAnnotation arg1, IdentifiedAnnotation arg2, String predictedCategory) {
+		// add a relation annotation if a true relation was predicted
+		if (predictedCategory != null && !predictedCategory.equals(NO_RELATION_CATEGORY.toLowerCase())) {
+
+			// if we predict an inverted relation, reverse the order of the arguments
+			if (predictedCategory.endsWith("-1")) {
+				predictedCategory = predictedCategory.substring(0, predictedCategory.length() - 2);
+				if(arg1 instanceof TimeMention){
+					IdentifiedAnnotation temp = arg1;
+					arg1 = arg2;
+					arg2 = temp;
+				}
+			}else{
+				if(arg1 instanceof EventMention){
+					IdentifiedAnnotation temp = arg1;
+					arg1 = arg2;
+					arg2 = temp;
 				}
 			}
 
+			createRelation(jCas, arg1, arg2, predictedCategory.toUpperCase(), 0.0);
 		}
 	}
 
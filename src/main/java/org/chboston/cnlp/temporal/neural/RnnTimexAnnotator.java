@@ -20,6 +20,7 @@ import org.apache.uima.jcas.JCas;
 import org.apache.uima.resource.ResourceInitializationException;
 import org.apache.uima.util.Level;
 import org.apache.uima.util.Logger;
+import org.cleartk.ml.CleartkProcessingException;
 import org.cleartk.ml.Feature;
 import org.cleartk.ml.Instance;
 import org.cleartk.ml.chunking.BioChunking;
@@ -39,6 +40,14 @@ public class RnnTimexAnnotator extends TemporalEntityAnnotator_ImplBase {
     this.timeChunking = new BioChunking<BaseToken, TimeMention>(BaseToken.class, TimeMention.class);
 
   }
+
+  @Override
+  public void collectionProcessComplete() throws AnalysisEngineProcessException {
+    super.collectionProcessComplete();
+    if (this.classifier instanceof ScriptBatchClassifier) {
+      ((ScriptBatchClassifier) this.classifier).close();
+    }
+  }
   
   @Override
   public void process(JCas jcas, Segment segment) throws AnalysisEngineProcessException {
@@ -47,6 +56,10 @@ public class RnnTimexAnnotator extends TemporalEntityAnnotator_ImplBase {
       logger.log(Level.INFO, "Processing document " + documentId);
     }
 
+    // at test time every sentence of the segment is tagged in one exchange
+    List<List<BaseToken>> sentenceTokens = new ArrayList<>();
+    List<List<Feature>> sentenceFeats = new ArrayList<>();
+
     // classify tokens within each sentence
     for (Sentence sentence : JCasUtil.selectCovered(jcas, Sentence.class, segment)) {
       List<BaseToken> tokens = JCasUtil.selectCovered(jcas, BaseToken.class, sentence);
@@ -76,12 +89,37 @@ public class RnnTimexAnnotator extends TemporalEntityAnnotator_ImplBase {
       tokenFeats.add(new Feature("EOS"));
       outcomes.add("O");
       if(!this.isTraining()){
-        String labels = this.classifier.classify(tokenFeats);
-        this.timeChunking.createChunks(jcas, tokens, Arrays.asList(labels.split(" ")).subList(1, tokenFeats.size()-1));
+        sentenceTokens.add(tokens);
+        sentenceFeats.add(tokenFeats);
       }else{
         this.dataWriter.write(new Instance<>(StringUtils.join(outcomes, " "), tokenFeats));
       }
     }
+
+    if(!this.isTraining() && !sentenceFeats.isEmpty()){
+      List<String> sentenceLabels = classifyAll(sentenceFeats);
+      for (int i = 0; i < sentenceFeats.size(); i++) {
+        String labels = sentenceLabels.get(i);
+        this.timeChunking.createChunks(jcas, sentenceTokens.get(i), Arrays.asList(labels.split(" ")).subList(1, sentenceFeats.get(i).size()-1));
+      }
+    }
+  }
+
+  /**
+   * One label sequence per sentence, in a single exchange when the
+   * classifier is a {@link BatchClassifier}, e.g. from
+   * {@link ScriptBatchClassifierFactory}.
+   */
+  @SuppressWarnings("unchecked")
+  private List<String> classifyAll(List<List<Feature>> instances) throws CleartkProcessingException {
+    if (this.classifier instanceof BatchClassifier) {
+      return ((BatchClassifier<String>) this.classifier).classifyBatch(instances);
+    }
+    List<String> predictions = new ArrayList<>();
+    for (List<Feature> feats : instances) {
+      predictions.add(this.classifier.classify(feats));
+    }
+    return predictions;
   }
 
 }
@@ -0,0 +1,185 @@
+package org.chboston.cnlp.temporal.neural;
+
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileInputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.ObjectInputStream;
+import java.io.OutputStreamWriter;
+import java.io.Writer;
+import java.lang.ProcessBuilder.Redirect;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.util.ArrayList;
+import java.util.Collections;
+import java.util.List;
+import java.util.Map;
+import java.util.jar.JarEntry;
+import java.util.jar.JarInputStream;
+
+import org.cleartk.ml.Classifier;
+import org.cleartk.ml.CleartkProcessingException;
+import org.cleartk.ml.Feature;
+import org.cleartk.ml.encoder.features.FeaturesEncoder;
+import org.cleartk.ml.encoder.outcome.OutcomeEncoder;
+
+/**
+ * Runs a Keras classify.sh for a model directory and labels instances in
+ * batches over its stdin/stdout.
+ *
+ * Each call to {@link #classifyBatch(List)} writes a "#batch N" header and the
+ * N feature lines and reads back N label lines, so a sentence's instances cost
+ * one round trip instead of N. The lines are encoded and the labels decoded
+ * with the encoders the data writer saved with the model, so they are the
+ * same the model.jar classifier exchanges with the script.
+ *
+ * Use it through {@link ScriptBatchClassifierFactory} in place of the model.jar
+ * classifier, so only one script process runs per model.
+ */
+public class ScriptBatchClassifier implements BatchClassifier<String>, Classifier<String> {
+
+	public static final String BATCH_HEADER = "#batch";
+
+	/** file in the model directory naming the classify.sh to start */
+	public static final String SCRIPT_RECORD = "batch-script.path";
+
+	/** encoders saved by ClearTK's EncodingJarClassifierBuilder */
+	public static final String ENCODERS_FILE_NAME = "encoders.ser";
+
+	private FeaturesEncoder<String> featuresEncoder;
+	private OutcomeEncoder<String, String> outcomeEncoder;
+
+	private Process process;
+	private Writer toScript;
+	private BufferedReader fromScript;
+
+	/**
+	 * Starts the script recorded in the model directory by {@link #recordScript(File, File)}.
+	 */
+	public ScriptBatchClassifier(File modelDirectory) throws IOException {
+		this(recordedScript(modelDirectory), modelDirectory);
+	}
+
+	public ScriptBatchClassifier(File script, File modelDirectory) throws IOException {
+		this.readEncoders(modelDirectory);
+		ProcessBuilder builder = new ProcessBuilder(script.getAbsolutePath(), modelDirectory.getAbsolutePath());
+		builder.redirectError(Redirect.INHERIT);
+		this.process = builder.start();
+		this.toScript = new OutputStreamWriter(this.process.getOutputStream(), StandardCharsets.UTF_8);
+		this.fromScript = new BufferedReader(new InputStreamReader(this.process.getInputStream(), StandardCharsets.UTF_8));
+	}
+
+	/**
+	 * Remembers the classify.sh in scriptDirectory for the model in
+	 * modelDirectory, so classification does not depend on the working
+	 * directory it runs from.
+	 */
+	public static void recordScript(File modelDirectory, File scriptDirectory) throws IOException {
+		String script = new File(scriptDirectory, "classify.sh").getAbsolutePath();
+		Files.write(new File(modelDirectory, SCRIPT_RECORD).toPath(), script.getBytes(StandardCharsets.UTF_8));
+	}
+
+	public static File recordedScript(File modelDirectory) throws IOException {
+		File record = new File(modelDirectory, SCRIPT_RECORD);
+		if (!record.exists()) {
+			throw new IOException("no " + SCRIPT_RECORD + " in " + modelDirectory + ", the model was trained without a batch script");
+		}
+		return new File(new String(Files.readAllBytes(record.toPath()), StandardCharsets.UTF_8).trim());
+	}
+
+	/**
+	 * Reads the encoders from the training directory or, if only the packaged
+	 * model is there, from model.jar.
+	 */
+	@SuppressWarnings("unchecked")
+	private void readEncoders(File modelDirectory) throws IOException {
+		File encoders = new File(modelDirectory, ENCODERS_FILE_NAME);
+		try (InputStream stream = encoders.exists() ? new FileInputStream(encoders) : jarEntry(new File(modelDirectory, "model.jar"))) {
+			ObjectInputStream objects = new ObjectInputStream(stream);
+			this.featuresEncoder = (FeaturesEncoder<String>) objects.readObject();
+			this.outcomeEncoder = (OutcomeEncoder<String, String>) objects.readObject();
+		} catch (ClassNotFoundException e) {
+			throw new IOException(e);
+		}
+	}
+
+	private static InputStream jarEntry(File jar) throws IOException {
+		JarInputStream stream = new JarInputStream(new FileInputStream(jar));
+		for (JarEntry entry = stream.getNextJarEntry(); entry != null; entry = stream.getNextJarEntry()) {
+			if (entry.getName().equals(ENCODERS_FILE_NAME)) {
+				return stream;
+			}
+		}
+		stream.close();
+		throw new IOException("no " + ENCODERS_FILE_NAME + " in " + jar);
+	}
+
+	/**
+	 * The line the predict scripts get for one instance.
+	 */
+	public String encode(List<Feature> features) throws CleartkProcessingException {
+		return this.featuresEncoder.encodeAll(features);
+	}
+
+	@Override
+	public String classify(List<Feature> features) throws CleartkProcessingException {
+		return this.classifyBatch(Collections.singletonList(features)).get(0);
+	}
+
+	@Override
+	public Map<String, Double> score(List<Feature> features) throws CleartkProcessingException {
+		throw new UnsupportedOperationException("the predict scripts only return labels");
+	}
+
+	@Override
+	public synchronized List<String> classifyBatch(List<List<Feature>> instances) throws CleartkProcessingException {
+		List<String> labels = new ArrayList<>();
+		if (instances.isEmpty()) {
+			return labels;
+		}
+
+		StringBuilder request = new StringBuilder();
+		request.append(BATCH_HEADER).append(' ').append(instances.size()).append('\n');
+		for (List<Feature> features : instances) {
+			request.append(this.encode(features)).append('\n');
+		}
+
+		try {
+			this.toScript.write(request.toString());
+			this.toScript.flush();
+
+			for (int i = 0; i < instances.size(); i++) {
+				String label = this.fromScript.readLine();
+				if (label == null) {
+					throw new IOException("classify script exited after " + i + " of " + instances.size() + " labels");
+				}
+				labels.add(this.outcomeEncoder.decode(label.trim()));
+			}
+		} catch (IOException e) {
+			throw new CleartkProcessingException(e);
+		}
+		return labels;
+	}
+
+	/**
+	 * Ends the session with an empty line and waits for the script to exit.
+	 */
+	public synchronized void close() {
+		if (this.process == null) {
+			return;
+		}
+		try {
+			this.toScript.write("\n");
+			this.toScript.close();
+			this.process.waitFor();
+		} catch (IOException e) {
+			this.process.destroy();
+		} catch (InterruptedException e) {
+			this.process.destroy();
+			Thread.currentThread().interrupt();
+		}
+		this.process = null;
+	}
+}
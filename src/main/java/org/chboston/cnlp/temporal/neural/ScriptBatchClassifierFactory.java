@@ -0,0 +1,61 @@
+package org.chboston.cnlp.temporal.neural;
+
+import java.io.File;
+import java.io.IOException;
+
+import org.apache.uima.UimaContext;
+import org.apache.uima.fit.component.initialize.ConfigurationParameterInitializer;
+import org.apache.uima.fit.descriptor.ConfigurationParameter;
+import org.apache.uima.fit.factory.initializable.Initializable;
+import org.apache.uima.resource.ResourceInitializationException;
+import org.cleartk.ml.CleartkAnnotator;
+import org.cleartk.ml.Classifier;
+import org.cleartk.ml.ClassifierFactory;
+import org.cleartk.ml.jar.GenericJarClassifierFactory;
+
+/**
+ * Builds a {@link ScriptBatchClassifier} in place of the model.jar classifier,
+ * so an annotator talks to a single script process that also takes whole
+ * batches.
+ *
+ * The batch path is opt-in: {@link #getClassifierParameters(File)} returns the
+ * parameters for this factory when the {@value #BATCH_PROPERTY} system
+ * property is true, and the usual model.jar parameters otherwise.
+ */
+public class ScriptBatchClassifierFactory implements ClassifierFactory<String>, Initializable {
+
+	public static final String BATCH_PROPERTY = "neural.batchClassifier";
+
+	public static final String PARAM_MODEL_DIRECTORY = "BatchClassifierModelDirectory";
+
+	@ConfigurationParameter(
+			name = PARAM_MODEL_DIRECTORY,
+			description = "directory with the script.model, encoders and recorded classify.sh")
+	private String modelDirectory;
+
+	@Override
+	public void initialize(UimaContext context) throws ResourceInitializationException {
+		ConfigurationParameterInitializer.initialize(this, context);
+	}
+
+	@Override
+	public Classifier<String> createClassifier() throws IOException {
+		return new ScriptBatchClassifier(new File(this.modelDirectory));
+	}
+
+	/**
+	 * Annotator parameters selecting the classifier for modelDirectory.
+	 */
+	public static Object[] getClassifierParameters(File modelDirectory) {
+		if (Boolean.getBoolean(BATCH_PROPERTY)) {
+			return new Object[] {
+					CleartkAnnotator.PARAM_CLASSIFIER_FACTORY_CLASS_NAME,
+					ScriptBatchClassifierFactory.class.getName(),
+					PARAM_MODEL_DIRECTORY,
+					modelDirectory.getPath() };
+		}
+		return new Object[] {
+				GenericJarClassifierFactory.PARAM_CLASSIFIER_JAR_PATH,
+				new File(modelDirectory, "model.jar").getPath() };
+	}
+}
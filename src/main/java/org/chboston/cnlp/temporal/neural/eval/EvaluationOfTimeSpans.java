@@ -38,13 +38,15 @@ import org.apache.uima.jcas.JCas;
 import org.apache.uima.jcas.tcas.Annotation;
 import org.apache.uima.resource.ResourceInitializationException;
 import org.chboston.cnlp.temporal.neural.RnnTimexAnnotator;
+import org.chboston.cnlp.temporal.neural.ScriptBatchClassifier;
+import org.chboston.cnlp.temporal.neural.ScriptBatchClassifierFactory;
 import org.cleartk.eval.AnnotationStatistics;
 import org.cleartk.ml.CleartkAnnotator;
 import org.cleartk.ml.jar.DefaultDataWriterFactory;
 import org.cleartk.ml.jar.DirectoryDataWriterFactory;
-import org.cleartk.ml.jar.GenericJarClassifierFactory;
 import org.cleartk.ml.jar.JarClassifierBuilder;
 
+import com.google.common.collect.ObjectArrays;
 import com.lexicalscope.jewel.cli.CliFactory;
 import com.lexicalscope.jewel.cli.Option;
 
@@ -144,16 +146,19 @@ public class EvaluationOfTimeSpans extends EvaluationOfAnnotationSpans_ImplBase
 	@Override
 	protected void trainAndPackage(File directory) throws Exception {
 		JarClassifierBuilder.trainAndPackage(this.getModelDirectory(directory), this.kernelParams);
+		ScriptBatchClassifier.recordScript(this.getModelDirectory(directory), new File("scripts/keras/timex"));
 	}
 
 	@Override
 	protected AnalysisEngineDescription getAnnotatorDescription(File directory)
 			throws ResourceInitializationException {
 	  return AnalysisEngineFactory.createEngineDescription(RnnTimexAnnotator.class,
-	      CleartkAnnotator.PARAM_IS_TRAINING,
-	      false,
-	      GenericJarClassifierFactory.PARAM_CLASSIFIER_JAR_PATH,
-	      new File(this.getModelDirectory(directory), "model.jar"));	  
+	      // the model.jar classifier, or with -Dneural.batchClassifier=true one
+	      // script process tagging each segment's sentences in one exchange
+	      ObjectArrays.concat(
+	          new Object[] { CleartkAnnotator.PARAM_IS_TRAINING, false },
+	          ScriptBatchClassifierFactory.getClassifierParameters(this.getModelDirectory(directory)),
+	          Object.class));
 	}
 
 	@Override
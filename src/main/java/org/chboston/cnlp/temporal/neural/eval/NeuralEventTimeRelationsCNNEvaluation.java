@@ -76,11 +76,12 @@ import org.apache.uima.jcas.tcas.Annotation;
 import org.apache.uima.resource.ResourceInitializationException;
 import org.apache.uima.util.FileUtils;
 import org.chboston.cnlp.temporal.neural.EventTimeCNNAnnotator;
+import org.chboston.cnlp.temporal.neural.ScriptBatchClassifier;
+import org.chboston.cnlp.temporal.neural.ScriptBatchClassifierFactory;
 import org.cleartk.eval.AnnotationStatistics;
 import org.cleartk.ml.CleartkAnnotator;
 import org.cleartk.ml.jar.DefaultDataWriterFactory;
 import org.cleartk.ml.jar.DirectoryDataWriterFactory;
-import org.cleartk.ml.jar.GenericJarClassifierFactory;
 //import org.cleartk.ml.Instance; //for normalization
 //import org.cleartk.ml.feature.transform.InstanceDataWriter;//for normalization
 //import org.cleartk.ml.feature.transform.InstanceStream;//for normalization
@@ -95,6 +96,7 @@ import com.google.common.collect.HashMultimap;
 import com.google.common.collect.Lists;
 import com.google.common.collect.Maps;
 import com.google.common.collect.Multimap;
+import com.google.common.collect.ObjectArrays;
 import com.google.common.collect.Sets;
 import com.lexicalscope.jewel.cli.CliFactory;
 import com.lexicalscope.jewel.cli.Option;
@@ -410,6 +412,7 @@ EvaluationOfTemporalRelations_ImplBase{
 		//		weightArray[weight_idx*2+1] = optArray[3];
 		//    HideOutput hider = new HideOutput();
 		JarClassifierBuilder.trainAndPackage(new File(directory,"event-time"));//, weightArray
+		ScriptBatchClassifier.recordScript(new File(directory,"event-time"), new File("scripts/keras/docTimeRel"));
 	}
 
 	@Override
@@ -447,10 +450,12 @@ EvaluationOfTemporalRelations_ImplBase{
 		aggregateBuilder.add(this.baseline ? RecallBaselineEventTimeRelationAnnotator.createAnnotatorDescription(directory) :
 			//			EventTimeSelfRelationAnnotator.createEngineDescription(new File(directory,"event-time")));
 			AnalysisEngineFactory.createEngineDescription(EventTimeCNNAnnotator.class,
-					CleartkAnnotator.PARAM_IS_TRAINING,
-					false,
-					GenericJarClassifierFactory.PARAM_CLASSIFIER_JAR_PATH,
-					new File(new File(directory,"event-time"), "model.jar").getPath()));
+					// the model.jar classifier, or with -Dneural.batchClassifier=true
+					// one script process classifying each sentence's pairs in one exchange
+					ObjectArrays.concat(
+							new Object[] { CleartkAnnotator.PARAM_IS_TRAINING, false },
+							ScriptBatchClassifierFactory.getClassifierParameters(new File(directory,"event-time")),
+							Object.class)));
 
 		//count how many system predicted relations, their arguments are close to each other, without any other event in between
 		aggregateBuilder.add(AnalysisEngineFactory.createEngineDescription(CountCloseRelation.class));
@@ -25,6 +25,9 @@ from keras.layers.embeddings import Embedding
 
 import pickle
 
+batch_size = 50#cfg.getint('cnn', 'batches')
+validation_split = 0.1
+
 def main(args):
     if len(args) < 1:
         sys.stderr.write("Error - one required argument: <data directory>\n")
@@ -39,29 +42,25 @@ def main(args):
 
     # learn alphabet from training and test data
     dataset1 = dataset.DatasetProvider([data_file])
-    # now load training examples and labels
-    train_x, train_y = dataset1.load(data_file)
+    # scan the training file once instead of loading it; examples are read
+    # back in chunks by the generators passed to fit_generator below
+    num_examples, maxlen, label_counts = dataset1.scan(data_file)
 
     init_vectors = None #used for pre-trained embeddings
     
-    # turn x and y into numpy array among other things
-    maxlen = max([len(seq) for seq in train_x])
-    outcomes = set(train_y)
-    classes = len(outcomes)
+    # one output per label index, also for indices no example has
+    classes = max(label_counts) + 1
 
-    train_x = pad_sequences(train_x, maxlen=maxlen)
-    train_y = to_categorical(np.array(train_y), classes)
+    # hold out the trailing 10% of examples for validation, like validation_split
+    split_at = int(num_examples * (1 - validation_split))
 
     pickle.dump(maxlen, open(os.path.join(working_dir, 'maxlen.p'),"wb"))
     pickle.dump(dataset1.alphabet, open(os.path.join(working_dir, 'alphabet.p'),"wb"))
-    #test_x = pad_sequences(test_x, maxlen=maxlen)
-    #test_y = to_categorical(np.array(test_y), classes)
 
-    print 'train_x shape:', train_x.shape
-    print 'train_y shape:', train_y.shape
+    print 'train examples:', split_at, 'validation examples:', num_examples - split_at
+    print 'maxlen:', maxlen, 'classes:', classes
 
     branches = [] # models to be merged
-    train_xs = [] # train x for each branch
     #test_xs = []  # test x for each branch
 
     filtlens = "3,4,5"
@@ -80,7 +79,6 @@ def main(args):
         branch.add(Flatten())
 
         branches.append(branch)
-        train_xs.append(train_x)
         #test_xs.append(test_x)
     model = Sequential()
     model.add(Merge(branches, mode='concat'))
@@ -98,12 +96,18 @@ def main(args):
     model.compile(loss='categorical_crossentropy',
                 optimizer=optimizer,
                 metrics=['accuracy'])
-    model.fit(train_xs,
-            train_y,
+    num_branches = len(branches)
+    def branch_inputs(batches):
+        # every Merge branch reads the same padded chunk
+        for x, y in batches:
+            yield [x] * num_branches, y
+
+    model.fit_generator(branch_inputs(dataset1.batch_generator(data_file, batch_size, maxlen, classes, stop=split_at, shuffle=True)),
+            samples_per_epoch=split_at,
             nb_epoch=1,#cfg.getint('cnn', 'epochs'),
-            batch_size=50,#cfg.getint('cnn', 'batches'),
             verbose=1,
-            validation_split=0.1,
+            validation_data=branch_inputs(dataset1.batch_generator(data_file, batch_size, maxlen, classes, start=split_at)),
+            nb_val_samples=num_examples - split_at,
             class_weight=None)
 
     model.summary()
@@ -0,0 +1,117 @@
+package org.chboston.cnlp.temporal.neural;
+
+import static org.junit.Assert.assertEquals;
+
+import java.io.File;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.ObjectOutputStream;
+import java.io.OutputStream;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.List;
+import java.util.jar.JarEntry;
+import java.util.jar.JarOutputStream;
+
+import org.cleartk.ml.Feature;
+import org.cleartk.ml.encoder.features.FeaturesEncoder;
+import org.cleartk.ml.encoder.outcome.StringToStringOutcomeEncoder;
+import org.junit.Rule;
+import org.junit.Test;
+import org.junit.rules.TemporaryFolder;
+
+public class ScriptBatchClassifierTest {
+
+	/** answers every instance line with the line itself */
+	private static final String ECHO_SCRIPT =
+			"#!/bin/bash\n" +
+			"while read -r line; do\n" +
+			"  if [ -z \"$line\" ]; then exit 0; fi\n" +
+			"  n=${line#\\#batch }\n" +
+			"  for ((i = 0; i < n; i++)); do read -r instance; echo \"$instance\"; done\n" +
+			"done\n";
+
+	/** an encoder unlike a plain join, so the test shows which one was used */
+	public static class TaggedEncoder implements FeaturesEncoder<String> {
+		private static final long serialVersionUID = 1L;
+
+		@Override
+		public String encodeAll(Iterable<Feature> features) {
+			List<String> values = new ArrayList<>();
+			for (Feature feature : features) {
+				values.add("<" + feature.getValue() + ">");
+			}
+			return String.join(" ", values);
+		}
+
+		@Override
+		public void finalizeFeatureSet(File outputDirectory) {
+		}
+	}
+
+	@Rule
+	public TemporaryFolder folder = new TemporaryFolder();
+
+	private File script() throws IOException {
+		File script = this.folder.newFile("classify.sh");
+		Files.write(script.toPath(), ECHO_SCRIPT.getBytes(StandardCharsets.UTF_8));
+		script.setExecutable(true);
+		return script;
+	}
+
+	private static void writeEncoders(OutputStream stream, FeaturesEncoder<String> encoder) throws IOException {
+		ObjectOutputStream objects = new ObjectOutputStream(stream);
+		objects.writeObject(encoder);
+		objects.writeObject(new StringToStringOutcomeEncoder());
+		objects.flush();
+	}
+
+	private static List<List<Feature>> instances() {
+		return Arrays.asList(
+				Arrays.asList(new Feature("the"), new Feature("<e>"), new Feature("scan"), new Feature("</e>")),
+				Arrays.asList(new Feature("two words"), new Feature("x")));
+	}
+
+	@Test
+	public void sendsTheSavedEncoding() throws Exception {
+		File modelDirectory = this.folder.newFolder("model");
+		TaggedEncoder encoder = new TaggedEncoder();
+		try (OutputStream stream = new FileOutputStream(new File(modelDirectory, ScriptBatchClassifier.ENCODERS_FILE_NAME))) {
+			writeEncoders(stream, encoder);
+		}
+
+		ScriptBatchClassifier classifier = new ScriptBatchClassifier(this.script(), modelDirectory);
+		try {
+			List<String> expected = new ArrayList<>();
+			for (List<Feature> features : instances()) {
+				expected.add(encoder.encodeAll(features));
+			}
+			assertEquals(expected, classifier.classifyBatch(instances()));
+			assertEquals(expected.get(1), classifier.classify(instances().get(1)));
+		} finally {
+			classifier.close();
+		}
+	}
+
+	@Test
+	public void readsEncodersFromModelJar() throws Exception {
+		File modelDirectory = this.folder.newFolder("packaged");
+		try (JarOutputStream jar = new JarOutputStream(new FileOutputStream(new File(modelDirectory, "model.jar")))) {
+			jar.putNextEntry(new JarEntry("script.model"));
+			jar.closeEntry();
+			jar.putNextEntry(new JarEntry(ScriptBatchClassifier.ENCODERS_FILE_NAME));
+			writeEncoders(jar, new TaggedEncoder());
+			jar.closeEntry();
+		}
+		ScriptBatchClassifier.recordScript(modelDirectory, this.script().getParentFile());
+
+		ScriptBatchClassifier classifier = new ScriptBatchClassifier(modelDirectory);
+		try {
+			assertEquals("<x>", classifier.classify(Arrays.asList(new Feature("x"))));
+		} finally {
+			classifier.close();
+		}
+	}
+}